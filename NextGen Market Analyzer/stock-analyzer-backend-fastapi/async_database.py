@@ -0,0 +1,157 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import aiomysql
+
+from metrics import AsyncInstrumentedCursor, timer
+from database import (
+    HOST, USER, PASSWORD, STOCK_DB, PORTFOLIO_DB,
+    POOL_SIZE, POOL_TIMEOUT, POOL_RECYCLE, PoolTimeout,
+)
+
+
+class AsyncConnectionPool:
+    """aiomysql pool for one database with the same limits and stats as ConnectionPool.
+
+    aiomysql recycles connections past ``recycle`` seconds and drops closed
+    ones on checkout; acquiring waits at most ``timeout`` seconds.
+    """
+
+    def __init__(self, database: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 recycle: float = POOL_RECYCLE, **connect_args):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.connect_args = {"host": HOST, "user": USER, "password": PASSWORD, "db": database, "autocommit": True}
+        self.connect_args.update(connect_args)
+        self._pool: Optional[aiomysql.Pool] = None
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+
+    async def open(self) -> None:
+        if self._pool is None:
+            self._pool = await aiomysql.create_pool(
+                minsize=1, maxsize=self.size, pool_recycle=int(self.recycle), **self.connect_args
+            )
+
+    async def acquire(self):
+        if self._pool is None:
+            await self.open()
+        start = time.monotonic()
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(
+                f"No free connection for {self.database} after {self.timeout:.1f}s "
+                f"({self._pool.size - self._pool.freesize}/{self.size} in use)"
+            )
+        wait = time.monotonic() - start
+        self._checkouts += 1
+        if wait > 0.001:
+            self._waits += 1
+            self._wait_time += wait
+            self._max_wait = max(self._max_wait, wait)
+        return conn
+
+    def release(self, conn) -> None:
+        self._pool.release(conn)
+
+    @asynccontextmanager
+    async def connection(self):
+        with timer("db_connect"):
+            conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @asynccontextmanager
+    async def cursor(self, dictionary: bool = True, unbuffered: bool = False):
+        # unbuffered cursors stream rows from the server; read them all before the next query
+        if unbuffered:
+            cursor_class = aiomysql.SSDictCursor if dictionary else aiomysql.SSCursor
+        else:
+            cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+        async with self.connection() as conn:
+            cursor = await conn.cursor(cursor_class)
+            try:
+                yield AsyncInstrumentedCursor(cursor, self.database)
+            finally:
+                await cursor.close()
+
+    async def ping(self) -> bool:
+        try:
+            async with self.cursor(dictionary=False) as cursor:
+                await cursor.execute("SELECT 1")
+                await cursor.fetchall()
+            return True
+        except (aiomysql.Error, PoolTimeout, OSError):
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        open_ = self._pool.size if self._pool is not None else 0
+        idle = self._pool.freesize if self._pool is not None else 0
+        return {
+            "database": self.database,
+            "size": self.size,
+            "open": open_,
+            "in_use": open_ - idle,
+            "idle": idle,
+            "checkouts": self._checkouts,
+            "waits": self._waits,
+            "total_wait_ms": round(self._wait_time * 1000.0, 3),
+            "avg_wait_ms": round(self._wait_time * 1000.0 / self._waits, 3) if self._waits else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000.0, 3),
+            "timeouts": self._timeouts,
+        }
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+
+# --- Process-wide async pools, opened at app startup ---
+_pools: Dict[str, AsyncConnectionPool] = {}
+
+
+async def init_async_pools(size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT) -> None:
+    for database in (STOCK_DB, PORTFOLIO_DB):
+        if database not in _pools:
+            _pools[database] = AsyncConnectionPool(database, size=size, timeout=timeout)
+        await _pools[database].open()
+
+
+async def close_async_pools() -> None:
+    for pool in _pools.values():
+        await pool.close()
+    _pools.clear()
+
+
+def get_async_pool(database: str) -> AsyncConnectionPool:
+    pool = _pools.get(database)
+    if pool is None:
+        # opened lazily on first acquire when the startup hook did not run
+        pool = _pools[database] = AsyncConnectionPool(database)
+    return pool
+
+
+def stock_cursor(dictionary: bool = True, unbuffered: bool = False):
+    return get_async_pool(STOCK_DB).cursor(dictionary=dictionary, unbuffered=unbuffered)
+
+
+def portfolio_cursor(dictionary: bool = True, unbuffered: bool = False):
+    return get_async_pool(PORTFOLIO_DB).cursor(dictionary=dictionary, unbuffered=unbuffered)
+
+
+def async_pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in _pools.items()}
@@ -0,0 +1,94 @@
+"""Memory and analysis time of portfolios as nested dicts vs CompactPortfolio.
+
+Portfolios are generated, serialized and parsed back one at a time, so the
+dict form has the separate string and float objects json.load gives. Memory
+is the traced size of the list of loaded portfolios (interning tables
+included for the compact form), reported per holding and per million
+holdings. Analysis times (best of three) run each analyzer on both forms.
+
+    python benchmarks/bench_compact_portfolios.py [--holdings 1000000] [--stocks 5000]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import standin  # noqa: F401  (puts the backend on sys.path)
+from compact_portfolio import from_json
+from exposure import analyze_portfolio
+from generators import iter_portfolios
+from sector_features import SectorFeatures
+from suite import db_portfolio, load_root_analyzer
+import pML2
+
+
+def serialized(holdings: int, n_stocks: int, seed: int = 1):
+    out, count = [], 0
+    for p in iter_portfolios(holdings, seed=seed, n_stocks=n_stocks):
+        out.append(json.dumps(p))
+        count += sum(len(f["holdings"]) for f in p["funds"])
+        if count >= holdings:
+            break
+    return out, count
+
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def timed(fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=int, default=1_000_000)
+    parser.add_argument("--stocks", type=int, default=5000)
+    parser.add_argument("--sample", type=int, default=5000, help="portfolios the analyzers are timed on")
+    args = parser.parse_args()
+
+    texts, holdings = serialized(args.holdings, args.stocks)
+    funds = sum(len(json.loads(t)["funds"]) for t in texts)
+    print(f"{len(texts):,} portfolios, {funds:,} funds, {holdings:,} holdings\n")
+
+    dicts, dict_bytes = traced(lambda: [json.loads(t) for t in texts])
+    compact, compact_bytes = traced(lambda: [from_json(json.loads(t)) for t in texts])
+    print(f"{'form':<10} {'total':>12} {'per holding':>12} {'per 1M holdings':>16}")
+    for name, size in (("dict", dict_bytes), ("compact", compact_bytes)):
+        print(f"{name:<10} {size / 2**20:>8.1f} MiB {size / holdings:>10.1f} B "
+              f"{size / holdings * 1e6 / 2**20:>12.1f} MiB")
+    print(f"compact is {dict_bytes / compact_bytes:.1f}x smaller\n")
+
+    root = load_root_analyzer()
+    sample_dicts, sample_compact = dicts[:args.sample], compact[:args.sample]
+    inputs = [pML2.analyzer_input(p) for p in sample_dicts]
+    rows = [db_portfolio(p) for p in sample_dicts]
+    cases = [
+        ("pML2.PortfolioAnalyzer", lambda: [pML2.PortfolioAnalyzer(pML2.analyzer_input(p)).evaluate()
+                                            for p in sample_dicts],
+         lambda: [pML2.PortfolioAnalyzer(p).evaluate() for p in sample_compact]),
+        ("root PortfolioAnalyzer", lambda: [root.PortfolioAnalyzer(p).evaluate() for p in inputs],
+         lambda: [root.PortfolioAnalyzer(p).evaluate() for p in sample_compact]),
+        ("SectorFeatures.extract", lambda: SectorFeatures().extract([pML2.analyzer_input(p) for p in sample_dicts]),
+         lambda: SectorFeatures().extract(sample_compact)),
+        ("analyze_portfolio", lambda: [analyze_portfolio(*r) for r in rows],
+         lambda: [analyze_portfolio(p) for p in sample_compact]),
+    ]
+    print(f"{'analyzer (' + format(len(sample_dicts), ',') + ' portfolios)':<34} {'dict':>10} {'compact':>10}")
+    for name, on_dicts, on_compact in cases:
+        print(f"{name:<34} {timed(on_dicts):>8.3f} s {timed(on_compact):>8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
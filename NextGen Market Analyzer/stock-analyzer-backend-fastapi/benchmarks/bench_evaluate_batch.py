@@ -0,0 +1,73 @@
+"""Watchlist evaluation: one POST /evaluate per symbol vs a single POST /evaluate/batch.
+
+Runs the app in-process against the SQLite stand-in with a simulated
+per-query latency, and times the batch with and without feedback text.
+
+    python benchmarks/bench_evaluate_batch.py [symbols ...] [--latency 0.001]
+"""
+import argparse
+import json
+import time
+import warnings
+
+import numpy as np
+
+from standin import StandInDB
+from bench_evaluator import make_columns
+
+SIZES = [100, 1000, 10000]
+LOOP_LIMIT = 1000   # single requests are timed on at most this many symbols
+
+
+def make_stocks(n):
+    columns = make_columns(n, np.random.default_rng(7))
+    return [{"stockSymbol": columns["stockSymbol"][i],
+             "parameters": {c: float(v[i]) for c, v in columns.items() if c != "stockSymbol"}}
+            for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=SIZES)
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds added to every query")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    from fastapi.testclient import TestClient
+    import main as api
+
+    db = StandInDB()
+    db.load_stocks(make_stocks(max(args.sizes)))
+    api.stock_cursor = db.async_cursor_factory(args.latency)
+    symbols = [r[0] for r in db.conn.execute("SELECT stockSymbol FROM stocks").fetchall()]
+
+    async def noop():
+        pass
+
+    api.init_async_pools = api.close_async_pools = noop
+    api.app.router.on_startup.clear()
+    api.app.router.on_shutdown.clear()
+    client = TestClient(api.app)
+
+    print(f"{'symbols':>8} {'single /s':>10} {'batch /s':>10} {'scores only /s':>15} {'queries':>8}")
+    for n in args.sizes:
+        watchlist = symbols[:n]
+        looped = watchlist[:LOOP_LIMIT]
+        api.response_cache.invalidate(api.STOCKS)
+        start = time.perf_counter()
+        for symbol in looped:
+            client.post("/evaluate", json={"stockSymbol": symbol})
+        single = len(looped) / (time.perf_counter() - start)
+
+        rates = []
+        for fields in (None, ["quality", "value", "overall"]):
+            db.round_trips = 0
+            start = time.perf_counter()
+            body = client.post("/evaluate/batch", json={"symbols": watchlist, "fields": fields}).text
+            rates.append(n / (time.perf_counter() - start))
+            assert len(body.splitlines()) == n and "error" not in json.loads(body.splitlines()[0])
+        print(f"{n:>8} {single:>10,.0f} {rates[0]:>10,.0f} {rates[1]:>15,.0f} {db.round_trips:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""StockAnalyzerModel.evaluate per row vs evaluate_many on a columnar batch.
+
+    python benchmarks/bench_evaluator.py [rows ...]
+
+The per-row loop is timed on at most 100k rows and extrapolated above that.
+"""
+import sys
+import time
+
+import numpy as np
+
+import standin  # noqa: F401  (puts the backend on sys.path)
+from evaluator import StockAnalyzerModel
+
+LOOP_LIMIT = 100_000
+
+
+def make_columns(n, rng):
+    return {
+        "stockSymbol": np.array([f"STK{i:07d}" for i in range(n)], dtype=object),
+        "priceEarningsRatio": rng.uniform(0, 120, n).round(2),
+        "earningsPerShare": rng.uniform(-2, 20, n).round(2),
+        "dividendYield": rng.uniform(0, 8, n).round(2),
+        "marketCap": rng.uniform(1e9, 3e12, n).round(0),
+        "debtToEquityRatio": rng.uniform(0, 4, n).round(2),
+        "returnOnEquity": rng.uniform(-0.1, 0.4, n).round(3),
+        "returnOnAssets": rng.uniform(-0.05, 0.2, n).round(3),
+        "currentRatio": rng.uniform(0.3, 4, n).round(2),
+        "quickRatio": rng.uniform(0.2, 3, n).round(2),
+        "bookValuePerShare": rng.uniform(0, 300, n).round(2),
+    }
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    model = StockAnalyzerModel()
+    rng = np.random.default_rng(11)
+    print(f"{'rows':>9} {'evaluate s':>11} {'evaluate_many s':>16} {'speedup':>8}")
+    for n in sizes:
+        columns = make_columns(n, rng)
+        start = time.perf_counter()
+        model.evaluate_many(columns)
+        batch_s = time.perf_counter() - start
+
+        m = min(n, LOOP_LIMIT)
+        names = list(columns)
+        lists = [columns[c][:m].tolist() for c in names]
+        rows = [dict(zip(names, values)) for values in zip(*lists)]
+        start = time.perf_counter()
+        for row in rows:
+            model.evaluate(row)
+        loop_s = (time.perf_counter() - start) * n / m
+        note = "" if m == n else " (extrapolated)"
+        print(f"{n:>9} {loop_s:>11.3f} {batch_s:>16.4f} {loop_s / batch_s:>7.0f}x{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""pML2 training feature extraction: two-pass dict/DataFrame build vs chunked sparse extraction.
+
+Reports wall time and peak traced memory (excluding the input portfolios)
+for building the training matrix from synthetic portfolios.
+
+    python benchmarks/bench_features.py [--portfolios 50000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from bench_portfolio_roundtrips import make_client
+from pML2 import PortfolioAnalyzer, analyzer_input
+from sector_features import BASE_FEATURES, CHUNK_SIZE, extract_training_set
+
+
+def generate(n, seed=9):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield make_client(f"C{i}", rng.randint(1, 8), rng)
+
+
+def legacy(portfolios):
+    """The previous pML2 preprocessing: evaluate every portfolio twice, then a DataFrame of dicts."""
+    portfolios = list(portfolios)
+    all_sectors = set()
+    for p in portfolios:
+        all_sectors.update(s.upper() for s in PortfolioAnalyzer(analyzer_input(p)).evaluate()["sectorBreakdown"])
+    records, labels = [], []
+    for p in portfolios:
+        result = PortfolioAnalyzer(analyzer_input(p)).evaluate()
+        row = {name: result[name] for name in BASE_FEATURES}
+        for sector in all_sectors:
+            row[sector] = result["sectorBreakdown"].get(sector, 0)
+        records.append(row)
+        labels.append(min(result["sectorBreakdown"], key=lambda k: result["sectorBreakdown"][k]).upper())
+    return pd.DataFrame(records), labels
+
+
+def measure(fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--portfolios", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    n = args.portfolios
+    portfolios = list(generate(n))
+    print(f"{n} portfolios\n{'':<22} {'seconds':>8} {'portfolios/s':>13} {'peak MB':>8}")
+    for label, fn in (("two-pass + DataFrame", lambda: legacy(portfolios)),
+                      ("chunked sparse", lambda: extract_training_set(portfolios, args.chunk_size))):
+        elapsed, peak = measure(fn)
+        print(f"{label:<22} {elapsed:>8.2f} {n / elapsed:>13,.0f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
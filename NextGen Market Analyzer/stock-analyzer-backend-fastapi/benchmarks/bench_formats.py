@@ -0,0 +1,101 @@
+"""Payload size and encode time of the bulk responses: today's JSON vs orjson, MessagePack and Arrow.
+
+"json (before)" is what the endpoints did until now: build a list of dicts
+and render it through jsonable_encoder and json.dumps. The other rows build
+columns and encode them with formats.py. /recommend includes the
+scoring, since the JSON shape also renders feedback text per result.
+
+    python benchmarks/bench_formats.py [rows ...] [--top-n 1000]
+"""
+import argparse
+import json
+import time
+import warnings
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+import standin  # noqa: F401  (puts the backend on sys.path)
+from formats import ARROW, MSGPACK, available, encode_arrow, encode_json, encode_msgpack, rows
+from generators import iter_stocks
+
+SIZES = [1000, 10000, 100000]
+MIN_SAMPLE = 0.2   # seconds each encoder is looped for
+
+
+def before(content) -> bytes:
+    # fastapi's JSONResponse.render after jsonable_encoder
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode()
+
+
+def timed(fn):
+    fn()
+    loops, start = 0, time.perf_counter()
+    while True:
+        body = fn()
+        loops += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SAMPLE:
+            return len(body), elapsed / loops
+
+
+def encoders(make_rows, make_columns, meta=None):
+    out = [
+        ("json (before)", lambda: before(make_rows())),
+        ("json (orjson rows)", lambda: encode_json(rows(make_columns()))),
+    ]
+    if available(MSGPACK):
+        out.append(("msgpack", lambda: encode_msgpack(make_columns(), meta)))
+    if available(ARROW):
+        out.append(("arrow", lambda: encode_arrow(make_columns(), meta)))
+    return out
+
+
+def report(title, cases):
+    print(f"\n{title}\n  {'format':<20} {'bytes':>14} {'size':>7}   {'encode':>12} {'speedup':>7}")
+    baseline = None
+    for name, fn in cases:
+        size, seconds = timed(fn)
+        baseline = baseline or (size, seconds)
+        print(f"  {name:<20} {size:>14,} {size / baseline[0]:>6.2f}x   "
+              f"{seconds * 1000:>9.3f} ms {baseline[1] / seconds:>6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=SIZES)
+    parser.add_argument("--top-n", type=int, default=1000, help="results per /recommend call")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    import main as api
+
+    for n in args.sizes:
+        stocks = list(iter_stocks(n))
+        symbols = [s["stockSymbol"] for s in stocks]
+        report(f"GET /stocks, {n:,} symbols", encoders(
+            lambda: [{"stockSymbol": s} for s in symbols],
+            lambda: {"stockSymbol": symbols}))
+
+        weights = np.random.default_rng(1).random(n)
+        holdings = list(zip(symbols, weights.tolist()))
+        report(f"GET /client/{{id}}/holdings, {n:,} rows", encoders(
+            lambda: [{"stockSymbol": s, "weightPct": round(w * 100, 4)} for s, w in holdings],
+            lambda: {"stockSymbol": [s for s, _ in holdings],
+                     "weightPct": [round(w * 100, 4) for _, w in holdings]}))
+
+        api.universe_cache.loader = lambda: [{"stockSymbol": s["stockSymbol"], **s["parameters"]} for s in stocks]
+        api.universe_cache.invalidate()
+        provided = {"returnOnEquity": 0.18, "debtToEquityRatio": 1.0}
+        top_n = min(args.top_n, n)
+        meta = {"criteria": provided, "top_n": top_n}
+        report(f"POST /recommend, top {top_n:,} of {n:,}", [
+            ("json (before)", lambda: before(api.recommend_stocks(provided, top_n))),
+            ("json (orjson)", lambda: encode_json(api.recommend_stocks(provided, top_n))),
+            *[(name, fn) for name, fn in encoders(None, lambda: api.recommend_columns(provided, top_n), meta)
+              if name in ("msgpack", "arrow")],
+        ])
+
+
+if __name__ == "__main__":
+    main()
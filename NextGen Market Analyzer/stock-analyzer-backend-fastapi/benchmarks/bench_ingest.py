@@ -0,0 +1,114 @@
+"""Portfolio ingestion throughput: row-at-a-time loader vs parse_portfolio.ingest.
+
+Writes a synthetic ClientPortfolio.json, loads it with the old per-row insert
+loop and with the batched loader, then re-ingests the unchanged file and a
+file with a few changed funds. ``--latency`` adds a simulated network delay
+per statement.
+
+    python benchmarks/bench_ingest.py [--clients 2000] [--latency 0.0002]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from standin import StandInDB
+from parse_portfolio import ingest, iter_clients
+from bench_portfolio_roundtrips import make_client
+
+
+class _Conn:
+    """mysql.connector-style connection: tuple cursors, per-statement latency."""
+
+    def __init__(self, db, latency):
+        self.db = db
+        self.latency = latency
+
+    def cursor(self):
+        cursor = self.db.cursor(dictionary=False)
+        execute, executemany = cursor.execute, cursor.executemany
+
+        def slow(fn):
+            def wrapped(*args):
+                if self.latency:
+                    time.sleep(self.latency)
+                return fn(*args)
+            return wrapped
+
+        cursor.execute, cursor.executemany = slow(execute), slow(executemany)
+        return cursor
+
+    def commit(self):
+        self.db.commit()
+
+
+def ingest_per_row(conn, path):
+    """The previous parse_portfolio loop: one statement per row, commit per fund."""
+    cursor = conn.cursor()
+    for client in json.load(open(path)):
+        cursor.execute("INSERT OR IGNORE INTO clients (clientId, currency) VALUES (%s, %s)",
+                       (client["clientId"], client["currency"]))
+        conn.commit()
+        for fund in client["funds"]:
+            cursor.execute("INSERT INTO funds (clientId, fundCode, amount) VALUES (%s, %s, %s)",
+                           (client["clientId"], fund["fundCode"], fund["amount"]))
+            fund_id = cursor.lastrowid
+            for stock, pct in fund["holdings"].items():
+                cursor.execute("INSERT INTO holdings (fundId, stockSymbol, percent) VALUES (%s, %s, %s)",
+                               (fund_id, stock, pct * 100))
+            for sector, pct in fund["sectors"].items():
+                cursor.execute("INSERT INTO sectors (fundId, sectorName, percent) VALUES (%s, %s, %s)",
+                               (fund_id, sector, pct * 100))
+            conn.commit()
+
+
+def timed(label, rows, fn, db):
+    db.round_trips = 0
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:>8.2f}s {rows / elapsed:>12,.0f} rows/s {db.round_trips:>10} statements")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--funds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0002)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    clients = [make_client(f"C{i}", args.funds, rng) for i in range(args.clients)]
+    rows = sum(1 + sum(1 + len(f["holdings"]) + len(f["sectors"]) for f in c["funds"]) for c in clients)
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "ClientPortfolio.json")
+    with open(path, "w") as f:
+        json.dump(clients, f)
+    print(f"{args.clients} clients, {rows} rows, {os.path.getsize(path) / 1e6:.1f} MB, "
+          f"{args.latency * 1000:.2f} ms per statement\n")
+
+    old_db = StandInDB()
+    timed("per-row inserts", rows, lambda: ingest_per_row(_Conn(old_db, args.latency), path), old_db)
+
+    db = StandInDB()
+    conn = _Conn(db, args.latency)
+    quiet = lambda: ingest(conn, path)  # noqa: E731
+    timed("batched ingest", rows, quiet, db)
+    timed("re-ingest, unchanged", rows, quiet, db)
+
+    for client in rng.sample(clients, max(1, args.clients // 100)):
+        client["funds"][0]["amount"] += 1
+    with open(path, "w") as f:
+        json.dump(clients, f)
+    timed("re-ingest, 1% changed", rows, quiet, db)
+
+    counts = [db.conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("clients", "funds", "holdings")]
+    assert counts == [args.clients, args.clients * args.funds, sum(len(f["holdings"]) for c in clients
+                                                                   for f in c["funds"])], counts
+    assert sum(1 for _ in iter_clients(path, read_size=4096)) == args.clients
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Cold start of the pML2 sector recommender: import-and-train vs trained artifacts.
+
+Each scenario runs in a fresh interpreter and reports the time until the
+module is usable and the latency of the first and a warm prediction.
+
+    python benchmarks/bench_pml2_coldstart.py [--clients 2000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_portfolio_roundtrips import make_client
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import pML2
+mode, data = sys.argv[1], sys.argv[2]
+if mode == "train":
+    rec = pML2.SectorRecommender.from_trained(pML2.train_models(pML2.load_portfolios_from_json(data)))
+else:
+    rec = pML2.get_recommender()
+t1 = time.perf_counter()
+rec.recommend(pML2.new_customer_portfolio)
+t2 = time.perf_counter()
+rec.recommend(pML2.new_customer_portfolio)
+t3 = time.perf_counter()
+print(json.dumps({"ready": t1 - t0, "first": t2 - t1, "warm": t3 - t2}))
+"""
+
+
+def run(mode, data, artifact_dir):
+    env = dict(os.environ, PML2_ARTIFACT_DIR=artifact_dir, PYTHONPATH=BACKEND)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, mode, data], env=env, check=True,
+                         capture_output=True, text=True).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    tmp = tempfile.mkdtemp()
+    data = os.path.join(tmp, "ClientPortfolio.json")
+    with open(data, "w") as f:
+        json.dump([make_client(f"C{i}", rng.randint(1, 8), rng) for i in range(args.clients)], f)
+    artifact_dir = os.path.join(tmp, "artifacts")
+    subprocess.run([sys.executable, os.path.join(BACKEND, "pML2.py"), "train", "--data", data,
+                    "--artifact-dir", artifact_dir], check=True, capture_output=True)
+
+    print(f"{args.clients} training portfolios, best of {args.repeat}\n")
+    print(f"{'':<18} {'ready ms':>10} {'first pred ms':>14} {'warm pred ms':>13} {'process ms':>11}")
+    for label, mode in (("import-and-train", "train"), ("load artifacts", "load")):
+        runs = [run(mode, data, artifact_dir) for _ in range(args.repeat)]
+        best = {k: min(r[k] for r in runs) * 1000.0 for k in runs[0]}
+        print(f"{label:<18} {best['ready']:>10.1f} {best['first']:>14.1f} {best['warm']:>13.2f} {best['process']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Round trips and latency of the portfolio analysis data fetch vs fund count.
+
+Compares the old per-fund query loop (2N+1 queries) with
+portfolio_data.fetch_client_portfolio (3 queries).
+
+    python benchmarks/bench_portfolio_roundtrips.py
+"""
+import random
+import time
+
+from standin import StandInDB
+from portfolio_data import fetch_client_portfolio
+
+SECTORS = ["IT", "Banking", "FMCG", "Energy", "Pharma", "Auto", "Metals", "Telecom"]
+
+
+def make_client(client_id, n_funds, rng):
+    funds = []
+    for i in range(n_funds):
+        symbols = rng.sample(range(500), 25)
+        sectors = rng.sample(SECTORS, 4)
+        funds.append({
+            "fundCode": f"FUND_{i}",
+            "amount": rng.randint(1, 100) * 10000,
+            "holdings": {f"STK{s:03d}": 1 / 25 for s in symbols},
+            "sectors": {s: 0.25 for s in sectors},
+        })
+    return {"clientId": client_id, "currency": "INR", "funds": funds}
+
+
+def fetch_per_fund(cursor, client_id):
+    cursor.execute("SELECT * FROM funds WHERE clientId=%s", (client_id,))
+    funds = cursor.fetchall()
+    for fund in funds:
+        cursor.execute("SELECT stockSymbol, percent FROM holdings WHERE fundId=%s", (fund["fundId"],))
+        cursor.fetchall()
+    for fund in funds:
+        cursor.execute("SELECT sectorName, percent FROM sectors WHERE fundId=%s", (fund["fundId"],))
+        cursor.fetchall()
+
+
+def measure(db, fn, client_id, repeat=20):
+    db.round_trips = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cursor = db.cursor()
+        fn(cursor, client_id)
+        cursor.close()
+    elapsed = (time.perf_counter() - start) / repeat
+    return db.round_trips // repeat, elapsed * 1000.0
+
+
+def main():
+    rng = random.Random(42)
+    db = StandInDB()
+    counts = [1, 5, 10, 50, 100, 250]
+    db.load_portfolios([make_client(f"C{n}", n, rng) for n in counts])
+    print(f"{'funds':>6} {'per-fund trips':>15} {'per-fund ms':>12} {'batched trips':>14} {'batched ms':>11}")
+    for n in counts:
+        old_trips, old_ms = measure(db, fetch_per_fund, f"C{n}")
+        new_trips, new_ms = measure(db, fetch_client_portfolio, f"C{n}")
+        print(f"{n:>6} {old_trips:>15} {old_ms:>12.3f} {new_trips:>14} {new_ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
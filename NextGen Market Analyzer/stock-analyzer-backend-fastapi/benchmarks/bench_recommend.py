@@ -0,0 +1,67 @@
+"""Latency of /recommend scoring: per-row Python loop vs columnar scan vs KD index.
+
+    python benchmarks/bench_recommend.py [universe_size ...]
+"""
+import random
+import sys
+import time
+
+import standin  # noqa: F401  (puts the backend on sys.path)
+from stock_universe import SIMILARITY_METRICS, StockUniverse
+
+
+def make_rows(n, rng):
+    rows = []
+    for i in range(n):
+        row = {"stockSymbol": f"STK{i:06d}"}
+        for m in SIMILARITY_METRICS:
+            row[m] = None if rng.random() < 0.05 else round(rng.uniform(0, 3), 2)
+        rows.append(row)
+    return rows
+
+
+def legacy_top_n(rows, provided, top_n):
+    ranges = {}
+    for m in SIMILARITY_METRICS:
+        vals = [r[m] for r in rows if r.get(m) is not None]
+        mn, mx = min(vals), max(vals)
+        ranges[m] = mx - mn if (mx - mn) > 1e-9 else max(abs(mx), 1.0)
+    scored = []
+    for r in rows:
+        norms, missing = [], 0
+        for k, v in provided.items():
+            if r.get(k) is None:
+                norms.append(1.0)
+                missing += 1
+            else:
+                norms.append(min(1.0, abs(r[k] - v) / ranges[k]))
+        sim = max(0.0, 1.0 - sum(norms) / len(norms)) * 100.0
+        scored.append((missing == len(provided), -round(sim, 2), r["stockSymbol"]))
+    return sorted(scored, key=lambda x: (x[0], x[1]))[:top_n]
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    rng = random.Random(7)
+    provided = {"debtToEquityRatio": 1.1, "returnOnEquity": 0.18}
+    print(f"{'stocks':>8} {'loop ms':>10} {'columnar ms':>12} {'index ms':>10} {'snapshot build ms':>18}")
+    for n in sizes:
+        rows = make_rows(n, rng)
+        build_ms = timeit(lambda: StockUniverse(rows), 1)
+        universe = StockUniverse(rows)
+        loop_ms = timeit(lambda: legacy_top_n(rows, provided, 10), 3)
+        vec_ms = timeit(lambda: universe.top_n(provided, 10), 200)
+        universe.index.top_n(provided, 10)  # build the trees for this metric subset
+        index_ms = timeit(lambda: universe.index.top_n(provided, 10), 200)
+        print(f"{n:>8} {loop_ms:>10.3f} {vec_ms:>12.3f} {index_ms:>10.3f} {build_ms:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Sector recommendation throughput: one predict per portfolio vs batched predicts.
+
+Trains throwaway artifacts on synthetic portfolios, then reports
+portfolios/sec for batch sizes 1-10k, and for concurrent single-portfolio
+requests with and without the MicroBatcher.
+
+    python benchmarks/bench_recommend_sectors.py
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+import warnings
+
+from bench_portfolio_roundtrips import make_client
+from micro_batch import MicroBatcher
+import pML2
+
+SIZES = [1, 10, 100, 1000, 10000]
+LOOP_CAP = 300   # the per-portfolio loop is timed on at most this many portfolios
+
+
+def portfolios(n, rng):
+    return [pML2.analyzer_input(make_client(f"C{i}", rng.randint(1, 8), rng)) for i in range(n)]
+
+
+def rate(fn, items):
+    start = time.perf_counter()
+    fn(items)
+    return len(items) / (time.perf_counter() - start)
+
+
+async def concurrent(items, submit):
+    start = time.perf_counter()
+    await asyncio.gather(*[submit(p) for p in items])
+    return len(items) / (time.perf_counter() - start)
+
+
+def main():
+    warnings.filterwarnings("ignore")
+    rng = random.Random(3)
+    artifact_dir = tempfile.mkdtemp()
+    pML2.save_artifacts(pML2.train_models(portfolios(2000, rng)), artifact_dir, "bench")
+    rec = pML2.SectorRecommender(artifact_dir).load()
+    batch = portfolios(max(SIZES), rng)
+    rec.recommend_many(batch[:10])
+
+    print(f"{'batch':>7} {'per-portfolio /s':>17} {'batched /s':>11} {'speedup':>8}")
+    for n in SIZES:
+        single = rate(lambda xs: [rec.recommend(p) for p in xs], batch[:min(n, LOOP_CAP)])
+        batched = max(rate(rec.recommend_many, batch[:n]) for _ in range(3 if n <= 1000 else 1))
+        print(f"{n:>7} {single:>17,.0f} {batched:>11,.0f} {batched / single:>7.1f}x")
+
+    async def unbatched(p):
+        return await asyncio.get_running_loop().run_in_executor(None, rec.recommend, p)
+
+    batcher = MicroBatcher(rec.recommend_many)
+    print(f"\n{'concurrent':>10} {'unbatched /s':>13} {'micro-batched /s':>17} {'avg batch':>10}")
+    for n in (10, 100, 1000):
+        plain = asyncio.run(concurrent(batch[:min(n, LOOP_CAP)], unbatched))
+        batcher.batches = batcher.items = 0
+        coalesced = asyncio.run(concurrent(batch[:n], batcher.submit))
+        print(f"{n:>10} {plain:>13,.0f} {coalesced:>17,.0f} {batcher.stats()['avg_batch']:>10}")
+
+
+if __name__ == "__main__":
+    main()
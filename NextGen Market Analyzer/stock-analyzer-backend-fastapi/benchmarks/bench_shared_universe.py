@@ -0,0 +1,95 @@
+"""Memory per worker with a private StockUniverse each vs one shared snapshot file.
+
+Starts ``workers`` processes that each load the universe (from rows, as the
+MySQL loader does, or by mapping the snapshot) and answer a few /recommend
+queries, then reports their private (USS) and proportional (PSS) memory
+from /proc/<pid>/smaps_rollup, so Linux only.
+
+    python benchmarks/bench_shared_universe.py [--stocks 500000] [--workers 1 2 4 8]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import standin  # noqa: F401  (puts the backend on sys.path)
+from evaluator import StockAnalyzerModel
+from generators import iter_stocks
+from shared_universe import MappedUniverse, Snapshot, columns_from_rows, write_snapshot
+from stock_universe import StockUniverse
+
+QUERIES = [{"returnOnEquity": 0.18, "debtToEquityRatio": 1.0}, {"returnOnAssets": 0.08}]
+
+
+def rollup(pid: int) -> dict:
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Pss", "Private_Clean", "Private_Dirty"):
+                out[name] = int(rest.split()[0]) * 1024
+    return {"uss": out["Private_Clean"] + out["Private_Dirty"], "pss": out["Pss"]}
+
+
+def iter_stocks_rows(n):
+    for s in iter_stocks(n):
+        yield {"stockSymbol": s["stockSymbol"], **s["parameters"]}
+
+
+def worker(mode, source, ready, done):
+    model = StockAnalyzerModel()
+    if mode == "private":
+        universe = StockUniverse(list(iter_stocks_rows(source)))
+    else:
+        universe = MappedUniverse(Snapshot(source))
+    for provided in QUERIES:
+        matches = universe.index.top_n(provided, 10)
+        list(universe.evaluations(model, [i for i, _, _ in matches]).records())
+    ready.set()
+    done.wait()
+
+
+def run(mode, source, workers):
+    ctx = mp.get_context("spawn")
+    done = ctx.Event()
+    procs = []
+    for _ in range(workers):
+        ready = ctx.Event()
+        p = ctx.Process(target=worker, args=(mode, source, ready, done))
+        p.start()
+        procs.append((p, ready))
+    for _, ready in procs:
+        ready.wait()
+    usage = [rollup(p.pid) for p, _ in procs]
+    done.set()
+    for p, _ in procs:
+        p.join()
+    return sum(u["uss"] for u in usage) / workers, sum(u["pss"] for u in usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=500000)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "universe.snap")
+    start = time.perf_counter()
+    header = write_snapshot(path, *columns_from_rows(list(iter_stocks_rows(args.stocks))), StockAnalyzerModel())
+    print(f"snapshot: {header['size']:,} stocks, {os.path.getsize(path) / 2**20:.1f} MiB, "
+          f"written in {time.perf_counter() - start:.2f}s\n")
+
+    mib = 2 ** 20
+    print(f"{'workers':>8} {'private USS/worker':>19} {'shared USS/worker':>18} {'private PSS total':>18} "
+          f"{'shared PSS total':>17}")
+    for n in args.workers:
+        private_uss, private_pss = run("private", args.stocks, n)
+        shared_uss, shared_pss = run("shared", path, n)
+        print(f"{n:>8} {private_uss / mib:>15.1f} MiB {shared_uss / mib:>14.1f} MiB "
+              f"{private_pss / mib:>14.1f} MiB {shared_pss / mib:>13.1f} MiB")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Serving stock evaluations from stock_scores vs scoring them live.
+
+Loads ``--copies`` perturbed copies of StockTickerSymbols.json into the
+SQLite stand-in, runs the scoring job, then times the rows of one
+``/evaluate/batch`` chunk scored live and read from the stored columns
+(scores only and with feedback text), ``evaluate`` per row, and a second
+job run that finds nothing to re-score.
+
+    python benchmarks/bench_stock_scores.py [--copies 50] [--chunk 1000]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from standin import StandInDB
+from evaluator import StockAnalyzerModel
+from stock_scores import StoredScoreModel, refresh_scores, scored_stocks_in_sql
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=50)
+    parser.add_argument("--chunk", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    stocks = json.load(open(os.path.join(BACKEND, "..", "..", "public", "StockTickerSymbols.json")))
+    db = StandInDB()
+    db.load_stocks([{**s, "stockSymbol": f"{s['stockSymbol']}{k}",
+                     "priceEarningsRatio": (s.get("priceEarningsRatio") or 10) * rng.uniform(0.5, 2)}
+                    for k in range(args.copies) for s in stocks])
+
+    live, stored = StockAnalyzerModel(), StoredScoreModel(loader=None)
+    start = time.perf_counter()
+    counts = refresh_scores(db, live)
+    print(f"job: {counts['rescored']:,} of {counts['stocks']:,} stocks scored in {time.perf_counter() - start:.3f} s")
+    start = time.perf_counter()
+    counts = refresh_scores(db, live)
+    print(f"rerun: {counts['rescored']:,} re-scored, {time.perf_counter() - start:.3f} s\n")
+
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT stockSymbol FROM stocks ORDER BY stockSymbol LIMIT %s", (args.chunk,))
+    symbols = tuple(r["stockSymbol"] for r in cursor.fetchall())
+    cursor.execute(scored_stocks_in_sql(len(symbols)), symbols)
+    rows = cursor.fetchall()
+
+    print(f"{'(' + format(len(rows), ',') + ' stocks)':<24} {'live':>10} {'stored':>10}")
+    for name, text in (("scores", False), ("scores + text", True)):
+        times = [timed(lambda: list(m.evaluate_rows(rows, text=text).records(text=text))) for m in (live, stored)]
+        print(f"{name:<24} {times[0] * 1e3:>7.2f} ms {times[1] * 1e3:>7.2f} ms")
+    times = [timed(lambda: [m.evaluate(r) for r in rows]) for m in (live, stored)]
+    print(f"{'evaluate per row':<24} {times[0] / len(rows) * 1e6:>7.2f} us {times[1] / len(rows) * 1e6:>7.2f} us")
+
+
+if __name__ == "__main__":
+    main()
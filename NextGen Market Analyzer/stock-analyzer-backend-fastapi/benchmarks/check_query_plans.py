@@ -0,0 +1,158 @@
+"""Query-plan check for every endpoint query: fails when one needs a full table scan.
+
+Runs EXPLAIN for each query the API and loaders issue, prints the plans and
+exits with status 1 if a table is scanned in full where an index lookup is
+expected. By default the plans come from the SQLite stand-in with the
+migration indexes applied; ``--mysql`` asks the configured MySQL server
+instead (run migrations.py and load data first, since MySQL prefers scans
+on near-empty tables). ``--save`` writes the captured plans as JSON.
+
+SQLite's planner only approximates MySQL's access paths: a passing stand-in
+run shows that a usable index exists for every lookup, not that MySQL will
+pick it. Run ``--mysql`` against a loaded database to confirm the real plans.
+tests/test_query_plans.py runs the stand-in check under pytest for CI.
+
+    python benchmarks/check_query_plans.py [--mysql] [--no-indexes] [--save plans.json]
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from standin import StandInDB
+from database import STOCK_DB, PORTFOLIO_DB
+from portfolio_data import (
+    CLIENTS_SQL, FUNDS_SQL, HOLDINGS_SQL, SECTORS_SQL, CLIENT_HOLDINGS_SQL, CLIENT_SECTORS_SQL,
+    funds_in_sql, holdings_in_sql, sectors_in_sql,
+)
+from exposure import STOCK_EXPOSURE_SQL, SECTOR_EXPOSURE_SQL, DIVERSIFICATION_SQL
+from pagination import keyset_query
+from stock_universe import STOCKS_SQL, STOCK_SYMBOLS_SQL, stocks_in_sql
+from stock_scores import SCORED_STOCK_SQL, REFRESH_PAGE_SQL, scored_stocks_in_sql, stored_scores_in_sql
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class QueryCheck(NamedTuple):
+    name: str
+    database: str
+    sql: str
+    params: Tuple[Any, ...]
+    scans: Tuple[str, ...] = ()   # tables this query is expected to read in full
+
+
+CLIENTS = ("C101", "C102", "C103")
+SYMBOLS = ("INFY", "TCS", "ITC")
+
+QUERIES: List[QueryCheck] = [
+    QueryCheck("POST /evaluate", STOCK_DB, SCORED_STOCK_SQL, ("INFY",)),
+    QueryCheck("POST /evaluate/batch", STOCK_DB, scored_stocks_in_sql(len(SYMBOLS)), SYMBOLS),
+    QueryCheck("stored scores lookup", STOCK_DB, stored_scores_in_sql(len(SYMBOLS)), SYMBOLS),
+    QueryCheck("stock_scores refresh page", STOCK_DB, REFRESH_PAGE_SQL, ("INFY", 5000)),
+    QueryCheck("GET /stocks", STOCK_DB, STOCK_SYMBOLS_SQL, (), scans=("stocks",)),
+    QueryCheck("GET /stocks?after&limit", STOCK_DB,
+               *keyset_query("stocks", "stockSymbol", "stockSymbol", after="INFY", limit=100)),
+    QueryCheck("GET /stocks?prefix", STOCK_DB,
+               *keyset_query("stocks", "stockSymbol", "stockSymbol", prefix="IN", limit=100)),
+    QueryCheck("stock universe load", STOCK_DB, STOCKS_SQL, (), scans=("stocks",)),
+    QueryCheck("stock universe refresh", STOCK_DB, stocks_in_sql(len(SYMBOLS)), SYMBOLS),
+    QueryCheck("GET /clients", PORTFOLIO_DB, CLIENTS_SQL, (), scans=("clients",)),
+    QueryCheck("GET /clients?after&limit", PORTFOLIO_DB, *keyset_query("clients", "clientId", after="C101", limit=100)),
+    QueryCheck("portfolio funds", PORTFOLIO_DB, FUNDS_SQL, ("C101",)),
+    QueryCheck("portfolio holdings", PORTFOLIO_DB, HOLDINGS_SQL, ("C101",)),
+    QueryCheck("portfolio sectors", PORTFOLIO_DB, SECTORS_SQL, ("C101",)),
+    QueryCheck("GET /client/{id}/holdings", PORTFOLIO_DB, STOCK_EXPOSURE_SQL, ("C101",)),
+    QueryCheck("GET /client/{id}/sectors", PORTFOLIO_DB, SECTOR_EXPOSURE_SQL, ("C101",)),
+    QueryCheck("GET /portfolio/{id}/analysis", PORTFOLIO_DB, DIVERSIFICATION_SQL, ("C101",)),
+    QueryCheck("exposure refresh holdings", PORTFOLIO_DB, CLIENT_HOLDINGS_SQL, ("C101",)),
+    QueryCheck("exposure refresh sectors", PORTFOLIO_DB, CLIENT_SECTORS_SQL, ("C101",)),
+    QueryCheck("exposure refresh clear", PORTFOLIO_DB,
+               "DELETE FROM client_stock_exposure WHERE clientId IN (%s, %s, %s)", CLIENTS),
+    QueryCheck("recommend-sectors funds", PORTFOLIO_DB, funds_in_sql(len(CLIENTS)), CLIENTS),
+    QueryCheck("recommend-sectors holdings", PORTFOLIO_DB, holdings_in_sql(len(CLIENTS)), CLIENTS),
+    QueryCheck("recommend-sectors sectors", PORTFOLIO_DB, sectors_in_sql(len(CLIENTS)), CLIENTS),
+    QueryCheck("ingest existing funds", PORTFOLIO_DB,
+               "SELECT clientId, fundCode, fundId, contentHash FROM funds WHERE clientId IN (%s, %s, %s)", CLIENTS),
+    QueryCheck("ingest replace holdings", PORTFOLIO_DB, "DELETE FROM holdings WHERE fundId IN (%s, %s)", (1, 2)),
+    QueryCheck("ingest replace sectors", PORTFOLIO_DB, "DELETE FROM sectors WHERE fundId IN (%s, %s)", (1, 2)),
+]
+
+
+def sqlite_plan(db: StandInDB, check: QueryCheck) -> Tuple[List[str], List[str]]:
+    """Plan lines and the tables scanned in full, from EXPLAIN QUERY PLAN."""
+    rows = db.conn.execute("EXPLAIN QUERY PLAN " + check.sql.replace("%s", "?"), check.params).fetchall()
+    lines = [r[-1] for r in rows]
+    scanned = []
+    for line in lines:
+        words = line.split()
+        # "SCAN t" reads the table; "SCAN t USING [COVERING] INDEX i" walks an index
+        if words[0] == "SCAN" and "INDEX" not in words and not words[1].startswith("("):
+            scanned.append(words[1])
+    return lines, scanned
+
+
+def mysql_plan(cursors: Dict[str, Any], check: QueryCheck) -> Tuple[List[str], List[str]]:
+    """Plan rows and the tables scanned in full (access type ALL), from EXPLAIN."""
+    cursor = cursors[check.database]
+    cursor.execute("EXPLAIN " + check.sql, check.params)
+    rows = cursor.fetchall()
+    lines = [f"{r['table']}: type={r['type']} key={r['key']} rows={r['rows']} {r.get('Extra') or ''}".strip()
+             for r in rows]
+    aliases = _aliases(check.sql)
+    scanned = [aliases.get(r["table"], r["table"]) for r in rows if r["type"] == "ALL"]
+    return lines, scanned
+
+
+def _aliases(sql: str) -> Dict[str, str]:
+    words = sql.replace(",", " ").split()
+    out = {}
+    for i, w in enumerate(words[:-1]):
+        if w.upper() in ("FROM", "JOIN") and i + 2 < len(words) and words[i + 2].upper() not in (
+                "ON", "WHERE", "JOIN", "GROUP", "ORDER", "LIMIT"):
+            out[words[i + 2]] = words[i + 1]
+    return out
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mysql", action="store_true", help="explain against the configured MySQL server")
+    parser.add_argument("--no-indexes", action="store_true", help="stand-in without the migration indexes")
+    parser.add_argument("--save", help="write the captured plans to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.mysql:
+        import mysql.connector
+        from database import HOST, USER, PASSWORD
+
+        conns = {db: mysql.connector.connect(host=HOST, user=USER, password=PASSWORD, database=db)
+                 for db in (STOCK_DB, PORTFOLIO_DB)}
+        cursors = {db: conn.cursor(dictionary=True) for db, conn in conns.items()}
+        explain = lambda check: mysql_plan(cursors, check)  # noqa: E731
+    else:
+        db = StandInDB(indexes=not args.no_indexes)
+        db.load_stocks(json.load(open(os.path.join(BACKEND, "..", "..", "public", "StockTickerSymbols.json"))))
+        db.load_portfolios(json.load(open(os.path.join(BACKEND, "ClientPortfolio.json"))))
+        explain = lambda check: sqlite_plan(db, check)  # noqa: E731
+
+    failures = 0
+    captured: Dict[str, Dict[str, Any]] = {}
+    for check in QUERIES:
+        lines, scanned = explain(check)
+        unexpected = [t for t in scanned if t not in check.scans]
+        status = "FULL SCAN: " + ", ".join(unexpected) if unexpected else "ok"
+        failures += bool(unexpected)
+        captured[check.name] = {"database": check.database, "plan": lines, "full_scans": scanned}
+        print(f"{check.name:<30} {status}")
+        for line in lines:
+            print(f"    {line}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(captured, f, indent=2)
+    print(f"\n{len(QUERIES) - failures}/{len(QUERIES)} queries use an index for their lookups")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Seeded synthetic data in the shapes of StockTickerSymbols.json and ClientPortfolio.json.
+
+Everything is generated lazily from one ``random.Random(seed)``, so the same
+seed and sizes always give the same data, and files with millions of rows
+are written without holding them in memory.
+
+    python benchmarks/generators.py stocks 1000000 stocks.json [--seed 1]
+    python benchmarks/generators.py portfolios 100000 portfolios.json [--stocks 5000] [--seed 1]
+"""
+import argparse
+import json
+import random
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+SECTORS = ["IT", "Banking", "FMCG", "Energy", "Pharma", "Auto", "Metals", "Telecom",
+           "Healthcare", "Utilities", "Realty", "Media"]
+
+# parameter -> (low, high, decimals, share of NULLs)
+STOCK_PARAMETERS = {
+    "priceEarningsRatio": (2.0, 120.0, 2, 0.02),
+    "earningsPerShare": (-2.0, 40.0, 2, 0.02),
+    "dividendYield": (0.0, 8.0, 2, 0.05),
+    "marketCap": (1e9, 3e12, 0, 0.01),
+    "debtToEquityRatio": (0.0, 4.0, 2, 0.03),
+    "returnOnEquity": (-0.1, 0.45, 3, 0.03),
+    "returnOnAssets": (-0.05, 0.25, 3, 0.03),
+    "currentRatio": (0.3, 4.0, 2, 0.03),
+    "quickRatio": (0.2, 3.0, 2, 0.03),
+    "bookValuePerShare": (0.5, 400.0, 2, 0.02),
+}
+
+
+def symbol(i: int, width: int = 3) -> str:
+    return f"STK{i + 1:0{width}d}"
+
+
+def symbol_width(n: int) -> int:
+    return max(3, len(str(n)))
+
+
+def iter_stocks(n: int, seed: int = 1) -> Iterator[Dict[str, Any]]:
+    """``n`` stocks named STK001, STK002, ... with plausible, partly missing parameters."""
+    rng = random.Random(seed)
+    width = symbol_width(n)
+    for i in range(n):
+        parameters = {}
+        for name, (low, high, decimals, nulls) in STOCK_PARAMETERS.items():
+            parameters[name] = None if rng.random() < nulls else round(rng.uniform(low, high), decimals)
+        yield {"stockSymbol": symbol(i, width), "parameters": parameters}
+
+
+def _weights(rng: random.Random, keys, decimals: int = 4) -> Dict[str, float]:
+    raw = [rng.random() + 0.05 for _ in keys]
+    total = sum(raw)
+    return {k: round(w / total, decimals) for k, w in zip(keys, raw)}
+
+
+def iter_portfolios(n: int, seed: int = 1, n_stocks: int = 500, funds: Tuple[int, int] = (1, 8),
+                    holdings: Tuple[int, int] = (5, 40), sectors: Tuple[int, int] = (2, 6),
+                    first_client: int = 101) -> Iterator[Dict[str, Any]]:
+    """``n`` clients C101, C102, ... whose funds hold stocks of an ``n_stocks`` universe.
+
+    Fund sizes are drawn uniformly from the given (min, max) ranges; holding
+    and sector weights are fractions summing to about 1, as in ClientPortfolio.json.
+    """
+    rng = random.Random(seed)
+    width = symbol_width(n_stocks)
+    for c in range(n):
+        client_funds = []
+        for f in range(rng.randint(*funds)):
+            picked = rng.sample(range(n_stocks), min(n_stocks, rng.randint(*holdings)))
+            client_funds.append({
+                "fundCode": f"FUND_{f}",
+                "amount": rng.randint(1, 200) * 10000,
+                "holdings": _weights(rng, [symbol(s, width) for s in picked]),
+                "sectors": _weights(rng, rng.sample(SECTORS, rng.randint(*sectors))),
+            })
+        yield {"clientId": f"C{first_client + c}", "currency": rng.choice(["INR", "USD", "EUR"]),
+               "funds": client_funds}
+
+
+def write_json_array(path: str, items: Iterable[Dict[str, Any]]) -> int:
+    """Write ``items`` as a JSON array one element at a time; returns the count."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for item in items:
+            f.write(",\n  " if count else "\n  ")
+            f.write(json.dumps(item))
+            count += 1
+        f.write("\n]\n" if count else "]\n")
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=["stocks", "portfolios"])
+    parser.add_argument("count", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stocks", type=int, default=500, help="universe size portfolios draw holdings from")
+    args = parser.parse_args()
+
+    if args.kind == "stocks":
+        items = iter_stocks(args.count, args.seed)
+    else:
+        items = iter_portfolios(args.count, args.seed, n_stocks=args.stocks)
+    print(f"Wrote {write_json_array(args.path, items)} {args.kind} to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Concurrency load test for the async API against the SQLite stand-in.
+
+Every query waits ``--latency`` seconds to model the MySQL round trip. The
+async handlers in main.py are compared with the previous design: a sync
+handler that blocks on the query inside Starlette's threadpool, which is
+capped at 40 threads.
+
+    python benchmarks/load_test.py --latency 0.1 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from standin import StandInDB
+
+import main
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_db() -> StandInDB:
+    db = StandInDB()
+    with open(os.path.join(HERE, "ClientPortfolio.json")) as f:
+        db.load_portfolios(json.load(f))
+    stocks = [{"stockSymbol": f"STK{i:03d}", "parameters": {"priceEarningsRatio": 10.0 + i, "returnOnEquity": 0.1}}
+              for i in range(1, 101)]
+    db.load_stocks(stocks)
+    return db
+
+
+def legacy_app(db: StandInDB, latency: float) -> FastAPI:
+    """The pre-async shape of /client/{clientId}/sectors: blocking query in a sync handler."""
+    app = FastAPI()
+    cursor_factory = db.cursor_factory(latency)
+
+    @app.get("/client/{clientId}/sectors")
+    def client_sectors(clientId: str):
+        with cursor_factory() as cursor:
+            cursor.execute("""
+                SELECT s.sectorName, SUM((s.percent/100.0) * f.amount)/SUM(f.amount) AS weight
+                FROM sectors s JOIN funds f ON s.fundId=f.fundId
+                WHERE f.clientId=%s GROUP BY s.sectorName
+            """, (clientId,))
+            rows = cursor.fetchall()
+        return [{"sectorName": r["sectorName"], "weightPct": round((r["weight"] or 0.0) * 100, 4)} for r in rows]
+
+    return app
+
+
+async def run(app, path: str, concurrency: int, total: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = iter(range(total))
+
+        async def worker():
+            for _ in queue:
+                r = await client.get(path)
+                r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated seconds per query")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[10, 40, 100, 200, 400])
+    args = parser.parse_args()
+
+    db = build_db()
+    main.portfolio_cursor = db.async_cursor_factory(args.latency)
+    main.stock_cursor = db.async_cursor_factory(args.latency)
+    old = legacy_app(db, args.latency)
+    path = "/client/C101/sectors"
+
+    print(f"latency {args.latency * 1000:.0f} ms/query, {args.requests} requests per run")
+    print(f"{'concurrency':>11} {'sync+threadpool req/s':>22} {'async req/s':>12}")
+    for c in args.concurrency:
+        old_rps = asyncio.run(run(old, path, c, args.requests))
+        new_rps = asyncio.run(run(main.app, path, c, args.requests))
+        print(f"{c:>11} {old_rps:>22.0f} {new_rps:>12.0f}")
+
+
+if __name__ == "__main__":
+    main_()
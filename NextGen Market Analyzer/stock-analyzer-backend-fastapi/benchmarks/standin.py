@@ -0,0 +1,249 @@
+"""SQLite-backed stand-in for the MySQL databases, used by the benchmarks.
+
+Mimics the parts of mysql.connector the backend relies on: ``%s``
+placeholders, dictionary cursors and fetchone/fetchall/fetchmany. Every
+``execute`` is counted as one round trip.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stocks (
+    stockSymbol VARCHAR(50) PRIMARY KEY,
+    priceEarningsRatio DOUBLE,
+    earningsPerShare DOUBLE,
+    dividendYield DOUBLE,
+    marketCap DOUBLE,
+    debtToEquityRatio DOUBLE,
+    returnOnEquity DOUBLE,
+    returnOnAssets DOUBLE,
+    currentRatio DOUBLE,
+    quickRatio DOUBLE,
+    bookValuePerShare DOUBLE
+);
+CREATE TABLE IF NOT EXISTS stock_scores (
+    stockSymbol VARCHAR(50) PRIMARY KEY,
+    inputHash CHAR(40),
+    quality INT,
+    value INT,
+    overall INT,
+    feedback TEXT,
+    summary TEXT,
+    scoredAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS clients (
+    clientId VARCHAR(20) PRIMARY KEY,
+    currency VARCHAR(10)
+);
+CREATE TABLE IF NOT EXISTS funds (
+    fundId INTEGER PRIMARY KEY AUTOINCREMENT,
+    clientId VARCHAR(20),
+    fundCode VARCHAR(50),
+    amount DOUBLE,
+    contentHash CHAR(40),
+    UNIQUE (clientId, fundCode)
+);
+CREATE TABLE IF NOT EXISTS holdings (
+    holdingId INTEGER PRIMARY KEY AUTOINCREMENT,
+    fundId INT,
+    stockSymbol VARCHAR(50),
+    percent DOUBLE
+);
+CREATE TABLE IF NOT EXISTS sectors (
+    sectorId INTEGER PRIMARY KEY AUTOINCREMENT,
+    fundId INT,
+    sectorName VARCHAR(100),
+    percent DOUBLE
+);
+CREATE TABLE IF NOT EXISTS client_stock_exposure (
+    clientId VARCHAR(20),
+    stockSymbol VARCHAR(50),
+    weight DOUBLE,
+    PRIMARY KEY (clientId, stockSymbol)
+);
+CREATE TABLE IF NOT EXISTS client_sector_exposure (
+    clientId VARCHAR(20),
+    sectorName VARCHAR(100),
+    weight DOUBLE,
+    PRIMARY KEY (clientId, sectorName)
+);
+CREATE TABLE IF NOT EXISTS client_diversification (
+    clientId VARCHAR(20) PRIMARY KEY,
+    fundOverlapScore DOUBLE,
+    sectorScore DOUBLE,
+    finalDiversificationScore DOUBLE,
+    sectorDistribution TEXT,
+    updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class StandInCursor:
+    def __init__(self, db: "StandInDB", dictionary: bool = True):
+        self.db = db
+        self.dictionary = dictionary
+        self._cur = db.conn.cursor()
+
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip([d[0] for d in self._cur.description], row))
+
+    def execute(self, query, params=()):
+        self.db.round_trips += 1
+        self._cur.execute(query.replace("%s", "?"), tuple(params or ()))
+
+    def executemany(self, query, seq_params):
+        self.db.round_trips += 1
+        self._cur.executemany(query.replace("%s", "?"), [tuple(p) for p in seq_params])
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    def __iter__(self):
+        for row in self._cur:
+            yield self._row(row)
+
+    def close(self):
+        self._cur.close()
+
+
+class AsyncStandInCursor:
+    """aiomysql-style cursor over a :class:`StandInCursor`; ``latency`` simulates the network."""
+
+    def __init__(self, cursor: StandInCursor, latency: float = 0.0):
+        self._cursor = cursor
+        self.latency = latency
+
+    async def execute(self, query, params=()):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._cursor.execute(query, params)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    async def close(self):
+        self._cursor.close()
+
+
+class StandInDB:
+    def __init__(self, path: str = ":memory:", indexes: bool = True):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        if indexes:
+            self.create_indexes()
+        self.round_trips = 0
+
+    def create_indexes(self):
+        """The secondary indexes the migrations add in MySQL."""
+        from migrations import INDEXES
+
+        for specs in INDEXES.values():
+            for table, name, columns in specs:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+    def cursor(self, dictionary: bool = True):
+        return StandInCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    def load_portfolios(self, portfolios, materialize: bool = True):
+        from exposure import refresh_clients
+
+        cur = self.conn.cursor()
+        for client in portfolios:
+            cur.execute("INSERT OR IGNORE INTO clients VALUES (?, ?)", (client["clientId"], client["currency"]))
+            for fund in client["funds"]:
+                cur.execute("INSERT INTO funds (clientId, fundCode, amount) VALUES (?, ?, ?)",
+                            (client["clientId"], fund["fundCode"], fund["amount"]))
+                fund_id = cur.lastrowid
+                cur.executemany("INSERT INTO holdings (fundId, stockSymbol, percent) VALUES (?, ?, ?)",
+                                [(fund_id, s, p * 100) for s, p in fund["holdings"].items()])
+                cur.executemany("INSERT INTO sectors (fundId, sectorName, percent) VALUES (?, ?, ?)",
+                                [(fund_id, s, p * 100) for s, p in fund["sectors"].items()])
+        if materialize:
+            refresh_clients(StandInCursor(self, dictionary=False), [client["clientId"] for client in portfolios])
+        self.conn.commit()
+
+    def load_stocks(self, stocks):
+        cols = ["priceEarningsRatio", "earningsPerShare", "dividendYield", "marketCap", "debtToEquityRatio",
+                "returnOnEquity", "returnOnAssets", "currentRatio", "quickRatio", "bookValuePerShare"]
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO stocks (stockSymbol, {', '.join(cols)}) VALUES ({', '.join('?' * 11)})",
+            [(s["stockSymbol"], *[s["parameters"].get(c) for c in cols]) for s in stocks],
+        )
+        self.conn.commit()
+
+    def cursor_factory(self, latency: float = 0.0):
+        """Drop-in for ``database.stock_cursor``; blocks for ``latency`` per query."""
+        db = self
+
+        class _Slow(StandInCursor):
+            def execute(self, query, params=()):
+                if latency:
+                    time.sleep(latency)
+                super().execute(query, params)
+
+        @contextmanager
+        def cursor(dictionary: bool = True):
+            c = _Slow(db, dictionary=dictionary)
+            try:
+                yield c
+            finally:
+                c.close()
+
+        return cursor
+
+    def async_cursor_factory(self, latency: float = 0.0):
+        """Drop-in for ``async_database.stock_cursor``; awaits ``latency`` per query."""
+        @asynccontextmanager
+        async def cursor(dictionary: bool = True, unbuffered: bool = False):
+            c = AsyncStandInCursor(self.cursor(dictionary=dictionary), latency)
+            try:
+                yield c
+            finally:
+                await c.close()
+
+        return cursor
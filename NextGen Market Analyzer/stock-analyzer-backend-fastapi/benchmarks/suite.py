@@ -0,0 +1,275 @@
+"""Benchmark suite: scoring micro-benchmarks and end-to-end endpoints on seeded data.
+
+Data comes from generators.py with a fixed seed, so runs at the same scale
+are comparable. Micro-benchmarks call the scoring code directly; endpoint
+benchmarks drive the app in-process against the SQLite stand-in. Results
+are written as JSON; ``--compare`` checks a run against a saved baseline and
+exits with status 1 when a case lost more than ``--tolerance`` of its throughput.
+
+    python benchmarks/suite.py --scale small --save results.json
+    python benchmarks/suite.py --scale small --compare results.json [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from generators import iter_portfolios, iter_stocks
+from standin import StandInDB
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO = os.path.dirname(os.path.dirname(BACKEND))
+
+SCALES = {
+    "small": {"stocks": 2000, "portfolios": 200, "requests": 50, "repeat": 5},
+    "medium": {"stocks": 20000, "portfolios": 2000, "requests": 200, "repeat": 5},
+    "large": {"stocks": 200000, "portfolios": 20000, "requests": 1000, "repeat": 5},
+}
+LOOP_LIMIT = 20000   # per-row loops are timed on at most this many items
+MIN_SAMPLE = 0.05    # seconds per timed sample
+TOLERANCE = 0.2      # throughput drop reported as a regression
+
+
+class Case(NamedTuple):
+    name: str
+    kind: str                  # "micro" or "endpoint"
+    items: int                 # work items per run, for items/second
+    run: Callable[[], Any]
+
+
+def measure(case: Case, repeat: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    case.run()   # warm-up: caches, lazy imports, first-use index builds
+    # short cases are looped so every sample lasts at least MIN_SAMPLE seconds
+    loops = max(1, math.ceil(MIN_SAMPLE / max(time.perf_counter() - start, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            case.run()
+        times.append((time.perf_counter() - start) / loops)
+    best = min(times)
+    # throughput from the fastest sample: the least disturbed by other load on the machine
+    return {
+        "kind": case.kind,
+        "items": case.items,
+        "repeat": repeat,
+        "loops": loops,
+        "seconds_median": statistics.median(times),
+        "seconds_min": best,
+        "per_second": case.items / best if best else float("inf"),
+    }
+
+
+def load_root_analyzer():
+    """portfolioAnalyzeEvaluator.py at the repository root; it prints a sample report on import."""
+    spec = importlib.util.spec_from_file_location("portfolioAnalyzeEvaluator",
+                                                  os.path.join(REPO, "portfolioAnalyzeEvaluator.py"))
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+
+def db_portfolio(portfolio: Dict[str, Any]):
+    """``portfolio`` as the (funds, holdings_by_fund, sectors_by_fund) rows analyze_portfolio reads."""
+    funds, holdings, sectors = [], {}, {}
+    for fund_id, fund in enumerate(portfolio["funds"]):
+        funds.append({"fundId": fund_id, "fundCode": fund["fundCode"], "amount": fund["amount"]})
+        holdings[fund_id] = [{"stockSymbol": s, "percent": p * 100} for s, p in fund["holdings"].items()]
+        sectors[fund_id] = [{"sectorName": s, "percent": p * 100} for s, p in fund["sectors"].items()]
+    return funds, holdings, sectors
+
+
+def micro_cases(stocks: List[Dict[str, Any]], portfolios: List[Dict[str, Any]]) -> List[Case]:
+    from evaluator import StockAnalyzerModel
+    from exposure import analyze_portfolio
+    from sector_features import SectorFeatures
+    from stock_universe import StockUniverse
+    import pML2
+
+    model = StockAnalyzerModel()
+    rows = [{"stockSymbol": s["stockSymbol"], **s["parameters"]} for s in stocks]
+    looped = rows[:LOOP_LIMIT]
+    columns = {c: [r.get(c) for r in rows] for c in rows[0]}
+    analyzer_inputs = [pML2.analyzer_input(p) for p in portfolios]
+    db_rows = [db_portfolio(p) for p in portfolios]
+    root = load_root_analyzer()
+    universe = StockUniverse(rows)
+    provided = {"debtToEquityRatio": 1.0, "returnOnEquity": 0.18, "returnOnAssets": 0.08}
+
+    def recommend():
+        matches = universe.index.top_n(provided, 10)
+        list(model.evaluate_rows([universe.rows[i] for i, _, _ in matches]).records())
+
+    return [
+        Case("StockAnalyzerModel.evaluate", "micro", len(looped), lambda: [model.evaluate(r) for r in looped]),
+        Case("StockAnalyzerModel.evaluate_many", "micro", len(rows), lambda: model.evaluate_many(columns)),
+        Case("StockAnalyzerModel.evaluate_many+text", "micro", len(looped),
+             lambda: list(model.evaluate_rows(looped).records())),
+        Case("pML2.PortfolioAnalyzer.evaluate", "micro", len(portfolios),
+             lambda: [pML2.PortfolioAnalyzer(p).evaluate() for p in analyzer_inputs]),
+        Case("portfolioAnalyzeEvaluator.PortfolioAnalyzer.evaluate", "micro", len(portfolios),
+             lambda: [root.PortfolioAnalyzer(p).evaluate() for p in analyzer_inputs]),
+        Case("SectorFeatures.extract", "micro", len(portfolios),
+             lambda: SectorFeatures().extract(analyzer_inputs)),
+        Case("analyze_portfolio", "micro", len(portfolios), lambda: [analyze_portfolio(*r) for r in db_rows]),
+        Case("recommend top 10", "micro", 1, recommend),
+    ]
+
+
+def endpoint_cases(stocks: List[Dict[str, Any]], portfolios: List[Dict[str, Any]], requests: int) -> List[Case]:
+    from fastapi.testclient import TestClient
+    import database
+    import main as api
+
+    db = StandInDB()
+    db.load_stocks(stocks)
+    db.load_portfolios(portfolios)
+    api.stock_cursor = api.portfolio_cursor = db.async_cursor_factory()
+    database.stock_cursor = database.portfolio_cursor = db.cursor_factory()
+    api.app.router.on_startup.clear()
+    api.app.router.on_shutdown.clear()
+    api.universe_cache.invalidate()
+    client = TestClient(api.app)
+
+    symbols = [s["stockSymbol"] for s in stocks]
+    clients = [p["clientId"] for p in portfolios]
+    picked_symbols = [symbols[i * len(symbols) // requests] for i in range(requests)]
+    picked_clients = [clients[i * len(clients) // requests] for i in range(requests)]
+
+    def each(method: str, make_url: Callable[[str], str], keys: List[str], body: Optional[Callable] = None):
+        def run():
+            for key in keys:
+                if method == "GET":
+                    response = client.get(make_url(key))
+                else:
+                    response = client.post(make_url(key), json=body(key))
+                response.raise_for_status()
+        return run
+
+    def uncached_evaluate():
+        api.response_cache.invalidate(api.STOCKS)
+        each("POST", lambda _: "/evaluate", picked_symbols, lambda s: {"stockSymbol": s})()
+
+    def batch_evaluate():
+        client.post("/evaluate/batch", json={"symbols": symbols}).raise_for_status()
+
+    def stream_stocks():
+        client.get("/stocks", params={"stream": "true"}).raise_for_status()
+
+    recommend_body = {"returnOnEquity": 0.18, "debtToEquityRatio": 1.0, "top_n": 10}
+    return [
+        Case("POST /evaluate", "endpoint", requests, uncached_evaluate),
+        Case("POST /evaluate/batch", "endpoint", len(symbols), batch_evaluate),
+        Case("GET /stocks?stream", "endpoint", len(symbols), stream_stocks),
+        Case("GET /portfolio/{id}/analysis", "endpoint", requests,
+             each("GET", lambda c: f"/portfolio/{c}/analysis", picked_clients)),
+        Case("GET /portfolio/{id}/overlap", "endpoint", requests,
+             each("GET", lambda c: f"/portfolio/{c}/overlap", picked_clients)),
+        Case("GET /client/{id}/holdings", "endpoint", requests,
+             each("GET", lambda c: f"/client/{c}/holdings", picked_clients)),
+        Case("POST /recommend", "endpoint", requests,
+             each("POST", lambda _: "/recommend", picked_symbols, lambda _: recommend_body)),
+    ]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print throughput against ``baseline``; returns the names of regressed cases."""
+    if (baseline.get("scale"), baseline.get("seed")) != (results["scale"], results["seed"]):
+        print(f"warning: baseline is scale={baseline.get('scale')} seed={baseline.get('seed')}, "
+              f"this run is scale={results['scale']} seed={results['seed']}")
+    regressed = []
+    print(f"\n{'case':<55} {'baseline /s':>13} {'now /s':>13} {'change':>8}")
+    for name, result in results["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            print(f"{name:<55} {'-':>13} {result['per_second']:>13,.1f} {'new':>8}")
+            continue
+        change = result["per_second"] / before["per_second"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<55} {before['per_second']:>13,.1f} {result['per_second']:>13,.1f} {change:>+8.1%}{flag}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", choices=["micro", "endpoint"], help="run one kind of benchmark only")
+    parser.add_argument("--filter", default="", help="run cases whose name contains this text")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="throughput drop (fraction) reported as a regression")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    baseline = None
+    if args.compare:
+        # read before running, so --save may overwrite the same file
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    scale = SCALES[args.scale]
+    stocks = list(iter_stocks(scale["stocks"], args.seed))
+    portfolios = list(iter_portfolios(scale["portfolios"], args.seed, n_stocks=scale["stocks"]))
+
+    cases: List[Case] = []
+    if args.only in (None, "micro"):
+        cases += micro_cases(stocks, portfolios)
+    if args.only in (None, "endpoint"):
+        cases += endpoint_cases(stocks, portfolios, scale["requests"])
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "sizes": scale,
+        "results": {},
+    }
+    print(f"{'case':<55} {'items':>8} {'best s':>10} {'items/s':>13}")
+    for case in cases:
+        if args.filter not in case.name:
+            continue
+        result = measure(case, scale["repeat"])
+        results["results"][case.name] = result
+        print(f"{case.name:<55} {case.items:>8} {result['seconds_min']:>10.4f} {result['per_second']:>13,.1f}")
+
+    regressed = compare(results, baseline, args.tolerance) if baseline is not None else []
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {len(results['results'])} results to {args.save}")
+    if regressed:
+        print(f"\n{len(regressed)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
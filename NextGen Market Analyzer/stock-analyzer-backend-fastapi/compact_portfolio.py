@@ -0,0 +1,260 @@
+"""Compact, array-backed client portfolios for holding many of them in memory.
+
+Stock symbols and sector names are interned once in the process-wide
+:data:`SYMBOLS` and :data:`SECTORS` tables; a fund stores integer ids and
+float weights in parallel NumPy arrays instead of a dict of string -> float,
+and funds and portfolios use ``__slots__``. Weights are fractions (percent /
+100), as in ClientPortfolio.json. Every analyzer (``exposure.analyze_portfolio``,
+both ``PortfolioAnalyzer`` classes and ``SectorFeatures``) accepts a
+:class:`CompactPortfolio` and returns the same result as for the dict form.
+
+Loaders read ClientPortfolio.json (:func:`iter_json`, streamed) or the
+portfolio_analyzer tables (:func:`iter_mysql`, a chunk of clients per three
+queries, or :func:`from_rows` for the rows of ``portfolio_data.fetch_client_portfolio``).
+"""
+import sys
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from overlap import FundOverlap
+
+ID_DTYPE = np.int32
+WEIGHT_DTYPE = np.float64   # float32 would halve the weights but change scores in the last digit
+IN_CHUNK = 500              # clients per round of queries in iter_mysql
+
+
+class InternTable:
+    """Names <-> dense integer ids; ids are never reused or removed."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self._upper: List[str] = []   # upper-cased name of each id
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _add(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            name = sys.intern(name)
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def intern(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            with self._lock:
+                i = self._add(name)
+        return i
+
+    def intern_many(self, names: Iterable[str]) -> np.ndarray:
+        ids = self.ids
+        return np.array([ids[n] if n in ids else self.intern(n) for n in names], dtype=ID_DTYPE)
+
+    def upper_names(self, ids: np.ndarray) -> List[str]:
+        """Upper-cased names of ``ids``; each name is upper-cased once per process."""
+        upper = self._upper
+        if len(upper) < len(self.names):
+            with self._lock:
+                upper.extend(sys.intern(name.upper()) for name in self.names[len(upper):])
+        return [upper[i] for i in ids.tolist()]
+
+    def lookup(self, ids: np.ndarray) -> List[str]:
+        names = self.names
+        return [names[i] for i in ids.tolist()]
+
+
+SYMBOLS = InternTable()
+SECTORS = InternTable()
+
+
+class CompactFund:
+    __slots__ = ("code", "amount", "symbol_ids", "weights", "sector_ids", "sector_weights")
+
+    def __init__(self, code: str, amount: float, symbol_ids: np.ndarray, weights: np.ndarray,
+                 sector_ids: np.ndarray, sector_weights: np.ndarray):
+        self.code = sys.intern(code)
+        self.amount = amount
+        self.symbol_ids = symbol_ids
+        self.weights = weights
+        self.sector_ids = sector_ids
+        self.sector_weights = sector_weights
+
+    @classmethod
+    def from_dicts(cls, code: str, amount: float, holdings: Mapping[str, float],
+                   sectors: Mapping[str, float]) -> "CompactFund":
+        return cls(code, amount,
+                   SYMBOLS.intern_many(holdings), np.fromiter(holdings.values(), WEIGHT_DTYPE, len(holdings)),
+                   SECTORS.intern_many(sectors), np.fromiter(sectors.values(), WEIGHT_DTYPE, len(sectors)))
+
+    def holdings(self) -> Dict[str, float]:
+        return dict(zip(SYMBOLS.lookup(self.symbol_ids), self.weights.tolist()))
+
+    def sectors(self) -> Dict[str, float]:
+        return dict(zip(SECTORS.lookup(self.sector_ids), self.sector_weights.tolist()))
+
+    def nbytes(self) -> int:
+        return self.symbol_ids.nbytes + self.weights.nbytes + self.sector_ids.nbytes + self.sector_weights.nbytes
+
+
+class CompactPortfolio:
+    __slots__ = ("client_id", "funds")
+
+    def __init__(self, client_id: Optional[str], funds: List[CompactFund]):
+        self.client_id = client_id
+        self.funds = funds
+
+    def __len__(self) -> int:
+        return len(self.funds)
+
+    def total_value(self) -> float:
+        return sum(f.amount for f in self.funds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ClientPortfolio.json shape."""
+        return {"clientId": self.client_id, "funds": [
+            {"fundCode": f.code, "amount": f.amount, "holdings": f.holdings(), "sectors": f.sectors()}
+            for f in self.funds
+        ]}
+
+    def overlap(self) -> FundOverlap:
+        """:class:`FundOverlap` of the funds' holdings, as built from the dict form."""
+        sizes = [len(f.symbol_ids) for f in self.funds]
+        if not sum(sizes):
+            return FundOverlap([{} for _ in self.funds])
+        # number stocks by first appearance, as FundOverlap does for dicts, so
+        # pair sums are added in the same order and scores match to the bit
+        local: Dict[int, int] = {}
+        stocks = [local.setdefault(s, len(local)) for s in np.concatenate([f.symbol_ids for f in self.funds]).tolist()]
+        return FundOverlap.from_arrays(len(self.funds), np.repeat(np.arange(len(self.funds)), sizes),
+                                       np.array(stocks), np.concatenate([f.weights for f in self.funds]))
+
+    def sector_totals(self, total: float, upper: bool = False, scale_percent: bool = False) -> Dict[str, float]:
+        """Sector weight summed over funds, each fund's weights times ``amount / total``.
+
+        Accumulated fund by fund in the order of the dict-based analyzers, so
+        results match them exactly. ``upper`` merges names case-insensitively
+        as pML2.analyzer_input does (a name repeated within a fund keeps its
+        last weight); ``scale_percent`` reads weights above 1 as percentages.
+        """
+        totals: Dict[str, float] = {}
+        for f in self.funds:
+            share = f.amount / total
+            if upper:
+                entries = dict(zip(SECTORS.upper_names(f.sector_ids), f.sector_weights.tolist())).items()
+            else:
+                entries = zip(SECTORS.lookup(f.sector_ids), f.sector_weights.tolist())
+            for sector, weight in entries:
+                if scale_percent and weight > 1:
+                    weight = weight / 100
+                totals[sector] = totals.get(sector, 0.0) + weight * share
+        return totals
+
+    def nbytes(self) -> int:
+        return sum(f.nbytes() for f in self.funds)
+
+
+# --- loaders ---
+
+def from_json(portfolio: Mapping[str, Any]) -> CompactPortfolio:
+    """A ClientPortfolio.json client (fundCode/amount) or analyzer input (name/value)."""
+    return CompactPortfolio(portfolio.get("clientId"), [
+        CompactFund.from_dicts(fund.get("fundCode", fund.get("name")), fund.get("amount", fund.get("value")),
+                               fund["holdings"], fund["sectors"])
+        for fund in portfolio["funds"]
+    ])
+
+
+def iter_json(path: str) -> Iterator[CompactPortfolio]:
+    """Stream a ClientPortfolio.json file, one client at a time."""
+    from parse_portfolio import iter_clients
+
+    for client in iter_clients(path):
+        yield from_json(client)
+
+
+def _fund_arrays(fund_pos: Sequence[int], names: Sequence[str], percents: Sequence[float], table: InternTable,
+                 n_funds: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Split (fund position, name, percent) rows into per-fund (ids, fractions), keeping row order."""
+    pos = np.asarray(fund_pos, dtype=np.int64)
+    ids = table.intern_many(names)
+    weights = np.asarray(percents, dtype=WEIGHT_DTYPE) / 100.0
+    order = np.argsort(pos, kind="stable")
+    bounds = np.searchsorted(pos[order], np.arange(n_funds + 1))
+    return [(ids[order[lo:hi]], weights[order[lo:hi]]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def from_rows(client_id: Optional[str], funds: List[Dict[str, Any]], holdings_by_fund: Mapping[int, list],
+              sectors_by_fund: Mapping[int, list]) -> CompactPortfolio:
+    """The rows of ``portfolio_data.fetch_client_portfolio`` (percentages 0-100)."""
+    compact = []
+    for f in funds:
+        holdings = holdings_by_fund[f["fundId"]]
+        sectors = sectors_by_fund[f["fundId"]]
+        compact.append(CompactFund(
+            f["fundCode"], f["amount"],
+            SYMBOLS.intern_many(r["stockSymbol"] for r in holdings),
+            np.array([r["percent"] for r in holdings], dtype=WEIGHT_DTYPE) / 100.0,
+            SECTORS.intern_many(r["sectorName"] for r in sectors),
+            np.array([r["percent"] for r in sectors], dtype=WEIGHT_DTYPE) / 100.0,
+        ))
+    return CompactPortfolio(client_id, compact)
+
+
+def _in_list(n: int) -> str:
+    return ", ".join(["%s"] * n)
+
+
+def iter_mysql(cursor, client_ids: Optional[Sequence[str]] = None, chunk: int = IN_CHUNK) -> Iterator[CompactPortfolio]:
+    """Portfolios of ``client_ids`` (default: every client) read with a tuple cursor.
+
+    Each chunk of clients costs three queries; holdings and sectors are
+    interned and split by fund with NumPy rather than built row by row.
+    Clients without funds are skipped.
+    """
+    if client_ids is None:
+        cursor.execute("SELECT clientId FROM clients ORDER BY clientId")
+        client_ids = [r[0] for r in cursor.fetchall()]
+    for i in range(0, len(client_ids), chunk):
+        params = tuple(client_ids[i:i + chunk])
+        in_list = _in_list(len(params))
+        cursor.execute(f"SELECT fundId, clientId, fundCode, amount FROM funds WHERE clientId IN ({in_list}) "
+                       f"ORDER BY fundId", params)
+        funds = cursor.fetchall()
+        if not funds:
+            continue
+        position = {fund_id: p for p, (fund_id, _, _, _) in enumerate(funds)}
+        cursor.execute(f"""
+            SELECT h.fundId, h.stockSymbol, h.percent
+            FROM holdings h
+            JOIN funds f ON h.fundId=f.fundId
+            WHERE f.clientId IN ({in_list})
+            ORDER BY h.holdingId
+        """, params)
+        rows = cursor.fetchall()
+        holdings = _fund_arrays([position[r[0]] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+                                SYMBOLS, len(funds))
+        cursor.execute(f"""
+            SELECT s.fundId, s.sectorName, s.percent
+            FROM sectors s
+            JOIN funds f ON s.fundId=f.fundId
+            WHERE f.clientId IN ({in_list})
+            ORDER BY s.sectorId
+        """, params)
+        rows = cursor.fetchall()
+        sectors = _fund_arrays([position[r[0]] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+                               SECTORS, len(funds))
+
+        by_client: Dict[str, List[CompactFund]] = {}
+        for (_, client_id, code, amount), (symbol_ids, weights), (sector_ids, sector_weights) in zip(
+                funds, holdings, sectors):
+            by_client.setdefault(client_id, []).append(
+                CompactFund(code, amount, symbol_ids, weights, sector_ids, sector_weights))
+        for client_id in params:
+            if client_id in by_client:
+                yield CompactPortfolio(client_id, by_client[client_id])
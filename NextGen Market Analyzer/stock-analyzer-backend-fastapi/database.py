@@ -1,15 +1,246 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Tuple
+
 import mysql.connector
 from mysql.connector import Error
 
-def get_connection():
-    try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="taskmanager",
-            password="user1234",
-            database="stock_analyzer"
-        )
+from metrics import InstrumentedCursor, timer
+
+# --- Config ---
+HOST = "localhost"
+USER = "taskmanager"
+PASSWORD = "user1234"
+
+STOCK_DB = "stock_analyzer"
+PORTFOLIO_DB = "portfolio_analyzer"
+
+POOL_SIZE = 10            # max open connections per database
+POOL_TIMEOUT = 5.0        # seconds to wait for a free connection before giving up
+POOL_RECYCLE = 1800.0     # connections older than this are closed and reopened
+POOL_PING_AFTER = 30.0    # idle connections are pinged before reuse after this many seconds
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of mysql.connector connections.
+
+    Connections are opened lazily up to ``size``. Checked-out connections are
+    health-checked (ping) when they have been idle for a while and recycled
+    once they exceed ``recycle`` seconds of age.
+    """
+
+    def __init__(self, database: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 recycle: float = POOL_RECYCLE, ping_after: float = POOL_PING_AFTER, **connect_args):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.connect_args = {"host": HOST, "user": USER, "password": PASSWORD, "database": database}
+        self.connect_args.update(connect_args)
+
+        self._cond = threading.Condition()
+        # idle entries: (connection, created_at, last_used_at)
+        self._idle: Deque[Tuple[Any, float, float]] = deque()
+        self._created_at: Dict[int, float] = {}
+        self._open = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_pings = 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.connect_args)
+        self._created_at[id(conn)] = time.monotonic()
         return conn
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
+
+    def _discard(self, conn) -> None:
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def _healthy(self, conn, created: float, last_used: float) -> bool:
+        now = time.monotonic()
+        if now - created > self.recycle:
+            self._recycled += 1
+            return False
+        if now - last_used > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Error:
+                self._failed_pings += 1
+                return False
+        return True
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout(f"Pool for {self.database} is closed")
+                if self._idle or self._open < self.size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No free connection for {self.database} after {self.timeout:.1f}s "
+                        f"({self._in_use}/{self.size} in use)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            if waited:
+                wait = time.monotonic() - start
+                self._waits += 1
+                self._wait_time += wait
+                self._max_wait = max(self._max_wait, wait)
+
+            entry = self._idle.pop() if self._idle else None
+            # reserve the slot before doing any I/O outside the lock
+            if entry is None:
+                self._open += 1
+            self._in_use += 1
+            self._checkouts += 1
+
+        try:
+            if entry is not None:
+                conn, created, last_used = entry
+                if self._healthy(conn, created, last_used):
+                    return conn
+                self._discard(conn)
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard: bool = False) -> None:
+        if not discard:
+            try:
+                # drop any open transaction so the next borrower starts clean
+                conn.rollback()
+            except Error:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._open -= 1
+                self._discard(conn)
+            else:
+                created = self._created_at.get(id(conn), time.monotonic())
+                self._idle.append((conn, created, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        with timer("db_connect"):
+            conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Error:
+            broken = not conn.is_connected()
+            raise
+        finally:
+            self.release(conn, discard=broken)
+
+    @contextmanager
+    def cursor(self, dictionary: bool = True):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=dictionary)
+            try:
+                yield InstrumentedCursor(cursor, self.database)
+            finally:
+                cursor.close()
+
+    def ping(self) -> bool:
+        try:
+            with self.cursor(dictionary=False) as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except (Error, PoolTimeout):
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "database": self.database,
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "total_wait_ms": round(self._wait_time * 1000.0, 3),
+                "avg_wait_ms": round(self._wait_time * 1000.0 / self._waits, 3) if self._waits else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000.0, 3),
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "failed_pings": self._failed_pings,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.popleft()
+                self._open -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+
+
+# --- Process-wide pools, created at app startup ---
+_pools: Dict[str, ConnectionPool] = {}
+
+
+def init_pools(size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT) -> None:
+    for database in (STOCK_DB, PORTFOLIO_DB):
+        if database not in _pools:
+            _pools[database] = ConnectionPool(database, size=size, timeout=timeout)
+
+
+def close_pools() -> None:
+    for pool in _pools.values():
+        pool.close()
+    _pools.clear()
+
+
+def get_pool(database: str) -> ConnectionPool:
+    pool = _pools.get(database)
+    if pool is None:
+        # allow scripts that never ran the app startup hook to use the pools
+        init_pools()
+        pool = _pools[database]
+    return pool
+
+
+def stock_cursor(dictionary: bool = True):
+    return get_pool(STOCK_DB).cursor(dictionary=dictionary)
+
+
+def portfolio_cursor(dictionary: bool = True):
+    return get_pool(PORTFOLIO_DB).cursor(dictionary=dictionary)
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in _pools.items()}
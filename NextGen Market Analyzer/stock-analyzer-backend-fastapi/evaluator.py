@@ -1,9 +1,156 @@
 # evaluator.py
-from typing import Optional, List, Tuple, Dict, Any
+import hashlib
+import json
+import math
+import os
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Optional, Tuple, Dict, Any, Mapping, Sequence, NamedTuple
+
+import numpy as np
+
+# (column, multiplier, [(upper limit, points), ...]) -- first limit the metric is <= wins
+VALUE_THRESHOLDS = [
+    ("priceEarningsRatio", 1, [(10, 20), (20, 15), (30, 10), (100, 5), (9999, 0)]),
+    ("dividendYield", 1, [(0.5, 5), (1.5, 10), (3, 15), (10, 20), (999, 20)]),
+    ("bookValuePerShare", 1, [(5, 5), (20, 10), (50, 15), (200, 20), (9999, 20)]),
+]
+QUALITY_THRESHOLDS = [
+    ("returnOnEquity", 100, [(5, 5), (10, 10), (20, 15), (999, 20)]),
+    ("returnOnAssets", 100, [(3, 5), (7, 10), (12, 15), (999, 20)]),
+    ("quickRatio", 1, [(0.8, 5), (1.5, 10), (2.5, 15), (999, 20)]),
+    ("currentRatio", 1, [(1, 5), (2, 10), (3, 15), (999, 20)]),
+    ("debtToEquityRatio", 1, [(0.5, 20), (1.5, 15), (3, 10), (999, 5)]),
+]
+
+# feedback key -> (stock column, comment method)
+FEEDBACK_FIELDS = [
+    ("P/E", "priceEarningsRatio", "comment_pe"),
+    ("EPS", "earningsPerShare", "comment_eps"),
+    ("DividendYield", "dividendYield", "comment_dy"),
+    ("MarketCap", "marketCap", "comment_mc"),
+    ("DebtToEquity", "debtToEquityRatio", "comment_de"),
+    ("ROE", "returnOnEquity", "comment_roe"),
+    ("ROA", "returnOnAssets", "comment_roa"),
+    ("CurrentRatio", "currentRatio", "comment_current"),
+    ("QuickRatio", "quickRatio", "comment_quick"),
+    ("BookValue", "bookValuePerShare", "comment_bv"),
+]
+
+
+FEEDBACK_CACHE_SIZE = 65536
+
+
+class ScoreRule(NamedTuple):
+    """One compiled threshold list: points for the first limit the scaled metric is <=."""
+    column: str
+    scale: float
+    limits: Tuple[float, ...]
+    points: Tuple[int, ...]        # one per limit plus the past-the-end score
+    limit_array: np.ndarray
+    point_array: np.ndarray
+
+
+class ScoringRules(NamedTuple):
+    value: Tuple[ScoreRule, ...]
+    quality: Tuple[ScoreRule, ...]
+
+
+def _compile_rule(column: str, scale: float, thresholds: Sequence[Sequence[float]]) -> ScoreRule:
+    if not thresholds:
+        raise ValueError(f"No thresholds for {column}")
+    limits = tuple(limit for limit, _ in thresholds)
+    if any(a > b for a, b in zip(limits, limits[1:])):
+        raise ValueError(f"Thresholds for {column} must be in ascending order")
+    points = tuple(int(p) for _, p in thresholds) + (int(thresholds[-1][1]),)
+    limit_array = np.array(limits, dtype=np.float64)
+    point_array = np.array(points, dtype=np.int64)
+    limit_array.flags.writeable = False
+    point_array.flags.writeable = False
+    return ScoreRule(column, scale, limits, points, limit_array, point_array)
+
+
+def compile_rules(config: Mapping[str, Any]) -> ScoringRules:
+    """Build a :class:`ScoringRules` table from ``{"value": [...], "quality": [...]}``.
+
+    Each entry is ``{"column": ..., "scale": ..., "thresholds": [[limit, points], ...]}``
+    with limits in ascending order.
+    """
+    return ScoringRules(
+        value=tuple(_compile_rule(r["column"], r.get("scale", 1), r["thresholds"]) for r in config["value"]),
+        quality=tuple(_compile_rule(r["column"], r.get("scale", 1), r["thresholds"]) for r in config["quality"]),
+    )
+
+
+def load_rules(path: str) -> ScoringRules:
+    with open(path, "r") as f:
+        return compile_rules(json.load(f))
+
+
+def rules_fingerprint(rules: ScoringRules) -> str:
+    """Digest of the thresholds, to tell whether stored scores were made with the same rules."""
+    spec = [[(r.column, r.scale, r.limits, r.points) for r in group] for group in (rules.value, rules.quality)]
+    return hashlib.sha1(json.dumps(spec).encode()).hexdigest()[:16]
+
+
+def model_from_env(cls: Optional[type] = None) -> "StockAnalyzerModel":
+    # point SCORING_RULES_PATH at a JSON file like scoring_rules.json to change thresholds without a code edit
+    path = os.environ.get("SCORING_RULES_PATH")
+    return (cls or StockAnalyzerModel)(rules=load_rules(path) if path else None)
+
+
+DEFAULT_RULES = compile_rules({
+    "value": [{"column": c, "scale": s, "thresholds": t} for c, s, t in VALUE_THRESHOLDS],
+    "quality": [{"column": c, "scale": s, "thresholds": t} for c, s, t in QUALITY_THRESHOLDS],
+})
+
 
 class StockAnalyzerModel:
-    def __init__(self):
-        pass
+    def __init__(self, rules: Optional[ScoringRules] = None, feedback_cache_size: int = FEEDBACK_CACHE_SIZE):
+        self.rules = rules or DEFAULT_RULES
+        # plain tuples for the per-row hot path (NamedTuple attribute access is slower)
+        self._value_rules = tuple((r.column, r.scale, r.limits, r.points) for r in self.rules.value)
+        self._quality_rules = tuple((r.column, r.scale, r.limits, r.points) for r in self.rules.quality)
+        # rendered comment sentences keyed by (comment method, value); typed so 15 and 15.0 stay apart
+        self._comment = lru_cache(maxsize=feedback_cache_size, typed=True)(self._render_comment)
+
+    def _render_comment(self, method: str, value) -> str:
+        return getattr(self, method)(value)
+
+    def comment(self, method: str, value) -> str:
+        """Cached ``comment_*`` sentence for ``value``."""
+        if value == 0:
+            # 0.0 and -0.0 share a cache key but render differently
+            return self._render_comment(method, value)
+        try:
+            return self._comment(method, value)
+        except TypeError:  # unhashable value
+            return self._render_comment(method, value)
+
+    def feedback(self, stock: Mapping[str, Any]) -> Dict[str, str]:
+        get = stock.get
+        cached = self._comment
+        out = {}
+        for key, column, method in FEEDBACK_FIELDS:
+            value = get(column)
+            if value != value:   # NaN is missing, as in evaluate_many
+                value = None
+            out[key] = cached(method, value) if value != 0 else self._render_comment(method, value)
+        return out
+
+    def feedback_cache_info(self) -> Dict[str, int]:
+        info = self._comment.cache_info()
+        total = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "hit_ratio": round(info.hits / total, 4) if total else 0.0,
+        }
+
+    def clear_feedback_cache(self) -> None:
+        self._comment.cache_clear()
 
     def comment_pe(self, value: Optional[float]) -> str:
         if value is None: return "P/E ratio data not available."
@@ -66,60 +213,31 @@ class StockAnalyzerModel:
         if value is None: return "Book value per share data not available."
         return f"The book value per share of {value} is a measure of the company's net asset value on a per-share basis."
 
-    # helper scoring helpers: _f for quality thresholds, _g for value thresholds
-    def _f(self, metric: float, thresholds: List[Tuple[float, int]]) -> int:
-        for limit, score in thresholds:
-            if metric <= limit:
-                return score
-        return thresholds[-1][1]
-
-    def _g(self, metric: float, thresholds: List[Tuple[float, int]]) -> int:
-        for limit, score in thresholds:
-            if metric <= limit:
-                return score
-        return thresholds[-1][1]
-
     def evaluate(self, stock: Dict[str, Any]) -> Dict[str, Any]:
-        # read metrics (some may be None)
-        pe = stock.get("priceEarningsRatio")
-        dy = stock.get("dividendYield")
-        bv = stock.get("bookValuePerShare")
-        roe = stock.get("returnOnEquity")
-        roa = stock.get("returnOnAssets")
-        quick = stock.get("quickRatio")
-        current = stock.get("currentRatio")
-        de = stock.get("debtToEquityRatio")
-
-        # Value score components
-        v_pe = self._g(pe or 0, [(10, 20), (20, 15), (30, 10), (100, 5), (9999, 0)])
-        v_dy = self._g(dy or 0, [(0.5, 5), (1.5, 10), (3, 15), (10, 20), (999, 20)])
-        v_bv = self._g(bv or 0, [(5, 5), (20, 10), (50, 15), (200, 20), (9999, 20)])
-        value_score = v_pe + v_dy + v_bv
-
-        # Quality score components
-        q_roe = self._f((roe or 0) * 100, [(5, 5), (10, 10), (20, 15), (999, 20)])
-        q_roa = self._f((roa or 0) * 100, [(3, 5), (7, 10), (12, 15), (999, 20)])
-        q_quick = self._f(quick or 0, [(0.8, 5), (1.5, 10), (2.5, 15), (999, 20)])
-        q_current = self._f(current or 0, [(1, 5), (2, 10), (3, 15), (999, 20)])
-        q_de = self._f(de or 0, [(0.5, 20), (1.5, 15), (3, 10), (999, 5)])
-        quality_score = q_roe + q_roa + q_quick + q_current + q_de
+        # metrics may be None or NaN; missing counts as 0 for scoring, as in evaluate_many
+        get = stock.get
+        value_score = 0
+        for column, scale, limits, points in self._value_rules:
+            metric = get(column) or 0
+            if metric != metric:
+                metric = 0
+            if scale != 1:
+                metric = metric * scale
+            value_score += points[bisect_left(limits, metric)]
+
+        quality_score = 0
+        for column, scale, limits, points in self._quality_rules:
+            metric = get(column) or 0
+            if metric != metric:
+                metric = 0
+            if scale != 1:
+                metric = metric * scale
+            quality_score += points[bisect_left(limits, metric)]
 
         overall = round(0.6 * quality_score + 0.4 * value_score)
         overall = max(0, min(100, overall))
 
-        feedback = {
-            "P/E": self.comment_pe(pe),
-            "EPS": self.comment_eps(stock.get("earningsPerShare")),
-            "DividendYield": self.comment_dy(dy),
-            "MarketCap": self.comment_mc(stock.get("marketCap")),
-            "DebtToEquity": self.comment_de(de),
-            "ROE": self.comment_roe(roe),
-            "ROA": self.comment_roa(roa),
-            "CurrentRatio": self.comment_current(current),
-            "QuickRatio": self.comment_quick(quick),
-            "BookValue": self.comment_bv(bv),
-        }
-
+        feedback = self.feedback(stock)
         summary = " ".join(feedback.values()) + f" → Quality={quality_score}, Value={value_score}, Overall={overall}."
 
         return {
@@ -130,3 +248,118 @@ class StockAnalyzerModel:
             "feedback": feedback,
             "summary": summary,
         }
+
+    # --- batch scoring ---
+    def _bucket_scores(self, values: np.ndarray, rule: ScoreRule) -> np.ndarray:
+        # vectorized bisect: index of the first limit >= value, past the end -> last score
+        return rule.point_array[np.searchsorted(rule.limit_array, values, side="left")]
+
+    def evaluate_many(self, columns: Mapping[str, Sequence]) -> "BatchEvaluation":
+        """Score a column-oriented batch of stocks in one pass.
+
+        ``columns`` maps stock column names to equal-length sequences (lists,
+        NumPy arrays, pandas Series); None or NaN means missing. Scores are
+        identical to calling :meth:`evaluate` per row; feedback and summary
+        strings are only rendered when asked for.
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        numeric = {}
+
+        def metric(name: str, scale: float) -> np.ndarray:
+            if name not in numeric:
+                numeric[name] = _to_float_array(columns.get(name), n)
+            values = numeric[name]
+            # evaluate() uses `value or 0`, so missing counts as zero
+            values = np.where(np.isnan(values), 0.0, values)
+            return values * scale if scale != 1 else values
+
+        value = np.zeros(n, dtype=np.int64)
+        for rule in self.rules.value:
+            value += self._bucket_scores(metric(rule.column, rule.scale), rule)
+        quality = np.zeros(n, dtype=np.int64)
+        for rule in self.rules.quality:
+            quality += self._bucket_scores(metric(rule.column, rule.scale), rule)
+        overall = np.clip(np.rint(0.6 * quality + 0.4 * value), 0, 100).astype(np.int64)
+        return BatchEvaluation(self, columns, n, quality, value, overall)
+
+    def evaluate_frame(self, frame) -> "BatchEvaluation":
+        """:meth:`evaluate_many` for a pandas DataFrame with one column per stock field."""
+        return self.evaluate_many({c: frame[c].to_numpy() for c in frame.columns})
+
+    def evaluate_rows(self, rows: Sequence[Dict[str, Any]], text: bool = True) -> "BatchEvaluation":
+        """:meth:`evaluate_many` for a list of row dicts such as a dictionary cursor returns.
+
+        ``text=False`` tells subclasses that only the scores will be read.
+        """
+        names = {"stockSymbol", "earningsPerShare", "marketCap"}
+        names.update(rule.column for rule in self.rules.value + self.rules.quality)
+        return self.evaluate_many({c: [r.get(c) for r in rows] for c in names})
+
+
+def _to_float_array(values, n: int) -> np.ndarray:
+    if values is None:
+        return np.full(n, np.nan)
+    if isinstance(values, np.ndarray) and values.dtype.kind in "fiu":
+        return values.astype(np.float64, copy=False)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _scalar(value):
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class BatchEvaluation:
+    """Scores for a batch of stocks with lazily rendered feedback text."""
+
+    def __init__(self, model: StockAnalyzerModel, columns: Mapping[str, Sequence], n: int,
+                 quality: np.ndarray, value: np.ndarray, overall: np.ndarray):
+        self.model = model
+        self.columns = columns
+        self.quality = quality
+        self.value = value
+        self.overall = overall
+        self._n = n
+
+    def __len__(self) -> int:
+        return self._n
+
+    def symbol(self, i: int) -> str:
+        symbols = self.columns.get("stockSymbol")
+        symbol = _scalar(symbols[i]) if symbols is not None else None
+        return "Unknown" if symbol is None else symbol
+
+    def feedback(self, i: int) -> Dict[str, str]:
+        out = {}
+        for key, column, method in FEEDBACK_FIELDS:
+            values = self.columns.get(column)
+            out[key] = self.model.comment(method, _scalar(values[i]) if values is not None else None)
+        return out
+
+    def summary(self, i: int, feedback: Optional[Dict[str, str]] = None) -> str:
+        feedback = feedback if feedback is not None else self.feedback(i)
+        return " ".join(feedback.values()) + \
+            f" → Quality={int(self.quality[i])}, Value={int(self.value[i])}, Overall={int(self.overall[i])}."
+
+    def record(self, i: int, text: bool = True) -> Dict[str, Any]:
+        """Row ``i`` in the same shape :meth:`StockAnalyzerModel.evaluate` returns."""
+        out = {
+            "stockSymbol": self.symbol(i),
+            "quality": int(self.quality[i]),
+            "value": int(self.value[i]),
+            "overall": int(self.overall[i]),
+        }
+        if text:
+            feedback = self.feedback(i)
+            out["feedback"] = feedback
+            out["summary"] = self.summary(i, feedback)
+        return out
+
+    def records(self, text: bool = True):
+        for i in range(self._n):
+            yield self.record(i, text=text)
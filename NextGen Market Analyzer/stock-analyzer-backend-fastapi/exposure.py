@@ -0,0 +1,184 @@
+"""Materialized per-client exposure and diversification rows.
+
+``client_stock_exposure`` and ``client_sector_exposure`` hold the
+amount-weighted weights served by /client/{clientId}/holdings and /sectors,
+and ``client_diversification`` the /portfolio/{clientId}/analysis result.
+:func:`refresh_clients` rebuilds the rows of the given clients only; the
+ingestion pipeline calls it for every client whose funds it changed.
+
+    python exposure.py   # rebuild the rows of every client
+"""
+import json
+from typing import Any, Dict, List, Sequence
+
+from compact_portfolio import CompactPortfolio
+from metrics import instrument
+from overlap import FundOverlap
+
+IN_CHUNK = 500
+EXPOSURE_TABLES = ("client_stock_exposure", "client_sector_exposure", "client_diversification")
+
+STOCK_EXPOSURE_SQL = "SELECT stockSymbol, weight FROM client_stock_exposure WHERE clientId=%s"
+SECTOR_EXPOSURE_SQL = "SELECT sectorName, weight FROM client_sector_exposure WHERE clientId=%s"
+DIVERSIFICATION_SQL = """
+    SELECT fundOverlapScore, sectorScore, finalDiversificationScore, sectorDistribution
+    FROM client_diversification WHERE clientId=%s
+"""
+
+
+@instrument("analysis")
+def analyze_portfolio(funds, holdings_by_fund=None, sectors_by_fund=None) -> Dict[str, Any]:
+    """Diversification of one client: the rows of fetch_client_portfolio, or a CompactPortfolio alone."""
+    if isinstance(funds, CompactPortfolio):
+        avg_overlap = funds.overlap().average()
+        sector_totals = funds.sector_totals(funds.total_value() or 1.0)
+    else:
+        fund_holdings = {}
+        for fund in funds:
+            rows = holdings_by_fund[fund["fundId"]]
+
+            fund_holdings[fund["fundCode"]] = {r["stockSymbol"]: (r["percent"] / 100.0) for r in rows}
+
+        avg_overlap = FundOverlap(list(fund_holdings.values())).average()
+
+        total_value = sum(f["amount"] for f in funds) or 1.0
+        sector_totals: Dict[str, float] = {}
+        for fund in funds:
+            rows = sectors_by_fund[fund["fundId"]]
+            fund_share = (fund["amount"] / total_value)
+            for r in rows:
+                sector_name = r["sectorName"]
+                sector_totals[sector_name] = sector_totals.get(sector_name, 0.0) + (r["percent"] / 100.0) * fund_share
+
+    overlap_score = max(0.0, (1.0 - avg_overlap) * 100.0)
+
+
+    hhi = sum(v * v for v in sector_totals.values())
+    sector_score = max(0.0, (1.0 - hhi) * 100.0)
+
+    final_score = (overlap_score + sector_score) / 2.0
+
+
+    sector_distribution = {k: round(v * 100.0, 2) for k, v in sector_totals.items()}
+
+    return {
+        "fund_overlap_score": round(overlap_score, 2),
+        "sector_score": round(sector_score, 2),
+        "final_diversification_score": round(final_score, 2),
+        "sector_distribution": sector_distribution
+    }
+
+
+def diversification_response(row: Dict[str, Any]) -> Dict[str, Any]:
+    """:func:`analyze_portfolio` output from a ``client_diversification`` row."""
+    return {
+        "fund_overlap_score": row["fundOverlapScore"],
+        "sector_score": row["sectorScore"],
+        "final_diversification_score": row["finalDiversificationScore"],
+        "sector_distribution": json.loads(row["sectorDistribution"]),
+    }
+
+
+def _in_list(n: int) -> str:
+    return ", ".join(["%s"] * n)
+
+
+def _diversification_rows(cursor, params: tuple) -> List[tuple]:
+    """Recompute the analysis of each client in ``params``; works with tuple cursors."""
+    in_list = _in_list(len(params))
+    cursor.execute(f"SELECT fundId, clientId, fundCode, amount FROM funds WHERE clientId IN ({in_list}) "
+                   f"ORDER BY fundId", params)
+    funds_by_client: Dict[str, List[Dict[str, Any]]] = {}
+    holdings: Dict[int, List[Dict[str, Any]]] = {}
+    sectors: Dict[int, List[Dict[str, Any]]] = {}
+    for fund_id, client_id, fund_code, amount in cursor.fetchall():
+        funds_by_client.setdefault(client_id, []).append({"fundId": fund_id, "fundCode": fund_code, "amount": amount})
+        holdings[fund_id] = []
+        sectors[fund_id] = []
+
+    cursor.execute(f"""
+        SELECT h.fundId, h.stockSymbol, h.percent
+        FROM holdings h
+        JOIN funds f ON h.fundId=f.fundId
+        WHERE f.clientId IN ({in_list})
+        ORDER BY h.holdingId
+    """, params)
+    for fund_id, symbol, percent in cursor.fetchall():
+        holdings[fund_id].append({"stockSymbol": symbol, "percent": percent})
+    cursor.execute(f"""
+        SELECT s.fundId, s.sectorName, s.percent
+        FROM sectors s
+        JOIN funds f ON s.fundId=f.fundId
+        WHERE f.clientId IN ({in_list})
+        ORDER BY s.sectorId
+    """, params)
+    for fund_id, sector, percent in cursor.fetchall():
+        sectors[fund_id].append({"sectorName": sector, "percent": percent})
+
+    rows = []
+    for client_id, funds in funds_by_client.items():
+        result = analyze_portfolio(funds, holdings, sectors)
+        rows.append((client_id, result["fund_overlap_score"], result["sector_score"],
+                     result["final_diversification_score"], json.dumps(result["sector_distribution"])))
+    return rows
+
+
+def refresh_clients(cursor, client_ids: Sequence[str]) -> int:
+    """Rebuild the materialized rows of ``client_ids``; the caller commits."""
+    ids = sorted(set(client_ids))
+    for i in range(0, len(ids), IN_CHUNK):
+        params = tuple(ids[i:i + IN_CHUNK])
+        in_list = _in_list(len(params))
+        for table in EXPOSURE_TABLES:
+            cursor.execute(f"DELETE FROM {table} WHERE clientId IN ({in_list})", params)
+        # same arithmetic the endpoints used to run per request
+        cursor.execute(f"""
+            INSERT INTO client_stock_exposure (clientId, stockSymbol, weight)
+            SELECT f.clientId, h.stockSymbol, SUM((h.percent/100.0) * f.amount)/SUM(f.amount)
+            FROM holdings h
+            JOIN funds f ON h.fundId=f.fundId
+            WHERE f.clientId IN ({in_list})
+            GROUP BY f.clientId, h.stockSymbol
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO client_sector_exposure (clientId, sectorName, weight)
+            SELECT f.clientId, s.sectorName, SUM((s.percent/100.0) * f.amount)/SUM(f.amount)
+            FROM sectors s
+            JOIN funds f ON s.fundId=f.fundId
+            WHERE f.clientId IN ({in_list})
+            GROUP BY f.clientId, s.sectorName
+        """, params)
+        rows = _diversification_rows(cursor, params)
+        if rows:
+            cursor.executemany(
+                "INSERT INTO client_diversification "
+                "(clientId, fundOverlapScore, sectorScore, finalDiversificationScore, sectorDistribution) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+    return len(ids)
+
+
+def refresh_all(cursor) -> int:
+    cursor.execute("SELECT clientId FROM clients")
+    return refresh_clients(cursor, [r[0] for r in cursor.fetchall()])
+
+
+def main() -> None:
+    import mysql.connector
+
+    from database import HOST, USER, PASSWORD, PORTFOLIO_DB
+
+    conn = mysql.connector.connect(host=HOST, user=USER, password=PASSWORD, database=PORTFOLIO_DB)
+    cursor = conn.cursor()
+    try:
+        count = refresh_all(cursor)
+        conn.commit()
+        print(f"Rebuilt exposure rows for {count} clients")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Content negotiation for the list and bulk endpoints.
+
+Responses are built from columns (name -> list or array) rather than from
+per-row dicts. JSON keeps the existing row-per-object shape and is encoded
+with orjson; MessagePack (``application/x-msgpack``) sends a map of column
+arrays and Arrow (``application/vnd.apache.arrow.stream``) an IPC stream with
+one record batch. Clients choose with the Accept header or
+``?format=json|msgpack|arrow``. msgpack and pyarrow are optional: a format
+whose package is not installed is not offered.
+"""
+import importlib.util
+import json
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+import numpy as np
+import orjson
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+FORMAT_NAMES = {"json": JSON, "msgpack": MSGPACK, "arrow": ARROW}
+PACKAGES = {MSGPACK: "msgpack", ARROW: "pyarrow"}
+ALIASES = {"application/msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK, "*/*": JSON, "application/*": JSON}
+
+Columns = Mapping[str, Sequence[Any]]
+
+
+@lru_cache(maxsize=None)
+def available(media_type: str) -> bool:
+    package = PACKAGES.get(media_type)
+    return package is None or importlib.util.find_spec(package) is not None
+
+
+def negotiate(request: Request) -> str:
+    """Media type for the response: ``?format=`` first, then the best Accept entry, else JSON."""
+    name = request.query_params.get("format")
+    if name is not None:
+        media_type = FORMAT_NAMES.get(name)
+        if media_type is None:
+            raise HTTPException(status_code=400, detail=f"Unknown format {name!r}; use one of {', '.join(FORMAT_NAMES)}")
+        if not available(media_type):
+            raise HTTPException(status_code=406, detail=f"Format {name!r} needs the {PACKAGES[media_type]} package")
+        return media_type
+
+    best, best_q = JSON, 0.0
+    for entry in (request.headers.get("accept") or "").split(","):
+        media_type, *params = [p.strip() for p in entry.split(";")]
+        media_type = ALIASES.get(media_type.lower(), media_type.lower())
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        # earlier entries win ties, as listed by the client
+        if q > best_q and media_type in PACKAGES.keys() | {JSON} and available(media_type):
+            best, best_q = media_type, q
+    return best
+
+
+def _plain(values: Sequence[Any]) -> list:
+    # masked entries of a numpy.ma array become None
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+
+def rows(columns: Columns) -> list:
+    """Row-per-object form of ``columns``, the shape of the JSON responses."""
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*(_plain(v) for v in columns.values()))]
+
+
+def encode_json(content: Any) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson; the app's default response class."""
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+def encode_msgpack(columns: Columns, meta: Optional[Dict[str, Any]] = None) -> bytes:
+    import msgpack
+
+    table = {name: _plain(values) for name, values in columns.items()}
+    return msgpack.packb(table if meta is None else {**meta, "results": table})
+
+
+def encode_arrow(columns: Columns, meta: Optional[Dict[str, Any]] = None) -> bytes:
+    import pyarrow as pa
+
+    table = pa.table({name: pa.array(values) for name, values in columns.items()})
+    if meta:
+        table = table.replace_schema_metadata({k: json.dumps(v) for k, v in meta.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def table_response(media_type: str, columns: Columns, meta: Optional[Dict[str, Any]] = None,
+                   json_content: Any = None, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Encode ``columns`` as ``media_type``.
+
+    JSON sends ``json_content`` when given (for endpoints whose JSON shape is
+    richer than the table), else the rows of ``columns``. ``meta`` travels as
+    top-level keys in MessagePack and as schema metadata in Arrow.
+    """
+    if media_type == MSGPACK:
+        body = encode_msgpack(columns, meta)
+    elif media_type == ARROW:
+        body = encode_arrow(columns, meta)
+    else:
+        body = encode_json(rows(columns) if json_content is None else json_content)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept", **(headers or {})})
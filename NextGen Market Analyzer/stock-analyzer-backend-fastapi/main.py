@@ -1,16 +1,44 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-import mysql.connector
-import itertools
+import asyncio
+import json
 import math
+import os
 
-from evaluator import StockAnalyzerModel
+import numpy as np
+
+from database import STOCK_DB, PORTFOLIO_DB, PoolTimeout, init_pools, close_pools, pool_stats
+from async_database import (
+    init_async_pools, close_async_pools, get_async_pool, stock_cursor, portfolio_cursor, async_pool_stats,
+)
+from evaluator import model_from_env
+from portfolio_data import (
+    CLIENTS_SQL, CLIENT_HOLDINGS_SQL, CLIENT_SECTORS_SQL, fetch_client_portfolio_async, fetch_portfolios_async,
+)
+from overlap import FundOverlap
+from exposure import (
+    STOCK_EXPOSURE_SQL, SECTOR_EXPOSURE_SQL, DIVERSIFICATION_SQL, analyze_portfolio, diversification_response,
+)
+from whatif import WhatIfError, WhatIfSession, sessions as whatif_sessions
+from stock_universe import STOCK_SYMBOLS_SQL, universe_cache, refresh_symbols
+from stock_scores import SCORED_STOCK_SQL, StoredScoreModel, scored_stocks_in_sql
+from response_cache import response_cache, admin_authorized, STOCKS, PORTFOLIO
+from micro_batch import MicroBatcher
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, instrument, render as render_metrics,
+)
+from profiling import ProfilingMiddleware, authorized, list_profiles, profile_path
+from formats import JSON, FastJSONResponse, negotiate, table_response
+from pagination import MAX_PAGE, DEFAULT_PAGE, keyset_query, keyset_page, stream_ndjson
+from pML2 import analyzer_input, get_recommender
 
 
-app = FastAPI(title="NextGen Stock & Portfolio Analyzer")
+app = FastAPI(title="NextGen Stock & Portfolio Analyzer", default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -18,28 +46,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# set SERVER_TIMING=1 to get a per-phase Server-Timing header on every response
+app.add_middleware(MetricsMiddleware)
+# PROFILE_TOKEN / PROFILE_SAMPLE_RATE turn on per-request profiling (see profiling.py)
+app.add_middleware(ProfilingMiddleware)
 
 
-def get_stock_db_conn():
-    return mysql.connector.connect(
-        host="localhost",
-        user="taskmanager",
-        password="user1234",
-        database="stock_analyzer"
-    )
+@app.on_event("startup")
+async def open_db_pools():
+    # handlers use the async pools; the sync pools serve the /recommend snapshot loader
+    await init_async_pools()
+    init_pools()
+    # load the sector models in the background so the first request does not pay for it
+    asyncio.get_running_loop().run_in_executor(None, warm_sector_recommender)
 
-def get_portfolio_db_conn():
-    return mysql.connector.connect(
-        host="localhost",
-        user="taskmanager",
-        password="user1234",
-        database="portfolio_analyzer"
-    )
+@app.on_event("shutdown")
+async def close_db_pools():
+    await close_async_pools()
+    close_pools()
+
+@app.exception_handler(PoolTimeout)
+def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Database busy, please retry"})
 
 
 class StockRequest(BaseModel):
     stockSymbol: str
 
+class BatchEvaluateRequest(BaseModel):
+    symbols: List[str]
+    # output keys besides stockSymbol; feedback/summary text is only rendered when listed
+    fields: Optional[List[str]] = None
+
 class RecommendRequest(BaseModel):
     
     debtToEquityRatio: Optional[float] = None
@@ -48,227 +86,345 @@ class RecommendRequest(BaseModel):
     bookValuePerShare: Optional[float] = None
     top_n: Optional[int] = 10
 
-model = StockAnalyzerModel()
-
+class RefreshRequest(BaseModel):
+    symbols: Optional[List[str]] = None
+
+class WhatIfChange(BaseModel):
+    # set_amount | add_fund | remove_fund | set_holding | set_sector; percents as stored (0-100)
+    op: str
+    fundCode: str
+    amount: Optional[float] = None
+    stockSymbol: Optional[str] = None
+    sectorName: Optional[str] = None
+    percent: Optional[float] = None
+    holdings: Optional[Dict[str, float]] = None
+    sectors: Optional[Dict[str, float]] = None
+
+class WhatIfRequest(BaseModel):
+    changes: List[WhatIfChange]
+
+class SectorRecommendRequest(BaseModel):
+    portfolios: Optional[List[Dict[str, Any]]] = None
+    clientIds: Optional[List[str]] = None
+
+model = model_from_env(StoredScoreModel)
+
+
+@app.get("/health")
+async def health():
+    databases = {}
+    for name in (STOCK_DB, PORTFOLIO_DB):
+        pool = get_async_pool(name)
+        databases[name] = {"ok": await pool.ping(), **pool.stats()}
+    status = "ok" if all(d["ok"] for d in databases.values()) else "degraded"
+    return {"status": status, "databases": databases}
+
+@app.get("/health/pools")
+def health_pools():
+    return {"async": async_pool_stats(), "sync": pool_stats()}
+
+@app.get("/health/evaluator")
+def health_evaluator():
+    return {**model.feedback_cache_info(), "stored_scores": model.stored_scores_info()}
+
+@app.get("/health/cache")
+def health_cache():
+    return response_cache.stats()
+
+@app.get("/health/recommender")
+def health_recommender():
+    try:
+        version = get_recommender().version
+    except FileNotFoundError:
+        version = None
+    return {"version": version, "batching": sector_batcher.stats()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+def check_profile_token(request: Request) -> None:
+    # profiles expose code paths and data sizes; only holders of PROFILE_TOKEN may read them (nobody while unset)
+    if not authorized(request.headers.get("x-profile")):
+        raise HTTPException(status_code=403, detail="Missing or wrong X-Profile token")
+
+@app.get("/admin/profiles")
+def recent_profiles(request: Request):
+    check_profile_token(request)
+    return list_profiles()
+
+@app.get("/admin/profiles/{profileId}")
+def download_profile(profileId: str, request: Request, kind: str = "folded"):
+    check_profile_token(request)
+    path = profile_path(profileId, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if kind == "meta" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+def check_admin_token(request: Request) -> None:
+    # cache flushes and universe reloads are costly; only holders of ADMIN_TOKEN may trigger them
+    if not admin_authorized(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Missing or wrong X-Admin-Token")
+
+@app.post("/admin/cache/invalidate")
+def invalidate_cache(namespace: str, request: Request):
+    check_admin_token(request)
+    if namespace not in (STOCKS, PORTFOLIO):
+        raise HTTPException(status_code=400, detail=f"Unknown cache namespace: {namespace}")
+    response_cache.invalidate(namespace)
+    if namespace == STOCKS:
+        universe_cache.invalidate()
+    return {"invalidated": namespace}
+
+@app.post("/admin/stocks/refresh")
+def refresh_stock_universe(request: Request, req: Optional[RefreshRequest] = None):
+    check_admin_token(request)
+    if req is not None and req.symbols is not None:
+        universe = refresh_symbols(req.symbols)
+    else:
+        universe_cache.invalidate()
+        universe = universe_cache.get()
+    response_cache.invalidate(STOCKS)
+    return {"stocks": len(universe)}
+
+@instrument("evaluate")
+def evaluate_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return model.evaluate(row)
 
 @app.post("/evaluate")
-def evaluate_stock(stock_request: StockRequest):
+async def evaluate_stock(stock_request: StockRequest, request: Request):
     stock_symbol = stock_request.stockSymbol
-    conn = get_stock_db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM stocks WHERE stockSymbol = %s", (stock_symbol,))
-    row = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    if not row:
-        raise HTTPException(status_code=404, detail="Stock not found")
-    return model.evaluate(row)
 
+    async def compute():
+        async with stock_cursor() as cursor:
+            await cursor.execute(SCORED_STOCK_SQL, (stock_symbol,))
+            row = await cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Stock not found")
+        return await run_in_threadpool(evaluate_row, row)
+
+    return await response_cache.respond_async(request, STOCKS, f"evaluate:{stock_symbol}", compute)
+
+EVALUATE_FIELDS = ("quality", "value", "overall", "feedback", "summary")
+EVALUATE_BATCH_MAX = 50000   # symbols per /evaluate/batch request
+EVALUATE_CHUNK = 1000        # symbols per IN (...) query, scored together
+
+@instrument("evaluate")
+def evaluate_chunk(symbols: List[str], rows: List[Dict[str, Any]], fields: List[str]) -> bytes:
+    """NDJSON lines for ``symbols`` in request order; unknown symbols get an inline error."""
+    text = "feedback" in fields or "summary" in fields
+    batch = model.evaluate_rows(rows, text=text)
+    slot = {symbol: i for i, symbol in enumerate(batch.symbol(i) for i in range(len(batch)))}
+    lines = []
+    for symbol in symbols:
+        i = slot.get(symbol)
+        if i is None:
+            lines.append(json.dumps({"stockSymbol": symbol, "error": "Stock not found"}))
+            continue
+        record = batch.record(i, text=text)
+        lines.append(json.dumps({"stockSymbol": record["stockSymbol"], **{k: record[k] for k in fields}}))
+    return ("\n".join(lines) + "\n").encode()
+
+@app.post("/evaluate/batch")
+async def evaluate_batch(req: BatchEvaluateRequest):
+    if len(req.symbols) > EVALUATE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {EVALUATE_BATCH_MAX} symbols per request")
+    fields = list(EVALUATE_FIELDS) if req.fields is None else req.fields
+    unknown = sorted(set(fields) - set(EVALUATE_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    async def lines():
+        symbols = req.symbols
+        for start in range(0, len(symbols), EVALUATE_CHUNK):
+            chunk = symbols[start:start + EVALUATE_CHUNK]
+            distinct = list(dict.fromkeys(chunk))
+            # one pooled connection per chunk, released before the chunk is sent
+            async with stock_cursor() as cursor:
+                await cursor.execute(scored_stocks_in_sql(len(distinct)), tuple(distinct))
+                rows = await cursor.fetchall()
+            yield await run_in_threadpool(evaluate_chunk, chunk, rows, fields)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# /stocks and /clients: the whole table by default (cached), keyset pages with
+# limit/after (X-Next-Cursor gives the next after), or NDJSON with stream=true.
+# The list and bulk endpoints also answer in MessagePack or Arrow (see formats.py).
 @app.get("/stocks")
-def list_stocks():
-    conn = get_stock_db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT stockSymbol FROM stocks ORDER BY stockSymbol")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return rows
+async def list_stocks(request: Request, after: Optional[str] = None, prefix: Optional[str] = None,
+                      limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE), stream: bool = False):
+    if stream:
+        sql, params = keyset_query("stocks", "stockSymbol", "stockSymbol", after, prefix, limit)
+        return StreamingResponse(stream_ndjson(stock_cursor, sql, params), media_type="application/x-ndjson")
+    media_type = negotiate(request)
+    if after is not None or prefix or limit is not None:
+        return await keyset_page(stock_cursor, "stocks", "stockSymbol", "stockSymbol", after, prefix,
+                                 limit or DEFAULT_PAGE, media_type)
+    if media_type != JSON:
+        # binary bodies are built straight from the column, not through the JSON cache
+        async with stock_cursor(dictionary=False) as cursor:
+            await cursor.execute(STOCK_SYMBOLS_SQL)
+            rows = await cursor.fetchall()
+        return table_response(media_type, {"stockSymbol": [r[0] for r in rows]})
+
+    async def compute():
+        async with stock_cursor() as cursor:
+            await cursor.execute(STOCK_SYMBOLS_SQL)
+            return await cursor.fetchall()
+
+    response = await response_cache.respond_async(request, STOCKS, "stocks", compute)
+    response.headers["Vary"] = "Accept"
+    return response
 
 
 @app.get("/clients")
-def get_clients():
-    conn = get_portfolio_db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM clients")
-    clients = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return clients
+async def get_clients(request: Request, after: Optional[str] = None,
+                      limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE), stream: bool = False):
+    if stream:
+        sql, params = keyset_query("clients", "clientId", "*", after, None, limit)
+        return StreamingResponse(stream_ndjson(portfolio_cursor, sql, params), media_type="application/x-ndjson")
+    if after is not None or limit is not None:
+        return await keyset_page(portfolio_cursor, "clients", "clientId", "*", after, None, limit or DEFAULT_PAGE,
+                                 negotiate(request))
+
+    async def compute():
+        async with portfolio_cursor() as cursor:
+            await cursor.execute(CLIENTS_SQL)
+            return await cursor.fetchall()
+
+    return await response_cache.respond_async(request, PORTFOLIO, "clients", compute)
 
 @app.get("/portfolio/{clientId}/analysis")
-def portfolio_analysis(clientId: str):
-    conn = get_portfolio_db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("SELECT * FROM funds WHERE clientId=%s", (clientId,))
-    funds = cursor.fetchall()
+async def portfolio_analysis(clientId: str):
+    async with portfolio_cursor() as cursor:
+        await cursor.execute(DIVERSIFICATION_SQL, (clientId,))
+        row = await cursor.fetchone()
+        if row is not None:
+            return diversification_response(row)
+        # not materialized yet (e.g. loaded by another tool): compute it live
+        funds, holdings_by_fund, sectors_by_fund = await fetch_client_portfolio_async(cursor, clientId)
     if not funds:
-        cursor.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="No funds found for client")
+    # the pairwise overlap is CPU-bound; keep it off the event loop
+    return await run_in_threadpool(analyze_portfolio, funds, holdings_by_fund, sectors_by_fund)
 
-    
+@instrument("overlap")
+def overlap_matrix(funds, holdings_by_fund) -> Dict[str, Any]:
     fund_holdings = {}
     for fund in funds:
-        cursor.execute("SELECT stockSymbol, percent FROM holdings WHERE fundId=%s", (fund["fundId"],))
-        rows = cursor.fetchall()
-        
-        fund_holdings[fund["fundCode"]] = {r["stockSymbol"]: (r["percent"] / 100.0) for r in rows}
-
-    
-    overlaps = []
-    fund_codes = list(fund_holdings.keys())
-    for f1, f2 in itertools.combinations(fund_codes, 2):
-        all_stocks = set(fund_holdings[f1].keys()) | set(fund_holdings[f2].keys())
-        overlap = sum(min(fund_holdings[f1].get(s, 0.0), fund_holdings[f2].get(s, 0.0)) for s in all_stocks)
-        overlaps.append(overlap)
-    avg_overlap = sum(overlaps) / len(overlaps) if overlaps else 0.0
-    overlap_score = max(0.0, (1.0 - avg_overlap) * 100.0)
-
-    
-    total_value = sum(f["amount"] for f in funds) or 1.0
-    sector_totals: Dict[str, float] = {}
-    for fund in funds:
-        cursor.execute("SELECT sectorName, percent FROM sectors WHERE fundId=%s", (fund["fundId"],))
-        rows = cursor.fetchall()
-        fund_share = (fund["amount"] / total_value)
-        for r in rows:
-            sector_name = r["sectorName"]
-            sector_totals[sector_name] = sector_totals.get(sector_name, 0.0) + (r["percent"] / 100.0) * fund_share
-
-    
-    hhi = sum(v * v for v in sector_totals.values())
-    sector_score = max(0.0, (1.0 - hhi) * 100.0)
-
-    final_score = (overlap_score + sector_score) / 2.0
-
-    cursor.close()
-    conn.close()
-
-    
-    sector_distribution = {k: round(v * 100.0, 2) for k, v in sector_totals.items()}
-
+        fund_holdings[fund["fundCode"]] = {r["stockSymbol"]: (r["percent"] / 100.0) for r in holdings_by_fund[fund["fundId"]]}
+    engine = FundOverlap(list(fund_holdings.values()))
     return {
-        "fund_overlap_score": round(overlap_score, 2),
-        "sector_score": round(sector_score, 2),
-        "final_diversification_score": round(final_score, 2),
-        "sector_distribution": sector_distribution
+        "funds": list(fund_holdings.keys()),
+        "overlap_pct": [[round(v * 100.0, 2) for v in row] for row in engine.matrix().tolist()],
+        "average_overlap_pct": round(engine.average() * 100.0, 2),
     }
 
+@app.get("/portfolio/{clientId}/overlap")
+async def portfolio_overlap(clientId: str):
+    async with portfolio_cursor() as cursor:
+        funds, holdings_by_fund, _ = await fetch_client_portfolio_async(cursor, clientId)
+    if not funds:
+        raise HTTPException(status_code=404, detail="No funds found for client")
+    return await run_in_threadpool(overlap_matrix, funds, holdings_by_fund)
+
+async def exposure_response(request: Request, sql: str, live_sql: str, clientId: str, name: str):
+    media_type = negotiate(request)
+    async with portfolio_cursor(dictionary=False) as cursor:
+        await cursor.execute(sql, (clientId,))
+        rows = await cursor.fetchall()
+        if not rows:
+            # not materialized yet: aggregate the client's funds live, as /portfolio/{id}/analysis does
+            await cursor.execute(live_sql, (clientId,))
+            rows = await cursor.fetchall()
+    return table_response(media_type, {
+        name: [r[0] for r in rows],
+        # Python's round, not np.round: the two break ties differently and the API keeps its numbers
+        "weightPct": [round((r[1] or 0.0) * 100, 4) for r in rows],
+    })
+
 @app.get("/client/{clientId}/holdings")
-def client_holdings(clientId: str):
-    conn = get_portfolio_db_conn()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT h.stockSymbol, SUM((h.percent/100.0) * f.amount)/SUM(f.amount) AS weight
-        FROM holdings h
-        JOIN funds f ON h.fundId=f.fundId
-        WHERE f.clientId=%s
-        GROUP BY h.stockSymbol
-    """, (clientId,))
-    holdings = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return [{"stockSymbol": r["stockSymbol"], "weightPct": round((r["weight"] or 0.0) * 100, 4)} for r in holdings]
+async def client_holdings(clientId: str, request: Request):
+    return await exposure_response(request, STOCK_EXPOSURE_SQL, CLIENT_HOLDINGS_SQL, clientId, "stockSymbol")
 
 @app.get("/client/{clientId}/sectors")
-def client_sectors(clientId: str):
-    conn = get_portfolio_db_conn()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT s.sectorName, SUM((s.percent/100.0) * f.amount)/SUM(f.amount) AS weight
-        FROM sectors s
-        JOIN funds f ON s.fundId=f.fundId
-        WHERE f.clientId=%s
-        GROUP BY s.sectorName
-    """, (clientId,))
-    sectors = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return [{"sectorName": r["sectorName"], "weightPct": round((r["weight"] or 0.0) * 100, 4)} for r in sectors]
-
-
-@app.post("/recommend")
-def recommend(req: RecommendRequest):
-    
-    provided = {k: v for k, v in req.__dict__.items() if k != "top_n" and v is not None}
-    if not provided:
-        
-        return {
-            "error": "No filter parameters provided. Please supply at least one of: debtToEquityRatio, returnOnEquity, returnOnAssets, bookValuePerShare."
-        }
-
-    conn = get_stock_db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection error")
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM stocks")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    if not rows:
+async def client_sectors(clientId: str, request: Request):
+    return await exposure_response(request, SECTOR_EXPOSURE_SQL, CLIENT_SECTORS_SQL, clientId, "sectorName")
+
+# what-if sessions: load a portfolio once, then apply changes and get the
+# analysis back in time proportional to the change (see whatif.py)
+def whatif_session(sessionId: str):
+    entry = whatif_sessions.get(sessionId)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="What-if session not found or expired")
+    return entry
+
+def whatif_state(clientId: str, session: WhatIfSession) -> Dict[str, Any]:
+    return {"sessionId": session.id, "clientId": clientId, "funds": session.funds(), **session.analysis()}
+
+@app.post("/portfolio/{clientId}/whatif")
+async def start_whatif(clientId: str):
+    async with portfolio_cursor() as cursor:
+        funds, holdings_by_fund, sectors_by_fund = await fetch_client_portfolio_async(cursor, clientId)
+    if not funds:
+        raise HTTPException(status_code=404, detail="No funds found for client")
+    try:
+        session = WhatIfSession(funds, holdings_by_fund, sectors_by_fund)
+    except WhatIfError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    whatif_sessions.add(clientId, session)
+    return whatif_state(clientId, session)
+
+@app.get("/whatif/{sessionId}")
+async def get_whatif(sessionId: str, verify: bool = False):
+    clientId, session = whatif_session(sessionId)
+    state = whatif_state(clientId, session)
+    if verify:
+        # snapshot on the loop: update_whatif may change the session while the thread runs
+        state["full_recompute"] = await run_in_threadpool(analyze_portfolio, *session.snapshot())
+    return state
+
+@app.post("/whatif/{sessionId}")
+async def update_whatif(sessionId: str, req: WhatIfRequest):
+    _, session = whatif_session(sessionId)
+    try:
+        session.apply_all([change.__dict__ for change in req.changes])
+    except WhatIfError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"sessionId": session.id, "applied": len(req.changes), **session.analysis()}
+
+@app.delete("/whatif/{sessionId}")
+async def end_whatif(sessionId: str):
+    if not whatif_sessions.remove(sessionId):
+        raise HTTPException(status_code=404, detail="What-if session not found or expired")
+    return {"deleted": sessionId}
+
+
+@instrument("recommend")
+def recommend_stocks(provided: Dict[str, float], top_n: int) -> Dict[str, Any]:
+    universe = universe_cache.get()
+    if not len(universe):
         return {"error": "No stock data available"}
 
-    
-    metrics = ["debtToEquityRatio", "returnOnEquity", "returnOnAssets", "bookValuePerShare"]
-    ranges: Dict[str, Dict[str, float]] = {}
-    for m in metrics:
-        vals = [r[m] for r in rows if r.get(m) is not None]
-        if vals:
-            mn = min(vals)
-            mx = max(vals)
-            
-            denom = mx - mn if (mx - mn) > 1e-9 else max(abs(mx), 1.0)
-            ranges[m] = {"min": mn, "max": mx, "denom": denom}
-        else:
-            ranges[m] = {"min": 0.0, "max": 0.0, "denom": 1.0}
-
-    def compute_similarity(stock_row: Dict[str, Any]) -> Dict[str, Any]:
-        
-        norm_diffs = []
-        missing_count = 0
-        for k, user_val in provided.items():
-            stock_val = stock_row.get(k)
-            if stock_val is None:
-                
-                norm = 1.0
-                missing_count += 1
-            else:
-                rng = ranges.get(k, {"denom": 1.0, "min": 0.0})
-                denom = rng["denom"] if rng["denom"] != 0 else 1.0
-                
-                diff = abs(stock_val - user_val)
-                norm = min(1.0, diff / denom)
-            norm_diffs.append(norm)
-        
-        avg_dist = sum(norm_diffs) / max(1, len(norm_diffs))
-        similarity = max(0.0, (1.0 - avg_dist)) * 100.0
-        
-        inaccessible = (missing_count == len(provided))
-        return {"stock": stock_row, "similarity": round(similarity, 2), "inaccessible": inaccessible}
-
-    scored = [compute_similarity(r) for r in rows]
-    
-    scored_sorted = sorted(scored, key=lambda x: (x["inaccessible"], -x["similarity"]))
-
-    top_n = max(1, int(req.top_n or 10))
+    matches = universe.index.top_n(provided, top_n)
+    evaluations = universe.evaluations(model, [idx for idx, _, _ in matches])
     results = []
-    for entry in scored_sorted[:top_n]:
-        stock_row = entry["stock"]
+    for i, (idx, similarity, inaccessible) in enumerate(matches):
+        stock_row = universe.rows[idx]
         
-        if entry["inaccessible"]:
+        if inaccessible:
             results.append({
                 "stockSymbol": stock_row.get("stockSymbol"),
-                "similarity": entry["similarity"],
+                "similarity": similarity,
                 "note": "Requested metrics not available for this stock."
             })
         else:
             
-            eval_out = model.evaluate(stock_row)
             results.append({
                 "stockSymbol": stock_row.get("stockSymbol"),
-                "similarity": entry["similarity"],
-                "evaluation": eval_out
+                "similarity": similarity,
+                "evaluation": evaluations.record(i)
             })
 
     
@@ -277,3 +433,114 @@ def recommend(req: RecommendRequest):
         "top_n": top_n,
         "results": results
     }
+
+@instrument("recommend")
+def recommend_columns(provided: Dict[str, float], top_n: int) -> Optional[Dict[str, Any]]:
+    """The /recommend results as columns, scores only; masked where the metrics are missing."""
+    universe = universe_cache.get()
+    if not len(universe):
+        return None
+    matches = universe.index.top_n(provided, top_n)
+    slots = np.array([idx for idx, _, _ in matches], dtype=np.int64)
+    missing = np.array([inaccessible for _, _, inaccessible in matches], dtype=bool)
+    evaluations = universe.evaluations(model, slots, text=False)
+    return {
+        "stockSymbol": universe.symbols[slots],
+        "similarity": np.array([similarity for _, similarity, _ in matches], dtype=float),
+        "quality": np.ma.masked_array(evaluations.quality, mask=missing),
+        "value": np.ma.masked_array(evaluations.value, mask=missing),
+        "overall": np.ma.masked_array(evaluations.overall, mask=missing),
+    }
+
+@app.post("/recommend")
+async def recommend(req: RecommendRequest, request: Request):
+    
+    provided = {k: v for k, v in req.__dict__.items() if k != "top_n" and v is not None}
+    if not provided:
+        
+        return {
+            "error": "No filter parameters provided. Please supply at least one of: debtToEquityRatio, returnOnEquity, returnOnAssets, bookValuePerShare."
+        }
+
+    top_n = max(1, int(req.top_n or 10))
+    media_type = negotiate(request)
+    # snapshot reloads hit MySQL through the sync pool and scoring is CPU-bound
+    if media_type == JSON:
+        return await run_in_threadpool(recommend_stocks, provided, top_n)
+    columns = await run_in_threadpool(recommend_columns, provided, top_n)
+    if columns is None:
+        return {"error": "No stock data available"}
+    return table_response(media_type, columns, meta={"criteria": provided, "top_n": top_n})
+
+
+def warm_sector_recommender() -> None:
+    try:
+        get_recommender().load()
+    except FileNotFoundError as e:
+        print(f"Sector recommender not loaded: {e}")
+
+def invalid_portfolio(portfolio: Dict[str, Any]) -> Optional[str]:
+    # checked up front: a bad portfolio must not fail the batch it is coalesced into
+    funds = portfolio.get("funds")
+    if not isinstance(funds, list) or not funds:
+        return "funds must be a non-empty list"
+    total = 0.0
+    for fund in funds:
+        if not isinstance(fund, dict):
+            return "each fund must be an object"
+        value = fund.get("amount", fund.get("value"))
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            return "each fund needs a non-negative amount"
+        for key in ("holdings", "sectors"):
+            weights = fund.get(key)
+            if not isinstance(weights, dict) or not all(
+                    isinstance(w, (int, float)) and not isinstance(w, bool) for w in weights.values()):
+                return f"each fund needs a {key} object of numeric weights"
+        total += value
+    if total <= 0:
+        return "total fund amount must be positive"
+    return None
+
+# concurrent single-portfolio requests share one predict call
+@instrument("sector_model")
+def recommend_sector_batch(portfolios: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return get_recommender().recommend_many(portfolios)
+
+sector_batcher = MicroBatcher(recommend_sector_batch)
+
+RECOMMEND_SECTORS_MAX = 5000   # portfolios plus clientIds per /portfolio/recommend-sectors request
+
+@app.post("/portfolio/recommend-sectors")
+async def recommend_sectors(req: SectorRecommendRequest):
+    if len(req.portfolios or []) + len(req.clientIds or []) > RECOMMEND_SECTORS_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {RECOMMEND_SECTORS_MAX} portfolios and clientIds per request")
+    items: List[Dict[str, Any]] = []
+    for i, portfolio in enumerate(req.portfolios or []):
+        problem = invalid_portfolio(portfolio)
+        if problem:
+            raise HTTPException(status_code=422, detail=f"portfolios[{i}]: {problem}")
+        items.append({"clientId": portfolio.get("clientId"), "portfolio": portfolio})
+    if req.clientIds:
+        async with portfolio_cursor() as cursor:
+            loaded = await fetch_portfolios_async(cursor, list(dict.fromkeys(req.clientIds)))
+        items.extend({"clientId": cid, "portfolio": loaded.get(cid)} for cid in req.clientIds)
+    if not items:
+        raise HTTPException(status_code=400, detail="Provide portfolios or clientIds")
+
+    inputs = [analyzer_input(item["portfolio"]) for item in items if item["portfolio"] is not None]
+    try:
+        if len(inputs) == 1:
+            predictions = [await sector_batcher.submit(inputs[0])]
+        else:
+            predictions = await run_in_threadpool(recommend_sector_batch, inputs)
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Sector models have not been trained")
+
+    results = []
+    found = iter(predictions)
+    for item in items:
+        if item["portfolio"] is None:
+            results.append({"clientId": item["clientId"], "error": "No funds found for client"})
+        else:
+            results.append({"clientId": item["clientId"], **next(found)})
+    return {"results": results}
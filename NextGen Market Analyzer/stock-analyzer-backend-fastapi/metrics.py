@@ -0,0 +1,268 @@
+"""Request, database and scoring instrumentation, exposed as Prometheus histograms.
+
+:class:`MetricsMiddleware` times every request by route and collects the
+phases it went through (connection checkout, queries, scoring, overlap...)
+in a context variable; the pools hand out :class:`InstrumentedCursor`
+wrappers that record each query's latency and the rows it returned. With
+``SERVER_TIMING=1`` the phases of a request are also sent back in a
+``Server-Timing`` header. ``GET /metrics`` serves :func:`render`.
+"""
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 1000, 10000, 100000)
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") not in ("", "0")
+
+
+def _label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative histogram per label combination, in the Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)   # first bucket with le >= value
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, counts in series:
+            pairs = [f'{n}="{_label_value(v)}"' for n, v in zip(self.labels, labels)]
+            base = ",".join(pairs)
+            sep = "," if base else ""
+            total = 0
+            for le, count in zip([*map(repr, self.buckets), "+Inf"], counts[:-1]):
+                total += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {total}')
+            suffix = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{suffix} {counts[-1]!r}")
+            lines.append(f"{self.name}_count{suffix} {total}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route.",
+                            ("method", "route", "status"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries issued per request.",
+                            ("route",), COUNT_BUCKETS)
+REQUEST_ROWS = Histogram("http_request_db_rows", "Database rows returned per request.", ("route",), COUNT_BUCKETS)
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Latency of one database query.", ("database",))
+PHASE_SECONDS = Histogram("phase_duration_seconds", "Time spent in connection checkout, scoring and overlap.",
+                          ("phase",))
+HISTOGRAMS = [REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_ROWS, QUERY_SECONDS, PHASE_SECONDS]
+
+
+def render() -> str:
+    return "\n".join(line for h in HISTOGRAMS for line in h.render()) + "\n"
+
+
+class RequestTimings:
+    """Phases of the current request; shared with its threadpool calls through the context."""
+
+    def __init__(self):
+        self.phases: Dict[str, List[float]] = {}   # phase -> [seconds, count]
+        self.queries = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        parts = []
+        for phase, (seconds, count) in self.phases.items():
+            desc = f';desc="{count} queries, {self.rows} rows"' if phase == "db" else ""
+            parts.append(f"{phase};dur={seconds * 1000:.3f}{desc}")
+        parts.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    PHASE_SECONDS.observe(seconds, phase)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timer(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - start)
+
+
+def instrument(phase: str):
+    """Decorator timing every call of a function as ``phase``."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_query(database: str, seconds: float) -> None:
+    QUERY_SECONDS.observe(seconds, database)
+    timings = _current.get()
+    if timings is not None:
+        timings.add("db", seconds)
+        timings.queries += 1
+
+
+def record_rows(n: int) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.rows += n
+
+
+class InstrumentedCursor:
+    """DB-API cursor wrapper recording query latency and rows fetched."""
+
+    def __init__(self, cursor, database: str):
+        self._cursor = cursor
+        self.database = database
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, query, params=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            record_query(self.database, time.perf_counter() - start)
+
+    def executemany(self, query, seq_params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params)
+        finally:
+            record_query(self.database, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        record_rows(row is not None)
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        record_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            record_rows(1)
+            yield row
+
+
+class AsyncInstrumentedCursor(InstrumentedCursor):
+    """:class:`InstrumentedCursor` for aiomysql cursors."""
+
+    async def execute(self, query, params=None):
+        start = time.perf_counter()
+        try:
+            return await self._cursor.execute(query, params)
+        finally:
+            record_query(self.database, time.perf_counter() - start)
+
+    async def executemany(self, query, seq_params):
+        start = time.perf_counter()
+        try:
+            return await self._cursor.executemany(query, seq_params)
+        finally:
+            record_query(self.database, time.perf_counter() - start)
+
+    async def fetchone(self):
+        row = await self._cursor.fetchone()
+        record_rows(row is not None)
+        return row
+
+    async def fetchmany(self, size=1):
+        rows = await self._cursor.fetchmany(size)
+        record_rows(len(rows))
+        return rows
+
+    async def fetchall(self):
+        rows = await self._cursor.fetchall()
+        record_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        raise TypeError("use fetchall/fetchmany on async cursors")
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and, optionally, adding ``Server-Timing``."""
+
+    def __init__(self, app, server_timing: Optional[bool] = None):
+        self.app = app
+        self.server_timing = SERVER_TIMING if server_timing is None else server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    header = timings.server_timing(time.perf_counter() - start)
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # the router stores the matched route in the scope, so the path template is the label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status))
+            REQUEST_QUERIES.observe(timings.queries, route)
+            REQUEST_ROWS.observe(timings.rows, route)
+            _current.reset(token)
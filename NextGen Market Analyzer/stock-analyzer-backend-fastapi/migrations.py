@@ -0,0 +1,276 @@
+"""Versioned schema migrations for stock_analyzer and portfolio_analyzer.
+
+Each database records the migrations applied to it in ``schema_migrations``.
+MySQL commits DDL implicitly, so every step is written to be safe to re-run:
+a migration that failed half way is simply applied again.
+
+    python migrations.py              # apply pending migrations to both databases
+    python migrations.py --status     # list applied and pending migrations
+"""
+import argparse
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple, Union
+
+from database import HOST, USER, PASSWORD, STOCK_DB, PORTFOLIO_DB
+
+Step = Union[str, Callable[[object, str], None]]
+
+IN_CHUNK = 1000
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    steps: Tuple[Step, ...]
+
+
+# Secondary indexes per table: (table, index name, columns). Each serves the
+# access path of an endpoint; benchmarks/check_query_plans.py checks that
+# every endpoint query uses one.
+INDEXES: Dict[str, List[Tuple[str, str, Tuple[str, ...]]]] = {
+    STOCK_DB: [],  # /evaluate, /stocks and the universe loader use the stockSymbol key
+    PORTFOLIO_DB: [
+        # funds by client, covering the amount used by the weight aggregations
+        ("funds", "ix_funds_client_amount", ("clientId", "amount")),
+        # holdings/sectors of a fund, covering the columns every query reads
+        ("holdings", "ix_holdings_fund_symbol", ("fundId", "stockSymbol", "percent")),
+        ("sectors", "ix_sectors_fund_sector", ("fundId", "sectorName", "percent")),
+    ],
+}
+
+
+def _index_exists(cursor, database: str, table: str, name: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s AND INDEX_NAME=%s",
+        (database, table, name),
+    )
+    return bool(cursor.fetchone()[0])
+
+
+def add_index(table: str, name: str, columns: Sequence[str], unique: bool = False) -> Step:
+    def step(cursor, database: str) -> None:
+        if not _index_exists(cursor, database, table, name):
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            cursor.execute(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})")
+    step.__name__ = f"add_index_{name}"
+    return step
+
+
+def _stock_symbol_index(cursor, database: str) -> None:
+    # stocks was created by hand on some installs; make sure lookups by symbol have an index
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA=%s AND TABLE_NAME='stocks' AND COLUMN_NAME='stockSymbol' AND SEQ_IN_INDEX=1",
+        (database,),
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute("CREATE INDEX ix_stocks_symbol ON stocks (stockSymbol)")
+
+
+def _funds_natural_key(cursor, database: str) -> None:
+    """Add contentHash and the (clientId, fundCode) key used by parse_portfolio.
+
+    Tables filled by the old loader may hold duplicate funds from repeated
+    runs; the newest copy of each is kept.
+    """
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA=%s AND TABLE_NAME='funds' AND COLUMN_NAME='contentHash'",
+        (database,),
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute("ALTER TABLE funds ADD COLUMN contentHash CHAR(40)")
+
+    if not _index_exists(cursor, database, "funds", "uq_funds_client_code"):
+        cursor.execute(
+            "SELECT DISTINCT f.fundId FROM funds f JOIN funds g "
+            "ON f.clientId=g.clientId AND f.fundCode=g.fundCode AND f.fundId < g.fundId"
+        )
+        stale = [r[0] for r in cursor.fetchall()]
+        for i in range(0, len(stale), IN_CHUNK):
+            chunk = tuple(stale[i:i + IN_CHUNK])
+            for table in ("holdings", "sectors", "funds"):
+                cursor.execute(f"DELETE FROM {table} WHERE fundId IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        cursor.execute("ALTER TABLE funds ADD UNIQUE KEY uq_funds_client_code (clientId, fundCode)")
+
+
+def _backfill_exposure(cursor, database: str) -> None:
+    from exposure import refresh_all
+
+    refresh_all(cursor)
+
+
+MIGRATIONS: Dict[str, List[Migration]] = {
+    STOCK_DB: [
+        Migration(1, "create stocks", (
+            """
+            CREATE TABLE IF NOT EXISTS stocks (
+                stockSymbol VARCHAR(50) PRIMARY KEY,
+                priceEarningsRatio DOUBLE,
+                earningsPerShare DOUBLE,
+                dividendYield DOUBLE,
+                marketCap DOUBLE,
+                debtToEquityRatio DOUBLE,
+                returnOnEquity DOUBLE,
+                returnOnAssets DOUBLE,
+                currentRatio DOUBLE,
+                quickRatio DOUBLE,
+                bookValuePerShare DOUBLE
+            )
+            """,
+        )),
+        Migration(2, "index stocks by symbol", (_stock_symbol_index,)),
+        Migration(3, "precomputed stock scores", (
+            """
+            CREATE TABLE IF NOT EXISTS stock_scores (
+                stockSymbol VARCHAR(50) PRIMARY KEY,
+                inputHash CHAR(40),
+                quality INT,
+                value INT,
+                overall INT,
+                feedback TEXT,
+                summary TEXT,
+                scoredAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        )),
+    ],
+    PORTFOLIO_DB: [
+        Migration(1, "create clients, funds, holdings, sectors", (
+            """
+            CREATE TABLE IF NOT EXISTS clients (
+                clientId VARCHAR(20) PRIMARY KEY,
+                currency VARCHAR(10)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS funds (
+                fundId INT AUTO_INCREMENT PRIMARY KEY,
+                clientId VARCHAR(20),
+                fundCode VARCHAR(50),
+                amount DOUBLE,
+                FOREIGN KEY (clientId) REFERENCES clients(clientId)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS holdings (
+                holdingId INT AUTO_INCREMENT PRIMARY KEY,
+                fundId INT,
+                stockSymbol VARCHAR(50),
+                percent DOUBLE,
+                FOREIGN KEY (fundId) REFERENCES funds(fundId)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS sectors (
+                sectorId INT AUTO_INCREMENT PRIMARY KEY,
+                fundId INT,
+                sectorName VARCHAR(100),
+                percent DOUBLE,
+                FOREIGN KEY (fundId) REFERENCES funds(fundId)
+            )
+            """,
+        )),
+        Migration(2, "funds natural key and content hash", (_funds_natural_key,)),
+        Migration(3, "covering indexes for endpoint lookups",
+                  tuple(add_index(*spec) for spec in INDEXES[PORTFOLIO_DB])),
+        Migration(4, "materialized client exposure", (
+            """
+            CREATE TABLE IF NOT EXISTS client_stock_exposure (
+                clientId VARCHAR(20),
+                stockSymbol VARCHAR(50),
+                weight DOUBLE,
+                PRIMARY KEY (clientId, stockSymbol)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS client_sector_exposure (
+                clientId VARCHAR(20),
+                sectorName VARCHAR(100),
+                weight DOUBLE,
+                PRIMARY KEY (clientId, sectorName)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS client_diversification (
+                clientId VARCHAR(20) PRIMARY KEY,
+                fundOverlapScore DOUBLE,
+                sectorScore DOUBLE,
+                finalDiversificationScore DOUBLE,
+                sectorDistribution TEXT,
+                updatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            _backfill_exposure,
+        )),
+    ],
+}
+
+
+def _ensure_migrations_table(cursor) -> None:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(200),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor) -> Dict[int, str]:
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version, applied_at FROM schema_migrations")
+    return {r[0]: str(r[1]) for r in cursor.fetchall()}
+
+
+def migrate(cursor, database: str) -> List[Migration]:
+    """Apply pending migrations to ``database``; the cursor must already be USE-ing it."""
+    done = applied_versions(cursor)
+    applied = []
+    for migration in MIGRATIONS[database]:
+        if migration.version in done:
+            continue
+        for step in migration.steps:
+            if callable(step):
+                step(cursor, database)
+            else:
+                cursor.execute(step)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                       (migration.version, migration.name))
+        applied.append(migration)
+    return applied
+
+
+def main() -> None:
+    import mysql.connector
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", choices=sorted(MIGRATIONS), action="append",
+                        help="database to migrate (default: both)")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations only")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(host=HOST, user=USER, password=PASSWORD, autocommit=True)
+    cursor = conn.cursor()
+    try:
+        for database in args.database or [STOCK_DB, PORTFOLIO_DB]:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+            cursor.execute(f"USE {database}")
+            if args.status:
+                done = applied_versions(cursor)
+                for m in MIGRATIONS[database]:
+                    state = f"applied {done[m.version]}" if m.version in done else "pending"
+                    print(f"{database} {m.version:>3} {m.name:<45} {state}")
+                continue
+            applied = migrate(cursor, database)
+            for m in applied:
+                print(f"{database}: applied {m.version} {m.name}")
+            if not applied:
+                print(f"{database}: up to date")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
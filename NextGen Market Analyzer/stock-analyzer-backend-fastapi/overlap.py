@@ -0,0 +1,100 @@
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+PAIR_CHUNK = 4_000_000  # max (fund, fund) pairs materialised at once
+
+
+def group_pairs(keys: np.ndarray, chunk: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield ``(left, right)`` index arrays covering every ordered pair of
+    entries with equal ``keys``, self-pairs included, at most ``chunk`` pairs
+    at a time. ``keys`` must be sorted.
+    """
+    if not len(keys):
+        return
+    chunk = chunk or PAIR_CHUNK
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    group_start = np.repeat(starts, sizes)     # first entry of each entry's group
+    pairs_per_entry = np.repeat(sizes, sizes)  # each entry pairs with every member of its group
+    ends = np.cumsum(pairs_per_entry)
+    first = 0
+    while first < len(keys):
+        # take as many entries as fit in one chunk of pairs (at least one)
+        base = ends[first - 1] if first else 0
+        last = max(first + 1, int(np.searchsorted(ends, base + chunk, side="right")))
+        counts = pairs_per_entry[first:last]
+        left = np.repeat(np.arange(first, last), counts)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(counts) - counts, counts)
+        yield left, group_start[left] + offsets
+        first = last
+
+
+class FundOverlap:
+    """Pairwise min-overlap of fund holdings, built once per portfolio.
+
+    Holdings are laid out as a sparse fund x stock weight matrix (one entry
+    per holding). Overlap between funds i and j is ``sum_s min(w_is, w_js)``;
+    only funds that actually share a stock produce work, so the cost is the
+    sum over stocks of (holders of that stock)^2 instead of F^2 * H.
+    """
+
+    def __init__(self, holdings: Sequence[Mapping[str, float]], symbol_ids: Optional[Dict[str, int]] = None):
+        self.n_funds = len(holdings)
+        self.symbol_ids: Dict[str, int] = {} if symbol_ids is None else symbol_ids
+        fund_idx: List[int] = []
+        stock_idx: List[int] = []
+        weights: List[float] = []
+        for f, fund in enumerate(holdings):
+            for symbol, weight in fund.items():
+                sid = self.symbol_ids.get(symbol)
+                if sid is None:
+                    sid = self.symbol_ids[symbol] = len(self.symbol_ids)
+                fund_idx.append(f)
+                stock_idx.append(sid)
+                weights.append(weight)
+        self.fund_idx = np.array(fund_idx, dtype=np.int64)
+        self.stock_idx = np.array(stock_idx, dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.float64)
+        self._matrix: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_arrays(cls, n_funds: int, fund_idx: np.ndarray, stock_idx: np.ndarray,
+                    weights: np.ndarray) -> "FundOverlap":
+        """Build from flat holding entries (fund index, stock id, weight) instead of dicts."""
+        self = cls([])
+        self.n_funds = n_funds
+        self.fund_idx = np.asarray(fund_idx, dtype=np.int64)
+        self.stock_idx = np.asarray(stock_idx, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        return self
+
+    def matrix(self) -> np.ndarray:
+        """F x F overlap matrix; the diagonal holds each fund's total weight."""
+        if self._matrix is not None:
+            return self._matrix
+        n = self.n_funds
+        if not len(self.weights):
+            self._matrix = np.zeros((n, n))
+            return self._matrix
+
+        order = np.argsort(self.stock_idx, kind="stable")
+        funds = self.fund_idx[order]
+        weights = self.weights[order]
+        flat = np.zeros(n * n, dtype=np.float64)
+        for left, right in group_pairs(self.stock_idx[order]):
+            flat += np.bincount(funds[left] * n + funds[right],
+                                weights=np.minimum(weights[left], weights[right]), minlength=n * n)
+        self._matrix = flat.reshape(n, n)
+        return self._matrix
+
+    def pairwise(self) -> np.ndarray:
+        """Overlap of every fund pair (i < j), in itertools.combinations order."""
+        rows, cols = np.triu_indices(self.n_funds, k=1)
+        return self.matrix()[rows, cols]
+
+    def average(self) -> float:
+        """Mean pairwise overlap; 0.0 for fewer than two funds."""
+        if self.n_funds < 2:
+            return 0.0
+        return float(self.pairwise().sum()) / (self.n_funds * (self.n_funds - 1) // 2)
@@ -1,39 +1,61 @@
+"""Sector recommender for client portfolios.
+
+Training is a separate step that writes a versioned artifact directory
+(models, label classes and the sector feature schema). Importing this module
+trains nothing; the artifacts are loaded on the first prediction.
+
+    python pML2.py train [--data ClientPortfolio.json]   # writes artifacts/pml2/<version>
+    python pML2.py                                       # demo prediction with the latest artifacts
+"""
+import argparse
 import json
-import pandas as pd
-from sklearn.tree import DecisionTreeClassifier
-from xgboost import XGBClassifier
-from sklearn.preprocessing import LabelEncoder
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from compact_portfolio import CompactPortfolio
+from overlap import FundOverlap
+from sector_features import BASE_FEATURES, CHUNK_SIZE, SectorFeatures, extract_training_set
+
+# pandas, scikit-learn and xgboost are imported where they are used so that
+# importing the module stays cheap
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILE = os.path.join(BASE_DIR, "ClientPortfolio.json")
+ARTIFACT_DIR = os.environ.get("PML2_ARTIFACT_DIR", os.path.join(BASE_DIR, "artifacts", "pml2"))
 
 # ------------------- Portfolio Analyzer -------------------
 class PortfolioAnalyzer:
-    def __init__(self, portfolio: dict):
+    """Takes the output of :func:`analyzer_input` or a CompactPortfolio."""
+
+    def __init__(self, portfolio):
         self.portfolio = portfolio
-        self.total_value = sum(f["value"] for f in portfolio["funds"])
+        self.compact = isinstance(portfolio, CompactPortfolio)
+        if self.compact:
+            self.total_value = portfolio.total_value()
+        else:
+            self.total_value = sum(f["value"] for f in portfolio["funds"])
 
     def compute_overlap(self):
-        funds = self.portfolio["funds"]
-        overlaps = []
-        n = len(funds)
-        for i in range(n):
-            for j in range(i + 1, n):
-                overlap = 0
-                for stock in funds[i]["holdings"]:
-                    if stock in funds[j]["holdings"]:
-                        overlap += min(funds[i]["holdings"][stock],
-                                       funds[j]["holdings"][stock])
-                overlaps.append(overlap)
-        avg_overlap = sum(overlaps) / len(overlaps) if overlaps else 0
+        if self.compact:
+            avg_overlap = self.portfolio.overlap().average()
+        else:
+            avg_overlap = FundOverlap([f["holdings"] for f in self.portfolio["funds"]]).average()
         overlap_score = (1 - avg_overlap) * 100
         return round(overlap_score, 2), round(avg_overlap * 100, 2)
 
     def compute_sector_diversification(self):
-        sector_weights = {}
-        for fund in self.portfolio["funds"]:
-            fund_share = fund["value"] / self.total_value
-            for sector, pct in fund["sectors"].items():
-                if pct > 1:
-                    pct = pct / 100
-                sector_weights[sector] = sector_weights.get(sector, 0) + (fund_share * pct)
+        if self.compact:
+            sector_weights = self.portfolio.sector_totals(self.total_value, upper=True, scale_percent=True)
+        else:
+            sector_weights = {}
+            for fund in self.portfolio["funds"]:
+                fund_share = fund["value"] / self.total_value
+                for sector, pct in fund["sectors"].items():
+                    if pct > 1:
+                        pct = pct / 100
+                    sector_weights[sector] = sector_weights.get(sector, 0) + (fund_share * pct)
         hhi = sum((w) ** 2 for w in sector_weights.values())
         sector_score = (1 - hhi) * 100
         return round(sector_score, 2), sector_weights
@@ -55,96 +77,230 @@ def load_portfolios_from_json(file_path):
     with open(file_path, "r") as f:
         return json.load(f)
 
-historical_portfolios = load_portfolios_from_json(
-    "C:/Users/Gnana chandrika/Downloads/DataSet 189315c0 (1)/DataSet/ClientPortfolio.json"
-)
 
 # ------------------- Step 2: Preprocess Data -------------------
-records = []
-all_sectors = set()
-labels = []
-
-# Collect all sector names (normalize to uppercase)
-for portfolio in historical_portfolios:
-    analyzer_input = {"funds": [
+# Features come from sector_features.SectorFeatures, which streams portfolios in
+# chunks and is used unchanged when serving predictions.
+def analyzer_input(portfolio):
+    if isinstance(portfolio, CompactPortfolio):
+        # sector names are interned once and upper-cased through the table
+        return portfolio
+    return {"funds": [
         {"name": fund.get("fundCode", fund.get("name")),
          "value": fund.get("amount", fund.get("value")),
          "holdings": fund["holdings"],
          "sectors": {k.upper(): v for k, v in fund["sectors"].items()}}  # normalize
         for fund in portfolio["funds"]
     ]}
-    analyzer = PortfolioAnalyzer(analyzer_input)
-    result = analyzer.evaluate()
-    all_sectors.update([s.upper() for s in result["sectorBreakdown"].keys()])
 
-# Build dataset & labels
-for portfolio in historical_portfolios:
-    analyzer_input = {"funds": [
-        {"name": fund.get("fundCode", fund.get("name")),
-         "value": fund.get("amount", fund.get("value")),
-         "holdings": fund["holdings"],
-         "sectors": {k.upper(): v for k, v in fund["sectors"].items()}}  # normalize
-        for fund in portfolio["funds"]
-    ]}
-    analyzer = PortfolioAnalyzer(analyzer_input)
-    result = analyzer.evaluate()
 
-    row = {
-        "overlapScore": result["overlapScore"],
-        "sectorScore": result["sectorScore"],
-        "finalDiversificationScore": result["finalDiversificationScore"],
-    }
-    for sector in all_sectors:
-        row[sector] = result["sectorBreakdown"].get(sector, 0)
-    records.append(row)
+# ------------------- Step 3 & 4: Encode Labels, Train ML Models on Full Data -------------------
+def train_models(portfolios, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Fit both models on an iterable of portfolios, consumed in one pass."""
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.tree import DecisionTreeClassifier
+    from xgboost import XGBClassifier
 
     # Label = least invested sector (normalized)
-    least_sector = min(result["sectorBreakdown"], key=lambda k: result["sectorBreakdown"][k])
-    labels.append(least_sector.upper())
+    X, labels, all_sectors = extract_training_set(portfolios, chunk_size)
+    le = LabelEncoder()
+    y_encoded = le.fit_transform(labels)
+
+    dt_model = DecisionTreeClassifier(max_depth=3, random_state=42)
+    dt_model.fit(X, y_encoded)
+
+    xgb_model = XGBClassifier(eval_metric="mlogloss", random_state=42)
+    xgb_model.fit(X, y_encoded)
+    return {"dt_model": dt_model, "xgb_model": xgb_model, "label_encoder": le,
+            "all_sectors": list(all_sectors), "n_samples": X.shape[0]}
 
-df = pd.DataFrame(records)
 
-# ------------------- Step 3: Encode Labels -------------------
-le = LabelEncoder()
-y_encoded = le.fit_transform(labels)
+def save_artifacts(trained: Dict[str, Any], artifact_dir: str = ARTIFACT_DIR, version: Optional[str] = None) -> str:
+    """Write ``trained`` to ``artifact_dir/<version>`` and point ``LATEST`` at it."""
+    import joblib
+
+    version = version or time.strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(artifact_dir, version)
+    if os.path.exists(path):
+        raise FileExistsError(f"Artifact version {version} already exists in {artifact_dir}")
+    staging = path + ".tmp"
+    os.makedirs(staging)
+    joblib.dump(trained["dt_model"], os.path.join(staging, "decision_tree.joblib"))
+    trained["xgb_model"].save_model(os.path.join(staging, "xgboost.ubj"))
+    manifest = {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "n_samples": trained["n_samples"],
+        "features": BASE_FEATURES + trained["all_sectors"],
+        "all_sectors": trained["all_sectors"],
+        "classes": [str(c) for c in trained["label_encoder"].classes_],
+        "matrix": "csr",
+        "files": {"decision_tree": "decision_tree.joblib", "xgboost": "xgboost.ubj"},
+    }
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, path)
+
+    latest = os.path.join(artifact_dir, "LATEST")
+    with open(latest + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(latest + ".tmp", latest)
+    return path
 
-print("Label mapping:", dict(zip(le.classes_, le.transform(le.classes_))))
 
-X = df
+def train(data_file: str = DATA_FILE, artifact_dir: str = ARTIFACT_DIR, version: Optional[str] = None,
+          chunk_size: int = CHUNK_SIZE) -> str:
+    from parse_portfolio import iter_clients
 
-# ------------------- Step 4: Train ML Models on Full Data -------------------
-dt_model = DecisionTreeClassifier(max_depth=3, random_state=42)
-dt_model.fit(X, y_encoded)
+    return save_artifacts(train_models(iter_clients(data_file), chunk_size), artifact_dir, version)
 
-xgb_model = XGBClassifier(use_label_encoder=False, eval_metric="mlogloss", random_state=42)
-xgb_model.fit(X, y_encoded)
 
 # ------------------- Step 5: Recommend for New Portfolio -------------------
-def recommend_new_portfolio(new_portfolio):
-    analyzer = PortfolioAnalyzer(new_portfolio)
-    result = analyzer.evaluate()
+class SectorRecommender:
+    """Serves predictions from one artifact version, loading each part on first use.
 
-    new_row = {
-        "overlapScore": result["overlapScore"],
-        "sectorScore": result["sectorScore"],
-        "finalDiversificationScore": result["finalDiversificationScore"]
-    }
-    for sector in all_sectors:
-        new_row[sector] = result["sectorBreakdown"].get(sector, 0)
-    new_df = pd.DataFrame([new_row])
+    The decision tree is memory-mapped by joblib; the XGBoost booster and the
+    label encoder are deserialized when a prediction first needs them.
+    """
 
-    dt_pred = le.inverse_transform(dt_model.predict(new_df))[0]
-    xgb_pred = le.inverse_transform(xgb_model.predict(new_df))[0]
+    def __init__(self, artifact_dir: str = ARTIFACT_DIR, version: Optional[str] = None):
+        self.artifact_dir = artifact_dir
+        self._version = version
+        self._manifest: Optional[dict] = None
+        self._dt_model = None
+        self._xgb_model = None
+        self._le = None
+        self._features: Optional[SectorFeatures] = None
+        self._lock = threading.Lock()
 
-    sorted_sectors = sorted(result["sectorBreakdown"].items(), key=lambda x: x[1])
-    top2 = [s for s, _ in sorted_sectors[:2]]
+    @classmethod
+    def from_trained(cls, trained: Dict[str, Any]) -> "SectorRecommender":
+        rec = cls(artifact_dir="")
+        rec._manifest = {"version": "in-memory", "all_sectors": trained["all_sectors"],
+                         "features": BASE_FEATURES + trained["all_sectors"],
+                         "classes": [str(c) for c in trained["label_encoder"].classes_], "matrix": "csr"}
+        rec._dt_model = trained["dt_model"]
+        rec._xgb_model = trained["xgb_model"]
+        rec._le = trained["label_encoder"]
+        return rec
+
+    @property
+    def path(self) -> str:
+        if self._version is None:
+            latest = os.path.join(self.artifact_dir, "LATEST")
+            if not os.path.exists(latest):
+                raise FileNotFoundError(f"No trained artifacts in {self.artifact_dir}; run `python pML2.py train`")
+            with open(latest) as f:
+                self._version = f.read().strip()
+        return os.path.join(self.artifact_dir, self._version)
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            with open(os.path.join(self.path, "manifest.json")) as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @property
+    def all_sectors(self) -> List[str]:
+        return self.manifest["all_sectors"]
+
+    @property
+    def dt_model(self):
+        if self._dt_model is None:
+            import joblib
+
+            with self._lock:
+                if self._dt_model is None:
+                    self._dt_model = joblib.load(
+                        os.path.join(self.path, self.manifest["files"]["decision_tree"]), mmap_mode="r"
+                    )
+        return self._dt_model
+
+    @property
+    def xgb_model(self):
+        if self._xgb_model is None:
+            from xgboost import XGBClassifier
+
+            with self._lock:
+                if self._xgb_model is None:
+                    model = XGBClassifier()
+                    model.load_model(os.path.join(self.path, self.manifest["files"]["xgboost"]))
+                    self._xgb_model = model
+        return self._xgb_model
+
+    @property
+    def label_encoder(self):
+        if self._le is None:
+            import numpy as np
+            from sklearn.preprocessing import LabelEncoder
+
+            le = LabelEncoder()
+            le.classes_ = np.array(self.manifest["classes"])
+            self._le = le
+        return self._le
+
+    def load(self) -> "SectorRecommender":
+        """Load every part now, e.g. from a startup hook, instead of on the first prediction."""
+        import scipy.sparse  # noqa: F401
+
+        self.dt_model, self.xgb_model, self.label_encoder
+        return self
+
+    @property
+    def features(self) -> SectorFeatures:
+        if self._features is None:
+            self._features = SectorFeatures(self.all_sectors, frozen=True)
+        return self._features
+
+    def recommend_many(self, portfolios: List[dict]) -> List[dict]:
+        """Recommend for a batch with a single ``predict`` call per model."""
+        if not portfolios:
+            return []
+        chunk = self.features.extract(portfolios)
+        X = chunk.csr(len(self.manifest["features"]))
+        if self.manifest.get("matrix") != "csr":
+            # artifacts trained before sparse features were fitted on a DataFrame
+            import pandas as pd
+
+            X = pd.DataFrame(X.toarray().astype(float), columns=self.manifest["features"])
+        dt_preds = self.label_encoder.inverse_transform(self.dt_model.predict(X))
+        xgb_preds = self.label_encoder.inverse_transform(self.xgb_model.predict(X))
+
+        out = []
+        for i, (dt_pred, xgb_pred) in enumerate(zip(dt_preds, xgb_preds)):
+            result = chunk.metrics(i)
+            sorted_sectors = sorted(result["sectorBreakdown"].items(), key=lambda x: x[1])
+            top2 = [s for s, _ in sorted_sectors[:2]]
+            out.append({
+                "metrics": result,
+                "DecisionTreeSector": str(dt_pred),
+                "XGBoostSector": str(xgb_pred),
+                "RuleBasedTop2": top2
+            })
+        return out
+
+    def recommend(self, new_portfolio: dict) -> dict:
+        return self.recommend_many([new_portfolio])[0]
+
+
+_recommender: Optional[SectorRecommender] = None
+
+
+def get_recommender() -> SectorRecommender:
+    global _recommender
+    if _recommender is None:
+        _recommender = SectorRecommender()
+    return _recommender
+
+
+def recommend_new_portfolio(new_portfolio):
+    return get_recommender().recommend(new_portfolio)
 
-    return {
-        "metrics": result,
-        "DecisionTreeSector": dt_pred,
-        "XGBoostSector": xgb_pred,
-        "RuleBasedTop2": top2
-    }
 
 new_customer_portfolio = {
     "funds": [
@@ -169,16 +325,37 @@ new_customer_portfolio = {
     ]
 }
 
-recommendation_result = recommend_new_portfolio(new_customer_portfolio)
 
-print("\n----- NEW CUSTOMER SECTOR RECOMMENDATION -----")
-metrics = recommendation_result["metrics"]
-print(f"Overlap Score: {metrics['overlapScore']}%")
-print(f"Sector Score: {metrics['sectorScore']}%")
-print(f"Final Diversification Score: {metrics['finalDiversificationScore']}%\n")
+def main():
+    parser = argparse.ArgumentParser(description="pML2 sector recommender")
+    sub = parser.add_subparsers(dest="command")
+    train_cmd = sub.add_parser("train", help="train the models and write a new artifact version")
+    train_cmd.add_argument("--data", default=DATA_FILE)
+    train_cmd.add_argument("--artifact-dir", default=ARTIFACT_DIR)
+    train_cmd.add_argument("--version")
+    train_cmd.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        path = train(args.data, args.artifact_dir, args.version, args.chunk_size)
+        manifest = SectorRecommender(args.artifact_dir).manifest
+        print("Label mapping:", {c: i for i, c in enumerate(manifest["classes"])})
+        print(f"Wrote {path}")
+        return
+
+    recommendation_result = recommend_new_portfolio(new_customer_portfolio)
+
+    print("\n----- NEW CUSTOMER SECTOR RECOMMENDATION -----")
+    metrics = recommendation_result["metrics"]
+    print(f"Overlap Score: {metrics['overlapScore']}%")
+    print(f"Sector Score: {metrics['sectorScore']}%")
+    print(f"Final Diversification Score: {metrics['finalDiversificationScore']}%\n")
+
+    print("-- Model Predictions --")
+    print(f"Decision Tree Predicted Sector: {recommendation_result['DecisionTreeSector']}")
+    print(f"XGBoost Predicted Sector: {recommendation_result['XGBoostSector']}")
+    print(f"Rule-based Recommended Sectors (Top 2): {recommendation_result['RuleBasedTop2']}")
 
-print("-- Model Predictions --")
-print(f"Decision Tree Predicted Sector: {recommendation_result['DecisionTreeSector']}")
-print(f"XGBoost Predicted Sector: {recommendation_result['XGBoostSector']}")
-print(f"Rule-based Recommended Sectors (Top 2): {recommendation_result['RuleBasedTop2']}")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Keyset pagination and NDJSON streaming for the list endpoints.
+
+Pages are ordered by the table's key and continue after the last key of the
+previous page (``?after=``), so every page is an index range read no matter
+how deep it is. Streaming reads through an unbuffered server-side cursor and
+flushes ``STREAM_BATCH`` rows at a time, so memory does not grow with the table.
+"""
+import json
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+
+from fastapi import Response
+
+from formats import JSON, table_response
+
+DEFAULT_PAGE = 1000
+MAX_PAGE = 10000
+STREAM_BATCH = 1000   # rows fetched and flushed per streamed chunk
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Smallest string sorting after every string that starts with ``prefix``."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def keyset_query(table: str, key: str, columns: str = "*", after: Optional[str] = None,
+                 prefix: Optional[str] = None, limit: Optional[int] = None) -> Tuple[str, Tuple[Any, ...]]:
+    """``SELECT`` over ``table`` in ``key`` order, starting after ``after``.
+
+    A prefix becomes a key range rather than LIKE so it is served by the key's index.
+    """
+    where, params = [], []
+    if after is not None:
+        where.append(f"{key} > %s")
+        params.append(after)
+    if prefix:
+        where.append(f"{key} >= %s AND {key} < %s")
+        params += [prefix, prefix_upper_bound(prefix)]
+    sql = f"SELECT {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {key}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, tuple(params)
+
+
+async def keyset_page(cursor_factory: Callable, table: str, key: str, columns: str, after: Optional[str],
+                      prefix: Optional[str], limit: int, media_type: str = JSON) -> Response:
+    """One page in ``media_type``; ``X-Next-Cursor`` is the ``after`` value for the next page."""
+    sql, params = keyset_query(table, key, columns, after, prefix, limit)
+    async with cursor_factory(dictionary=False) as cursor:
+        await cursor.execute(sql, params)
+        rows = await cursor.fetchall()
+        names = [d[0] for d in cursor.description]
+    page = {name: [r[i] for r in rows] for i, name in enumerate(names)}
+    headers = {"X-Next-Cursor": str(page[key][-1])} if len(rows) == limit else {}
+    return table_response(media_type, page, headers=headers)
+
+
+async def stream_ndjson(cursor_factory: Callable, sql: str, params: Tuple[Any, ...],
+                        batch: int = STREAM_BATCH) -> AsyncIterator[bytes]:
+    """Rows of ``sql`` as NDJSON, read with an unbuffered cursor and flushed per ``batch``."""
+    async with cursor_factory(unbuffered=True) as cursor:
+        await cursor.execute(sql, params)
+        while True:
+            rows = await cursor.fetchmany(batch)
+            if not rows:
+                return
+            yield "".join(json.dumps(r, default=str) + "\n" for r in rows).encode()
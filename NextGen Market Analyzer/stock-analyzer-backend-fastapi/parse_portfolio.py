@@ -1,6 +1,27 @@
-import mysql.connector
+"""Load ClientPortfolio.json into portfolio_analyzer.
+
+The file is streamed one client at a time, so its size is not bounded by
+memory. Rows are written in batches with ``executemany`` and committed every
+``--commit-size`` rows. Funds are keyed by (clientId, fundCode) and carry a
+hash of their contents: unchanged funds are skipped, changed funds get their
+holdings and sectors replaced, so re-running on the same file is a no-op.
+The materialized exposure rows (exposure.py) of every client with a new or
+changed fund are rebuilt in the same transaction.
+
+    python parse_portfolio.py [ClientPortfolio.json] [--commit-size 5000]
+"""
+import argparse
+import hashlib
 import json
 import os
+import time
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import mysql.connector
+
+from exposure import refresh_clients
+from migrations import migrate
+from response_cache import notify_data_changed, PORTFOLIO
 
 # --- Config ---
 DB_NAME = "portfolio_analyzer"
@@ -10,90 +31,222 @@ HOST = "localhost"
 
 JSON_FILE = "ClientPortfolio.json"  # make sure this is in the same folder
 
-# --- Connect to MySQL without database first ---
-conn = mysql.connector.connect(
-    host=HOST,
-    user=USER,
-    password=PASSWORD
-)
-cursor = conn.cursor()
-
-# --- Create database if not exists ---
-cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
-cursor.execute(f"USE {DB_NAME}")
-
-# --- Create tables ---
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS clients (
-    clientId VARCHAR(20) PRIMARY KEY,
-    currency VARCHAR(10)
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS funds (
-    fundId INT AUTO_INCREMENT PRIMARY KEY,
-    clientId VARCHAR(20),
-    fundCode VARCHAR(50),
-    amount DOUBLE,
-    FOREIGN KEY (clientId) REFERENCES clients(clientId)
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS holdings (
-    holdingId INT AUTO_INCREMENT PRIMARY KEY,
-    fundId INT,
-    stockSymbol VARCHAR(50),
-    percent DOUBLE,
-    FOREIGN KEY (fundId) REFERENCES funds(fundId)
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS sectors (
-    sectorId INT AUTO_INCREMENT PRIMARY KEY,
-    fundId INT,
-    sectorName VARCHAR(100),
-    percent DOUBLE,
-    FOREIGN KEY (fundId) REFERENCES funds(fundId)
-)
-""")
-
-conn.commit()
-
-# --- Load JSON ---
-with open(JSON_FILE, "r") as f:
-    data = json.load(f)
-
-# --- Insert data ---
-for client in data:
-    cursor.execute(
-        "INSERT IGNORE INTO clients (clientId, currency) VALUES (%s, %s)",
-        (client["clientId"], client["currency"])
-    )
-    conn.commit()
-    
-    for fund in client["funds"]:
-        cursor.execute(
-            "INSERT INTO funds (clientId, fundCode, amount) VALUES (%s, %s, %s)",
-            (client["clientId"], fund["fundCode"], fund["amount"])
-        )
-        fund_id = cursor.lastrowid
-        
-        for stock, pct in fund["holdings"].items():
-            cursor.execute(
-                "INSERT INTO holdings (fundId, stockSymbol, percent) VALUES (%s, %s, %s)",
-                (fund_id, stock, pct*100)  # store as %
-            )
-        
-        for sector, pct in fund["sectors"].items():
+COMMIT_SIZE = 5000      # rows written per transaction
+READ_SIZE = 1 << 20     # bytes read from the JSON file at a time
+IN_CHUNK = 1000         # max values in one IN (...) list
+
+
+def ensure_schema(cursor) -> None:
+    """Create the database and bring its tables up to date (see migrations.py)."""
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
+    cursor.execute(f"USE {DB_NAME}")
+    migrate(cursor, DB_NAME)
+
+
+def iter_clients(path: str, read_size: int = READ_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield the objects of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(read_size)
+        pos = 0
+        eof = not buf
+        started = False
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+                pos += 1
+            if pos == len(buf):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                chunk = f.read(read_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{path}: expected a JSON array of clients")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # object spans the buffer end; read at least as much again so a
+                # large object is re-parsed a logarithmic number of times
+                chunk = f.read(max(read_size, len(buf) - pos))
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield obj
+            pos = end
+
+
+def fund_hash(fund: Dict[str, Any]) -> str:
+    content = [fund["amount"], sorted(fund["holdings"].items()), sorted(fund["sectors"].items())]
+    return hashlib.sha1(json.dumps(content).encode()).hexdigest()
+
+
+def _chunks(values: Sequence, size: int = IN_CHUNK) -> Iterator[Sequence]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _placeholders(n: int) -> str:
+    return ", ".join(["%s"] * n)
+
+
+class PortfolioIngest:
+    """Writes batches of clients, skipping rows the database already has."""
+
+    def __init__(self, conn, commit_size: int = COMMIT_SIZE):
+        self.conn = conn
+        self.commit_size = commit_size
+        self.batch: List[Dict[str, Any]] = []
+        self.batch_rows = 0
+        self.start = time.perf_counter()
+        self.stats = {"clients": 0, "funds": 0, "rows_read": 0, "rows_written": 0,
+                      "funds_unchanged": 0, "funds_changed": 0, "funds_new": 0, "clients_refreshed": 0}
+
+    def add(self, client: Dict[str, Any]) -> None:
+        rows = 1 + sum(1 + len(f["holdings"]) + len(f["sectors"]) for f in client["funds"])
+        self.batch.append(client)
+        self.batch_rows += rows
+        self.stats["clients"] += 1
+        self.stats["funds"] += len(client["funds"])
+        self.stats["rows_read"] += rows
+        if self.batch_rows >= self.commit_size:
+            self.flush()
+
+    def _existing_clients(self, cursor, client_ids: List[str]) -> Dict[str, str]:
+        existing = {}
+        for chunk in _chunks(client_ids):
+            cursor.execute(f"SELECT clientId, currency FROM clients WHERE clientId IN ({_placeholders(len(chunk))})",
+                           tuple(chunk))
+            existing.update((r[0], r[1]) for r in cursor.fetchall())
+        return existing
+
+    def _existing_funds(self, cursor, client_ids: List[str]) -> Dict[Tuple[str, str], Tuple[int, str]]:
+        existing = {}
+        for chunk in _chunks(client_ids):
             cursor.execute(
-                "INSERT INTO sectors (fundId, sectorName, percent) VALUES (%s, %s, %s)",
-                (fund_id, sector, pct*100)  # store as %
+                f"SELECT clientId, fundCode, fundId, contentHash FROM funds "
+                f"WHERE clientId IN ({_placeholders(len(chunk))})",
+                tuple(chunk),
             )
-        conn.commit()
+            existing.update(((r[0], r[1]), (r[2], r[3])) for r in cursor.fetchall())
+        return existing
+
+    def flush(self) -> None:
+        if not self.batch:
+            return
+        batch = {c["clientId"]: c for c in self.batch}  # a later copy of a client wins
+        client_ids = list(batch)
+        cursor = self.conn.cursor()
+        written = 0
+
+        known = self._existing_clients(cursor, client_ids)
+        new_clients = [(cid, c["currency"]) for cid, c in batch.items() if cid not in known]
+        moved = [(c["currency"], cid) for cid, c in batch.items() if cid in known and known[cid] != c["currency"]]
+        if new_clients:
+            cursor.executemany("INSERT INTO clients (clientId, currency) VALUES (%s, %s)", new_clients)
+        if moved:
+            cursor.executemany("UPDATE clients SET currency=%s WHERE clientId=%s", moved)
+        written += len(new_clients) + len(moved)
+
+        existing = self._existing_funds(cursor, client_ids)
+        to_insert, to_update, changed = [], [], {}
+        for cid, client in batch.items():
+            for fund in {f["fundCode"]: f for f in client["funds"]}.values():
+                key = (cid, fund["fundCode"])
+                digest = fund_hash(fund)
+                current = existing.get(key)
+                if current is not None and current[1] == digest:
+                    self.stats["funds_unchanged"] += 1
+                    continue
+                changed[key] = fund
+                if current is None:
+                    to_insert.append((cid, fund["fundCode"], fund["amount"], digest))
+                    self.stats["funds_new"] += 1
+                else:
+                    to_update.append((fund["amount"], digest, current[0]))
+                    self.stats["funds_changed"] += 1
+
+        if changed:
+            if to_insert:
+                cursor.executemany(
+                    "INSERT INTO funds (clientId, fundCode, amount, contentHash) VALUES (%s, %s, %s, %s)", to_insert
+                )
+                existing = self._existing_funds(cursor, sorted({cid for cid, _ in changed}))
+            if to_update:
+                cursor.executemany("UPDATE funds SET amount=%s, contentHash=%s WHERE fundId=%s", to_update)
+                stale_ids = [fund_id for _, _, fund_id in to_update]
+                for chunk in _chunks(stale_ids):
+                    cursor.execute(f"DELETE FROM holdings WHERE fundId IN ({_placeholders(len(chunk))})", tuple(chunk))
+                    cursor.execute(f"DELETE FROM sectors WHERE fundId IN ({_placeholders(len(chunk))})", tuple(chunk))
+
+            holdings, sectors = [], []
+            for key, fund in changed.items():
+                fund_id = existing[key][0]
+                holdings.extend((fund_id, stock, pct * 100) for stock, pct in fund["holdings"].items())  # store as %
+                sectors.extend((fund_id, sector, pct * 100) for sector, pct in fund["sectors"].items())
+            if holdings:
+                cursor.executemany("INSERT INTO holdings (fundId, stockSymbol, percent) VALUES (%s, %s, %s)", holdings)
+            if sectors:
+                cursor.executemany("INSERT INTO sectors (fundId, sectorName, percent) VALUES (%s, %s, %s)", sectors)
+            written += len(to_insert) + len(to_update) + len(holdings) + len(sectors)
+            self.stats["clients_refreshed"] += refresh_clients(cursor, [cid for cid, _ in changed])
+
+        self.conn.commit()
+        cursor.close()
+        self.stats["rows_written"] += written
+        self.batch = []
+        self.batch_rows = 0
+        self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        s = self.stats
+        print(f"{'Done' if final else '...'}: {s['clients']} clients, {s['funds']} funds "
+              f"({s['funds_new']} new, {s['funds_changed']} changed, {s['funds_unchanged']} unchanged), "
+              f"{s['rows_read']} rows read, {s['rows_written']} written in {elapsed:.2f}s "
+              f"({s['rows_read'] / elapsed:,.0f} rows/s)")
+
+
+def ingest(conn, path: str, commit_size: int = COMMIT_SIZE) -> Dict[str, int]:
+    loader = PortfolioIngest(conn, commit_size)
+    for client in iter_clients(path):
+        loader.add(client)
+    loader.flush()
+    loader.report(final=True)
+    return loader.stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=JSON_FILE)
+    parser.add_argument("--commit-size", type=int, default=COMMIT_SIZE, help="rows written per transaction")
+    parser.add_argument("--no-notify", action="store_true", help="do not invalidate a running API's cache")
+    args = parser.parse_args()
+
+    # --- Connect to MySQL without database first ---
+    conn = mysql.connector.connect(host=HOST, user=USER, password=PASSWORD)
+    cursor = conn.cursor()
+    ensure_schema(cursor)
+    conn.commit()
+    cursor.close()
+
+    try:
+        stats = ingest(conn, os.path.expanduser(args.path), args.commit_size)
+    finally:
+        conn.close()
+
+    # drop cached /clients responses in a running API
+    if stats["rows_written"] and not args.no_notify:
+        notify_data_changed(PORTFOLIO)
+
 
-print("Portfolio data inserted successfully!")
-cursor.close()
-conn.close()
+if __name__ == "__main__":
+    main()
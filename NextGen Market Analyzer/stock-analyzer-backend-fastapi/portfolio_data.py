@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Tuple
+
+IN_CHUNK = 500   # clients per round of IN (...) queries in fetch_portfolios_async
+
+CLIENTS_SQL = "SELECT * FROM clients"
+FUNDS_SQL = "SELECT * FROM funds WHERE clientId=%s"
+HOLDINGS_SQL = """
+    SELECT h.fundId, h.stockSymbol, h.percent
+    FROM holdings h
+    JOIN funds f ON h.fundId=f.fundId
+    WHERE f.clientId=%s
+"""
+SECTORS_SQL = """
+    SELECT s.fundId, s.sectorName, s.percent
+    FROM sectors s
+    JOIN funds f ON s.fundId=f.fundId
+    WHERE f.clientId=%s
+"""
+# per-client weights across all funds; /client/{clientId}/holdings and /sectors serve the
+# copy materialized from the same aggregation by exposure.refresh_clients, and run these
+# directly for clients that have not been refreshed yet
+CLIENT_HOLDINGS_SQL = """
+    SELECT h.stockSymbol, SUM((h.percent/100.0) * f.amount)/SUM(f.amount) AS weight
+    FROM holdings h
+    JOIN funds f ON h.fundId=f.fundId
+    WHERE f.clientId=%s
+    GROUP BY h.stockSymbol
+"""
+CLIENT_SECTORS_SQL = """
+    SELECT s.sectorName, SUM((s.percent/100.0) * f.amount)/SUM(f.amount) AS weight
+    FROM sectors s
+    JOIN funds f ON s.fundId=f.fundId
+    WHERE f.clientId=%s
+    GROUP BY s.sectorName
+"""
+
+ClientPortfolio = Tuple[List[Dict[str, Any]], Dict[int, list], Dict[int, list]]
+
+
+def _group_by_fund(funds: List[Dict[str, Any]], rows) -> Dict[int, list]:
+    grouped: Dict[int, list] = {f["fundId"]: [] for f in funds}
+    for r in rows:
+        grouped[r["fundId"]].append(r)
+    return grouped
+
+
+def fetch_client_portfolio(cursor, client_id: str) -> ClientPortfolio:
+    """Load a client's funds with their holdings and sectors in three queries.
+
+    Holdings and sectors for every fund are fetched with one JOIN each and
+    grouped by fundId in memory, so the number of round trips does not grow
+    with the number of funds.
+    """
+    cursor.execute(FUNDS_SQL, (client_id,))
+    funds = cursor.fetchall()
+    if not funds:
+        return [], {}, {}
+    cursor.execute(HOLDINGS_SQL, (client_id,))
+    holdings = _group_by_fund(funds, cursor.fetchall())
+    cursor.execute(SECTORS_SQL, (client_id,))
+    sectors = _group_by_fund(funds, cursor.fetchall())
+    return funds, holdings, sectors
+
+
+async def fetch_client_portfolio_async(cursor, client_id: str) -> ClientPortfolio:
+    """:func:`fetch_client_portfolio` for an aiomysql cursor."""
+    await cursor.execute(FUNDS_SQL, (client_id,))
+    funds = await cursor.fetchall()
+    if not funds:
+        return [], {}, {}
+    await cursor.execute(HOLDINGS_SQL, (client_id,))
+    holdings = _group_by_fund(funds, await cursor.fetchall())
+    await cursor.execute(SECTORS_SQL, (client_id,))
+    sectors = _group_by_fund(funds, await cursor.fetchall())
+    return funds, holdings, sectors
+
+
+def _in_list(n: int) -> str:
+    return ", ".join(["%s"] * n)
+
+
+def funds_in_sql(n: int) -> str:
+    return f"SELECT * FROM funds WHERE clientId IN ({_in_list(n)})"
+
+
+def holdings_in_sql(n: int) -> str:
+    return f"""
+        SELECT h.fundId, h.stockSymbol, h.percent
+        FROM holdings h
+        JOIN funds f ON h.fundId=f.fundId
+        WHERE f.clientId IN ({_in_list(n)})
+    """
+
+
+def sectors_in_sql(n: int) -> str:
+    return f"""
+        SELECT s.fundId, s.sectorName, s.percent
+        FROM sectors s
+        JOIN funds f ON s.fundId=f.fundId
+        WHERE f.clientId IN ({_in_list(n)})
+    """
+
+
+async def fetch_portfolios_async(cursor, client_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Portfolios of several clients, shaped like ClientPortfolio.json, in three queries per
+    ``IN_CHUNK`` clients.
+
+    Clients without funds are left out. Percentages are returned as fractions.
+    """
+    portfolios: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(client_ids), IN_CHUNK):
+        params = tuple(client_ids[i:i + IN_CHUNK])
+        await cursor.execute(funds_in_sql(len(params)), params)
+        funds = await cursor.fetchall()
+        if not funds:
+            continue
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for f in funds:
+            fund = by_id[f["fundId"]] = {"fundCode": f["fundCode"], "amount": f["amount"], "holdings": {},
+                                         "sectors": {}}
+            portfolios.setdefault(f["clientId"], {"clientId": f["clientId"], "funds": []})["funds"].append(fund)
+
+        await cursor.execute(holdings_in_sql(len(params)), params)
+        for r in await cursor.fetchall():
+            by_id[r["fundId"]]["holdings"][r["stockSymbol"]] = r["percent"] / 100.0
+        await cursor.execute(sectors_in_sql(len(params)), params)
+        for r in await cursor.fetchall():
+            by_id[r["fundId"]]["sectors"][r["sectorName"]] = r["percent"] / 100.0
+    return portfolios
@@ -0,0 +1,221 @@
+"""On-demand profiling of single requests.
+
+A request is profiled when it carries ``X-Profile: <token>`` (or
+``?profile=<token>``) matching ``PROFILE_TOKEN``, or when it is picked at
+random with probability ``PROFILE_SAMPLE_RATE``. While it runs, a sampler
+thread records the Python stack of every busy thread every
+``PROFILE_INTERVAL`` seconds and tracemalloc traces allocations. The result
+is written to ``PROFILE_DIR`` as ``<id>.folded`` (collapsed stacks, for
+flamegraph.pl or speedscope), ``<id>.alloc.txt`` (top allocation sites) and
+``<id>.json`` (request metadata); only the newest ``PROFILE_KEEP`` are kept.
+
+Other requests served at the same time share the process and show up in
+the samples too; one request is profiled at a time. With profiling
+switched off the middleware only reads one header and one query parameter.
+"""
+import asyncio
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN") or None
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))   # seconds between stack samples
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+ALLOC_TOP = 50            # allocation sites listed per profile
+TRACEMALLOC_FRAMES = 10   # stack depth kept per traced allocation
+
+# leaf frames of threads that are waiting rather than working
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+
+def authorized(token: Optional[str]) -> bool:
+    return PROFILE_TOKEN is not None and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Samples the stacks of all other threads into collapsed-stack counts."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class RequestProfile:
+    """CPU samples and allocations of one request, saved by :meth:`save`."""
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.status: Optional[int] = None
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._tracing = not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._start = time.perf_counter()
+        self.sampler = StackSampler().start()
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.sampler.stop()
+        self.snapshot = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        if self._tracing:
+            tracemalloc.stop()
+
+    def save(self, directory: str = PROFILE_DIR) -> Dict[str, Any]:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        with open(base + ".folded", "w") as f:
+            f.write(self.sampler.folded())
+        own = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = self.snapshot.filter_traces(own).statistics("lineno")
+        with open(base + ".alloc.txt", "w") as f:
+            f.write(f"peak traced memory: {self.peak} bytes\n")
+            for stat in stats[:ALLOC_TOP]:
+                f.write(f"{stat}\n")
+        meta = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "reason": self.reason,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.sampler.samples,
+            "interval_ms": self.sampler.interval * 1000,
+            "peak_traced_bytes": self.peak,
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+        prune(directory)
+        return meta
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> List[Dict[str, Any]]:
+    """Metadata of the stored profiles, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+    return profiles
+
+
+def prune(directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP) -> None:
+    for meta in list_profiles(directory)[keep:]:
+        for suffix in (".folded", ".alloc.txt", ".json"):
+            try:
+                os.remove(os.path.join(directory, meta["id"] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+PROFILE_FILES = {"folded": ".folded", "alloc": ".alloc.txt", "meta": ".json"}
+
+
+def profile_path(profile_id: str, kind: str, directory: str = PROFILE_DIR) -> Optional[str]:
+    """Path of one stored artifact, or None for unknown ids and kinds."""
+    suffix = PROFILE_FILES.get(kind)
+    if suffix is None or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(directory, profile_id + suffix)
+    return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests that ask for it or are sampled."""
+
+    def __init__(self, app, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._busy = threading.Lock()
+
+    def _requested(self, scope) -> Optional[str]:
+        if PROFILE_TOKEN is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return "header" if authorized(value.decode("latin-1")) else None
+            if b"profile=" in scope.get("query_string", b""):
+                token = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [None])[0]
+                return "query" if authorized(token) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = self._requested(scope)
+        if reason is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], reason)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            # the snapshot, allocation statistics and file writes take long
+            # enough to stall other requests, so they run off the event loop
+            try:
+                await asyncio.to_thread(profile.finish)
+            finally:
+                self._busy.release()
+            await asyncio.to_thread(profile.save)
@@ -0,0 +1,230 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from formats import encode_json
+
+CACHE_TTL = 300.0        # seconds a cached response stays valid
+CACHE_MAX_ENTRIES = 10000
+
+STOCKS = "stocks"        # responses derived from stock_analyzer
+PORTFOLIO = "portfolio"  # responses derived from portfolio_analyzer
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL. The default backend."""
+
+    blocking = False   # calls never wait on I/O, so async handlers may make them inline
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._data), "evictions": self.evictions, "expirations": self.expirations}
+
+
+class RedisBackend:
+    """Shared backend so several API processes (and the loaders) see one cache.
+
+    Needs the optional ``redis`` package. Any object with the same
+    get/set/incr methods, such as a local stand-in, works in its place.
+    Calls go over the network, so async handlers make them in the threadpool.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "nextgen:", client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        body, etag = raw.split(b"\n", 1)
+        return body, etag.decode()
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        body, etag = value
+        self.client.set(self.prefix + key, body + b"\n" + etag.encode(), ex=max(1, int(ttl)))
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.prefix + key))
+
+    def counter(self, key: str) -> int:
+        raw = self.client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Caches serialized JSON responses per namespace with ETag revalidation.
+
+    Keys are scoped by a per-namespace generation; :meth:`invalidate` bumps the
+    generation so every older entry for that namespace is skipped and ages out.
+    """
+
+    def __init__(self, backend=None, ttl: float = CACHE_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{namespace}:{self.backend.counter('gen:' + namespace)}:{key}"
+
+    def invalidate(self, namespace: str) -> None:
+        self.backend.incr("gen:" + namespace)
+        self.invalidations += 1
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, str]]:
+        cached = self.backend.get(self._key(namespace, key))
+        if cached is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return cached
+
+    def put(self, namespace: str, key: str, payload: Any) -> Tuple[bytes, str]:
+        body = encode_json(jsonable_encoder(payload))
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.backend.set(self._key(namespace, key), (body, etag), self.ttl)
+        return body, etag
+
+    def lookup(self, namespace: str, key: str, compute: Callable[[], Any]) -> Tuple[bytes, str]:
+        """Return ``(json_body, etag)`` from the cache, computing and storing it on a miss."""
+        cached = self.get(namespace, key)
+        if cached is not None:
+            return cached
+        return self.put(namespace, key, compute())
+
+    def _response(self, request: Request, body: bytes, etag: str) -> Response:
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def respond(self, request: Request, namespace: str, key: str, compute: Callable[[], Any]) -> Response:
+        return self._response(request, *self.lookup(namespace, key, compute))
+
+    async def _backend_call(self, fn: Callable, *args):
+        if getattr(self.backend, "blocking", True):
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    async def respond_async(self, request: Request, namespace: str, key: str,
+                            compute: Callable[[], Awaitable[Any]]) -> Response:
+        """:meth:`respond` for endpoints whose ``compute`` is a coroutine function.
+
+        Lookups and stores on a blocking backend (Redis) run in the threadpool
+        so a slow cache server does not stall the event loop.
+        """
+        cached = await self._backend_call(self.get, namespace, key)
+        if cached is None:
+            cached = await self._backend_call(self.put, namespace, key, await compute())
+        return self._response(request, *cached)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            **self.backend.stats(),
+        }
+
+
+# token the /admin cache endpoints require in X-Admin-Token; while unset they refuse every call
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN") or None
+
+
+def admin_authorized(token: Optional[str]) -> bool:
+    return ADMIN_TOKEN is not None and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# set RESPONSE_CACHE_REDIS_URL to share the cache between workers
+response_cache = ResponseCache(
+    RedisBackend(os.environ["RESPONSE_CACHE_REDIS_URL"]) if os.environ.get("RESPONSE_CACHE_REDIS_URL") else None
+)
+
+
+def notify_data_changed(namespace: str, api_url: str = "http://127.0.0.1:8000") -> None:
+    """Tell a running API to drop cached responses for ``namespace``. Used by the loaders."""
+    import urllib.request
+
+    if ADMIN_TOKEN is None:
+        print(f"ADMIN_TOKEN is not set; API cache ({namespace}) not invalidated")
+        return
+    req = urllib.request.Request(f"{api_url}/admin/cache/invalidate?namespace={namespace}", method="POST",
+                                 headers={"X-Admin-Token": ADMIN_TOKEN})
+    try:
+        urllib.request.urlopen(req, timeout=5).close()
+    except OSError as e:
+        print(f"Could not invalidate API cache ({namespace}): {e}")
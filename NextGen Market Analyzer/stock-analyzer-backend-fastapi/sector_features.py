@@ -0,0 +1,226 @@
+"""Portfolio features for the pML2 sector recommender, shared by training and serving.
+
+Portfolios are read in chunks in a single pass. Each chunk is flattened into
+holding and sector entry arrays, and overlap, sector weights, HHI and the
+least-invested sector are computed for the whole chunk with NumPy. The
+sector vocabulary grows as new sectors appear; feature rows are sparse, so
+rows written before a sector was first seen simply have no entry for it.
+"""
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from compact_portfolio import SECTORS, CompactPortfolio
+from overlap import group_pairs
+
+BASE_FEATURES = ["overlapScore", "sectorScore", "finalDiversificationScore"]
+CHUNK_SIZE = 2000    # portfolios per chunk; peak memory grows with it
+
+
+class FeatureChunk:
+    """Features of one chunk of portfolios.
+
+    Sector entries (``sector_row``, ``sector_col``, ``sector_weight``) are
+    ordered by portfolio and, within a portfolio, by first appearance, so a
+    portfolio's breakdown has the same order as PortfolioAnalyzer's dict.
+    """
+
+    def __init__(self, names: List[str], base: np.ndarray, avg_overlap: np.ndarray,
+                 sector_row: np.ndarray, sector_col: np.ndarray, sector_weight: np.ndarray, least: np.ndarray):
+        self.names = names
+        self.base = base
+        self.avg_overlap = avg_overlap
+        self.sector_row = sector_row
+        self.sector_col = sector_col
+        self.sector_weight = sector_weight
+        self.least = least   # vocabulary index of the least-invested sector, -1 if none
+        self.offsets = np.searchsorted(sector_row, np.arange(len(base) + 1))
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def breakdown(self, i: int) -> Dict[str, float]:
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return {self.names[c]: w for c, w in zip(self.sector_col[lo:hi].tolist(), self.sector_weight[lo:hi].tolist())}
+
+    def metrics(self, i: int) -> Dict[str, Any]:
+        """Same keys and values as :meth:`PortfolioAnalyzer.evaluate`."""
+        overlap_score, sector_score, final_score = self.base[i].tolist()
+        return {
+            "overlapScore": overlap_score,
+            "avgOverlapPercent": round(float(self.avg_overlap[i]) * 100, 2),
+            "sectorScore": sector_score,
+            "finalDiversificationScore": final_score,
+            "sectorBreakdown": self.breakdown(i),
+        }
+
+    def labels(self) -> List[Optional[str]]:
+        return [self.names[c] if c >= 0 else None for c in self.least.tolist()]
+
+    def csr(self, width: Optional[int] = None, rows: Optional[np.ndarray] = None):
+        """Sparse feature matrix: base features, then one column per vocabulary sector.
+
+        Sectors whose column is beyond ``width`` (unknown to a trained model) are dropped.
+        """
+        from scipy.sparse import csr_matrix
+
+        n_base = len(BASE_FEATURES)
+        width = n_base + len(self.names) if width is None else width
+        n = len(self)
+        keep = self.sector_col < width - n_base
+        data = np.concatenate([self.base.ravel(), self.sector_weight[keep]]).astype(np.float32)
+        row_idx = np.concatenate([np.repeat(np.arange(n), n_base), self.sector_row[keep]])
+        col_idx = np.concatenate([np.tile(np.arange(n_base), n), self.sector_col[keep] + n_base])
+        X = csr_matrix((data, (row_idx, col_idx)), shape=(n, width))
+        return X if rows is None else X[rows]
+
+
+class SectorFeatures:
+    """Turns portfolios into :class:`FeatureChunk` objects over a growing sector vocabulary.
+
+    With ``frozen=True`` (serving) the vocabulary is that of the trained
+    model: unseen sectors still appear in the breakdown but get no column.
+    Portfolios may use ClientPortfolio.json keys (fundCode/amount), analyzer
+    keys (name/value) or be CompactPortfolio objects; sector names are
+    upper-cased.
+    """
+
+    def __init__(self, sectors: Optional[List[str]] = None, frozen: bool = False):
+        self.sectors: List[str] = list(sectors or [])
+        self.index: Dict[str, int] = {s: i for i, s in enumerate(self.sectors)}
+        self.frozen = frozen
+
+    @property
+    def columns(self) -> List[str]:
+        return BASE_FEATURES + self.sectors
+
+    def extract(self, portfolios: List[Any]) -> FeatureChunk:
+        names = list(self.sectors) if self.frozen else self.sectors
+        index = dict(self.index) if self.frozen else self.index
+        symbols: Dict[str, int] = {}
+
+        fund_row: List[int] = []
+        h_fund: List[int] = []
+        h_sym: List[int] = []
+        h_w: List[float] = []
+        s_row: List[int] = []
+        s_col: List[int] = []
+        s_w: List[float] = []
+        n_funds = np.zeros(len(portfolios), dtype=np.int64)
+        intern = symbols.setdefault
+        for r, portfolio in enumerate(portfolios):
+            compact = isinstance(portfolio, CompactPortfolio)
+            funds = portfolio.funds if compact else portfolio["funds"]
+            values = [fund.amount if compact else fund.get("amount", fund.get("value")) for fund in funds]
+            total_value = sum(values)
+            n_funds[r] = len(funds)
+            for fund, value in zip(funds, values):
+                g = len(fund_row)
+                fund_row.append(r)
+                if compact:
+                    # interned ids as keys; they never equal a symbol string
+                    h_fund.extend([g] * len(fund.symbol_ids))
+                    h_sym.extend([intern(symbol, len(symbols)) for symbol in fund.symbol_ids.tolist()])
+                    h_w.extend(fund.weights.tolist())
+                    sectors = dict(zip(SECTORS.upper_names(fund.sector_ids), fund.sector_weights.tolist()))
+                else:
+                    holdings = fund["holdings"]
+                    h_fund.extend([g] * len(holdings))
+                    h_sym.extend([intern(symbol, len(symbols)) for symbol in holdings])
+                    h_w.extend(holdings.values())
+                    sectors = {k.upper(): v for k, v in fund["sectors"].items()}
+                fund_share = value / total_value
+                for sector in sectors:
+                    if sector not in index:
+                        index[sector] = len(names)
+                        names.append(sector)
+                s_row.extend([r] * len(sectors))
+                s_col.extend([index[sector] for sector in sectors])
+                s_w.extend([fund_share * (pct / 100 if pct > 1 else pct) for pct in sectors.values()])
+
+        n = len(portfolios)
+        avg_overlap = self._avg_overlap(n, n_funds, np.array(fund_row, dtype=np.int64),
+                                        np.array(h_fund, dtype=np.int64), np.array(h_sym, dtype=np.int64),
+                                        np.array(h_w, dtype=np.float64), len(symbols))
+        sector_row, sector_col, sector_weight = self._sector_weights(
+            np.array(s_row, dtype=np.int64), np.array(s_col, dtype=np.int64), np.array(s_w, dtype=np.float64),
+            len(names))
+
+        hhi = np.bincount(sector_row, weights=sector_weight * sector_weight, minlength=n)
+        overlap_score = [round(v, 2) for v in ((1 - avg_overlap) * 100).tolist()]
+        sector_score = [round(v, 2) for v in ((1 - hhi) * 100).tolist()]
+        final_score = [round(0.5 * o + 0.5 * s, 2) for o, s in zip(overlap_score, sector_score)]
+        base = np.array([overlap_score, sector_score, final_score], dtype=np.float64).T.reshape(n, len(BASE_FEATURES))
+
+        # least-invested sector: smallest weight, first in breakdown order on ties
+        least = np.full(n, -1, dtype=np.int64)
+        if len(sector_row):
+            order = np.lexsort((np.arange(len(sector_row)), sector_weight, sector_row))
+            firsts = order[np.r_[True, sector_row[order][1:] != sector_row[order][:-1]]]
+            least[sector_row[firsts]] = sector_col[firsts]
+        return FeatureChunk(names, base, avg_overlap, sector_row, sector_col, sector_weight, least)
+
+    @staticmethod
+    def _avg_overlap(n, n_funds, fund_row, h_fund, h_sym, h_w, n_symbols) -> np.ndarray:
+        """Mean pairwise fund overlap per portfolio, as FundOverlap.average() for each."""
+        totals = np.zeros(n, dtype=np.float64)
+        if len(h_w):
+            # pair up funds of the same portfolio that hold the same stock
+            keys = fund_row[h_fund] * n_symbols + h_sym
+            order = np.argsort(keys, kind="stable")
+            funds = h_fund[order]
+            weights = h_w[order]
+            for left, right in group_pairs(keys[order]):
+                pair = funds[left] < funds[right]
+                left, right = left[pair], right[pair]
+                totals += np.bincount(fund_row[funds[left]], weights=np.minimum(weights[left], weights[right]),
+                                      minlength=n)
+        pairs = n_funds * (n_funds - 1) // 2
+        return np.divide(totals, pairs, out=np.zeros(n), where=pairs > 0)
+
+    @staticmethod
+    def _sector_weights(s_row, s_col, s_w, n_names) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sum sector entries per (portfolio, sector), ordered by first appearance."""
+        if not len(s_row):
+            return s_row, s_col, s_w
+        keys, first, inverse = np.unique(s_row * n_names + s_col, return_index=True, return_inverse=True)
+        # bincount adds in entry order, like accumulating into a dict fund by fund
+        weights = np.bincount(inverse.ravel(), weights=s_w, minlength=len(keys))
+        order = np.argsort(first)
+        keys = keys[order]
+        return keys // n_names, keys % n_names, weights[order]
+
+    def iter_chunks(self, portfolios: Iterable[Dict[str, Any]], chunk_size: int = CHUNK_SIZE) -> Iterator[FeatureChunk]:
+        it = iter(portfolios)
+        while True:
+            batch = list(islice(it, chunk_size))
+            if not batch:
+                return
+            yield self.extract(batch)
+
+
+def extract_training_set(portfolios: Iterable[Dict[str, Any]], chunk_size: int = CHUNK_SIZE):
+    """Stream portfolios into ``(X, labels, sectors)``.
+
+    ``X`` is a CSR matrix over ``BASE_FEATURES + sectors``; only one chunk of
+    raw portfolios is held at a time. Portfolios without sectors have no
+    label and are skipped.
+    """
+    from scipy.sparse import vstack
+
+    features = SectorFeatures()
+    blocks = []
+    labels: List[str] = []
+    for chunk in features.iter_chunks(portfolios, chunk_size):
+        keep = np.flatnonzero(chunk.least >= 0)
+        blocks.append(chunk.csr(rows=keep))
+        labels.extend(features.sectors[c] for c in chunk.least[keep].tolist())
+    width = len(features.columns)
+    for block in blocks:
+        block.resize((block.shape[0], width))
+    if not blocks:
+        from scipy.sparse import csr_matrix
+
+        return csr_matrix((0, width), dtype=np.float32), labels, features.sectors
+    return vstack(blocks, format="csr"), labels, features.sectors
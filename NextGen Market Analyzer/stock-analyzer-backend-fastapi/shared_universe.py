@@ -0,0 +1,325 @@
+"""Stock universe shared by all worker processes through one memory-mapped file.
+
+Set ``SHARED_UNIVERSE=/path/universe.snap`` and run uvicorn with ``--workers N``.
+The snapshot holds everything /recommend needs, column by column: every
+metric of the stocks table (float64, NaN for NULL) and its null mask, the
+StockAnalyzerModel scores, the symbols and a sorted symbol index. Workers
+map it read-only, so the page cache keeps one copy however many workers
+there are; a worker only builds the small per-query structures (masks and
+similarity-index trees for the metric subsets it is asked about).
+
+The file is written by one process at a time under ``<path>.lock``: the
+loader (``python shared_universe.py --every 300``), a worker serving
+/admin/stocks/refresh, or the first worker that finds no snapshot or one
+older than ``UNIVERSE_TTL``. It is written to a temporary file and renamed
+over the old one, so a reader sees the old version or the new one, never a
+mix. Workers notice the new inode on their next lookup and switch to it;
+requests still holding the old version keep a valid mapping until they finish.
+"""
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from evaluator import FEEDBACK_FIELDS, BatchEvaluation, model_from_env, rules_fingerprint
+from stock_universe import SIMILARITY_METRICS, UNIVERSE_TTL, StockUniverse, load_stock_rows, metric_range
+
+MAGIC = b"STKSNAP1"
+ALIGN = 64
+STOCK_METRICS = [column for _, column, _ in FEEDBACK_FIELDS]
+SCORES = ("quality", "value", "overall")
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def columns_from_rows(rows: Sequence[Dict[str, Any]]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    symbols = [r["stockSymbol"] for r in rows]
+    columns = {m: np.array([np.nan if r.get(m) is None else r[m] for r in rows], dtype=np.float64)
+               for m in STOCK_METRICS}
+    return symbols, columns
+
+
+def write_snapshot(path: str, symbols: Sequence[str], columns: Dict[str, np.ndarray], model) -> Dict[str, Any]:
+    """Score the stocks and write them to ``path``, replacing any previous version atomically."""
+    symbol_array = np.array(symbols, dtype=f"<U{max([1, *map(len, symbols)])}")
+    evaluation = model.evaluate_many({**columns, "stockSymbol": symbol_array})
+    order = np.argsort(symbol_array, kind="stable")
+    arrays = {
+        "symbols": symbol_array,
+        "alive": np.ones(len(symbol_array), dtype=bool),
+        "index:symbols": symbol_array[order],
+        "index:slots": order.astype(np.int64),
+    }
+    ranges = {}
+    for m in STOCK_METRICS:
+        arrays["metric:" + m] = np.ascontiguousarray(columns[m], dtype=np.float64)
+    for m in SIMILARITY_METRICS:
+        null = np.isnan(arrays["metric:" + m])
+        arrays["null:" + m] = null
+        ranges[m] = metric_range(arrays["metric:" + m], null)
+    for name in SCORES:
+        arrays["score:" + name] = getattr(evaluation, name).astype(np.int64)
+
+    header = {
+        "version": time.time_ns(),
+        "created": time.time(),
+        "size": len(symbol_array),
+        "rules": rules_fingerprint(model.rules),
+        "ranges": ranges,
+        "arrays": {},
+    }
+    # the header records the array offsets, so grow the space reserved for it until it fits
+    start = ALIGN
+    while True:
+        offset = start
+        for name, a in arrays.items():
+            header["arrays"][name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+            offset = _align(offset + a.nbytes)
+        encoded = json.dumps(header).encode()
+        if len(MAGIC) + 8 + len(encoded) <= start:
+            break
+        start = _align(len(MAGIC) + 8 + len(encoded) + ALIGN)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(encoded).to_bytes(8, "little") + encoded)
+        for name, a in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(a.tobytes())
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return header
+
+
+class Snapshot:
+    """One version of the snapshot file, mapped read-only."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.key = (stat.st_dev, stat.st_ino)
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a stock universe snapshot")
+        length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8], "little")
+        self.header = json.loads(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+        # zero-copy views; they keep the mapping alive for as long as they are referenced
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.frombuffer(buffer, dtype=spec["dtype"], count=int(np.prod(spec["shape"])),
+                                offset=spec["offset"]).reshape(spec["shape"])
+            for name, spec in self.header["arrays"].items()
+        }
+
+    @property
+    def version(self) -> int:
+        return self.header["version"]
+
+
+class MappedRows(Sequence):
+    """``StockUniverse.rows`` over a snapshot: row dicts built on access."""
+
+    def __init__(self, universe: "MappedUniverse"):
+        self._universe = universe
+
+    def __len__(self) -> int:
+        return self._universe.size
+
+    def __getitem__(self, slot: int) -> Optional[Dict[str, Any]]:
+        u = self._universe
+        if not u.alive[slot]:
+            return None
+        row = {"stockSymbol": str(u.symbols[slot])}
+        for m, col in u.columns.items():
+            value = float(col[slot])
+            row[m] = None if value != value else value
+        return row
+
+
+class MappedUniverse(StockUniverse):
+    """A :class:`StockUniverse` whose arrays are views into a :class:`Snapshot`."""
+
+    def __init__(self, snapshot: Snapshot):
+        arrays = snapshot.arrays
+        self.snapshot = snapshot
+        self.loaded_at = time.monotonic()
+        self.symbols = arrays["symbols"]
+        self.alive = arrays["alive"]
+        self.columns = {m: arrays["metric:" + m] for m in STOCK_METRICS}
+        self.nulls = {m: arrays["null:" + m] for m in SIMILARITY_METRICS}
+        self.ranges = snapshot.header["ranges"]
+        self.scores = {name: arrays["score:" + name] for name in SCORES}
+        self.size = len(self.symbols)
+        self.count = int(snapshot.header["size"])
+        self.rows = MappedRows(self)
+        self._inaccessible = {}
+        self._index = None
+
+    def slot(self, symbol: str) -> Optional[int]:
+        index = self.snapshot.arrays["index:symbols"]
+        i = int(np.searchsorted(index, symbol))
+        if i < len(index) and index[i] == symbol:
+            return int(self.snapshot.arrays["index:slots"][i])
+        return None
+
+    def evaluations(self, model, slots: Sequence[int], text: bool = True) -> BatchEvaluation:
+        """Stored scores when they were made with ``model``'s rules, else scored now."""
+        slots = np.asarray(slots, dtype=np.int64)
+        columns = {m: col[slots] for m, col in self.columns.items()}
+        columns["stockSymbol"] = self.symbols[slots]
+        if self.snapshot.header["rules"] != rules_fingerprint(model.rules):
+            return model.evaluate_many(columns)
+        return BatchEvaluation(model, columns, len(slots), *(self.scores[name][slots] for name in SCORES))
+
+    def changed_columns(self, upserts: List[Dict[str, Any]],
+                        deleted: List[str] = ()) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """Symbols and columns of the next version: updated stocks patched in place, new ones
+        appended and deleted ones dropped, keeping the order of the rest."""
+        symbols = self.symbols.tolist()
+        columns = {m: np.array(col) for m, col in self.columns.items()}
+        appended = []
+        for row in upserts:
+            slot = self.slot(row["stockSymbol"])
+            if slot is None:
+                appended.append(row)
+                continue
+            for m in STOCK_METRICS:
+                columns[m][slot] = np.nan if row.get(m) is None else row[m]
+        keep = np.ones(len(symbols), dtype=bool)
+        for symbol in deleted:
+            slot = self.slot(symbol)
+            if slot is not None:
+                keep[slot] = False
+        new_symbols, new_columns = columns_from_rows(appended)
+        symbols = [s for s, k in zip(symbols, keep.tolist()) if k] + new_symbols
+        columns = {m: np.concatenate([columns[m][keep], new_columns[m]]) for m in STOCK_METRICS}
+        return symbols, columns
+
+
+@contextmanager
+def _file_lock(path: str, blocking: bool = True):
+    """Exclusive lock on ``path``.lock across processes; yields False when not blocking and busy."""
+    with open(path + ".lock", "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SharedUniverseCache:
+    """Drop-in for :class:`stock_universe.UniverseCache` backed by a shared snapshot file.
+
+    ``get`` costs one ``stat`` of the file; a new inode means another
+    process published a new version, which is mapped and swapped in.
+    """
+
+    def __init__(self, path: str, loader: Callable[[], List[Dict[str, Any]]], ttl: float = UNIVERSE_TTL,
+                 model_factory: Callable = model_from_env):
+        self.path = path
+        self.loader = loader
+        self.ttl = ttl
+        self.model_factory = model_factory
+        self._universe: Optional[MappedUniverse] = None
+        self._stale = False
+        self._lock = threading.Lock()
+
+    def _current_key(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def _expired(self, universe: MappedUniverse) -> bool:
+        return time.time() - universe.snapshot.header["created"] >= self.ttl
+
+    def get(self) -> MappedUniverse:
+        universe = self._universe
+        if universe is not None and not self._stale and universe.snapshot.key == self._current_key() \
+                and not self._expired(universe):
+            return universe
+        with self._lock:
+            return self.get_locked()
+
+    def get_locked(self) -> MappedUniverse:
+        key = self._current_key()
+        if self._stale or key is None:
+            self._rebuild()
+        elif self._universe is None or self._universe.snapshot.key != key:
+            self._universe = MappedUniverse(Snapshot(self.path))
+        if self._expired(self._universe):
+            # one worker reloads; the rest keep serving the current version meanwhile
+            with _file_lock(self.path, blocking=False) as locked:
+                if locked and self._expired(self._map_latest()):
+                    self._publish(*columns_from_rows(self.loader()))
+        return self._universe
+
+    def _map_latest(self) -> MappedUniverse:
+        key = self._current_key()
+        if key is not None and (self._universe is None or self._universe.snapshot.key != key):
+            self._universe = MappedUniverse(Snapshot(self.path))
+        return self._universe
+
+    def _publish(self, symbols: List[str], columns: Dict[str, np.ndarray]) -> None:
+        write_snapshot(self.path, symbols, columns, self.model_factory())
+        self._universe = MappedUniverse(Snapshot(self.path))
+
+    def _rebuild(self) -> None:
+        seen = self._universe.snapshot.version if self._universe is not None else None
+        with _file_lock(self.path):
+            latest = self._map_latest()
+            # another process may have published while we waited for the lock
+            if latest is None or (self._stale and seen in (None, latest.snapshot.version)):
+                self._publish(*columns_from_rows(self.loader()))
+        self._stale = False
+
+    def invalidate(self) -> None:
+        """Reload from MySQL and publish to every worker on the next :meth:`get`."""
+        self._stale = True
+
+    def apply_changes(self, upserts: List[Dict[str, Any]], deleted: List[str] = ()) -> MappedUniverse:
+        """Publish a version with ``upserts`` and ``deleted`` applied to the latest one."""
+        with self._lock, _file_lock(self.path):
+            universe = self._map_latest()
+            if universe is None:
+                self._publish(*columns_from_rows(self.loader()))
+            else:
+                self._publish(*universe.changed_columns(upserts, deleted))
+            return self._universe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write the shared stock universe snapshot from MySQL.")
+    parser.add_argument("--path", default=os.environ.get("SHARED_UNIVERSE"), help="defaults to $SHARED_UNIVERSE")
+    parser.add_argument("--every", type=float, help="keep running and republish every this many seconds")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("no --path and SHARED_UNIVERSE is not set")
+
+    while True:
+        start = time.perf_counter()
+        with _file_lock(args.path):
+            header = write_snapshot(args.path, *columns_from_rows(load_stock_rows()), model_from_env())
+        print(f"Published {header['size']} stocks to {args.path} in {time.perf_counter() - start:.2f}s")
+        if args.every is None:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
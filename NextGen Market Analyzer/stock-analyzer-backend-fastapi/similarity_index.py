@@ -0,0 +1,200 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from stock_universe import SIMILARITY_METRICS, StockUniverse
+
+LEAF_SIZE = 64
+REBUILD_FRACTION = 0.05   # rebuild a tree once this share of its slots changed since it was built
+MIN_REBUILD = 1024
+
+# Rows whose similarity could still round to the n-th best score are kept as
+# candidates so that ties are broken by slot exactly like the linear scan.
+TIE_MARGIN = 0.011
+
+
+class _KDTree:
+    """KD-tree over the raw metric values of one group of slots.
+
+    Nodes are stored in flat Python lists so bound computations during a
+    query stay cheap; leaves hold the slot numbers they cover.
+    """
+
+    def __init__(self, slots: np.ndarray, coords: np.ndarray, scale: List[float], leaf_size: int = LEAF_SIZE):
+        self.lo: List[Tuple[float, ...]] = []
+        self.hi: List[Tuple[float, ...]] = []
+        self.children: List[Optional[Tuple[int, int]]] = []
+        self.leaves: List[Optional[np.ndarray]] = []
+        scale_arr = np.asarray(scale, dtype=np.float64)
+        self._build(slots, coords, scale_arr, leaf_size)
+
+    def _build(self, slots, coords, scale, leaf_size) -> int:
+        node = len(self.lo)
+        lo = coords.min(axis=0)
+        hi = coords.max(axis=0)
+        self.lo.append(tuple(lo.tolist()))
+        self.hi.append(tuple(hi.tolist()))
+        self.children.append(None)
+        self.leaves.append(None)
+        spread = (hi - lo) / scale
+        if len(slots) <= leaf_size or not spread.any():
+            self.leaves[node] = slots
+            return node
+        dim = int(np.argmax(spread))
+        half = len(slots) // 2
+        order = np.argpartition(coords[:, dim], half)
+        left, right = order[:half], order[half:]
+        l = self._build(slots[left], coords[left], scale, leaf_size)
+        r = self._build(slots[right], coords[right], scale, leaf_size)
+        self.children[node] = (l, r)
+        return node
+
+
+class _SubsetTrees:
+    """Trees for one metric subset, one per pattern of which metrics are present.
+
+    Stocks missing a metric contribute the maximum distance 1.0 for it, so each
+    null pattern is indexed separately over its present metrics and carries a
+    constant penalty. Stocks missing every metric in the subset are not indexed.
+    """
+
+    def __init__(self, universe: StockUniverse, metrics: Tuple[str, ...]):
+        self.metrics = metrics
+        self.built_size = universe.size
+        # slots changed since the trees were built; evaluated by a linear scan instead
+        self.dirty = np.zeros(universe.size, dtype=bool)
+        self.dirty_count = 0
+        self.groups: List[Tuple[Tuple[int, ...], int, _KDTree]] = []
+
+        present = np.stack([~universe.nulls[m] for m in metrics], axis=1) & universe.alive[:, None]
+        codes = present.astype(np.int64) @ (1 << np.arange(len(metrics)))
+        for code in np.unique(codes):
+            if code == 0:
+                continue
+            dims = tuple(i for i in range(len(metrics)) if code >> i & 1)
+            slots = np.flatnonzero(codes == code)
+            coords = np.stack([universe.columns[metrics[d]][slots] for d in dims], axis=1)
+            scale = [universe.ranges[metrics[d]]["denom"] for d in dims]
+            penalty = len(metrics) - len(dims)
+            self.groups.append((dims, penalty, _KDTree(slots, coords, scale)))
+
+    def patched(self, size: int, changed: List[int]) -> "_SubsetTrees":
+        new = _SubsetTrees.__new__(_SubsetTrees)
+        new.metrics = self.metrics
+        new.built_size = self.built_size
+        new.groups = self.groups
+        new.dirty = self.dirty.copy()
+        new.dirty[[s for s in changed if s < self.built_size]] = True
+        new.dirty_count = int(new.dirty.sum()) + (size - self.built_size)
+        return new
+
+    def stale(self) -> bool:
+        return self.dirty_count > max(MIN_REBUILD, REBUILD_FRACTION * self.built_size)
+
+
+class SimilarityIndex:
+    """Sub-linear top-N search for the /recommend similarity.
+
+    Results (ranking, rounded similarity, inaccessible flag) are identical to
+    :meth:`StockUniverse.top_n`: leaves are scored with the same arithmetic and
+    the tree is only used to skip subtrees that cannot reach the current
+    top-N. Trees are built lazily per metric subset and patched rather than
+    rebuilt when rows change, until too many slots have changed.
+    """
+
+    def __init__(self, universe: StockUniverse, trees: Optional[Dict[Tuple[str, ...], _SubsetTrees]] = None):
+        self.universe = universe
+        self.trees: Dict[Tuple[str, ...], _SubsetTrees] = trees or {}
+
+    def derive(self, universe: StockUniverse, changed: List[int]) -> "SimilarityIndex":
+        trees = {}
+        for metrics, subset in self.trees.items():
+            patched = subset.patched(universe.size, changed)
+            if not patched.stale():
+                trees[metrics] = patched
+        return SimilarityIndex(universe, trees)
+
+    def _subset(self, metrics: Tuple[str, ...]) -> _SubsetTrees:
+        subset = self.trees.get(metrics)
+        if subset is None:
+            subset = _SubsetTrees(self.universe, metrics)
+            self.trees[metrics] = subset
+        return subset
+
+    def top_n(self, provided: Dict[str, float], n: int) -> List[Tuple[int, float, bool]]:
+        universe = self.universe
+        if universe.count == 0 or n <= 0:
+            return []
+        n = min(n, universe.count)
+        metrics = tuple(m for m in SIMILARITY_METRICS if m in provided)
+        subset = self._subset(metrics)
+        query = [provided[m] for m in metrics]
+        denoms = [universe.ranges[m]["denom"] or 1.0 for m in metrics]
+        width = len(metrics)
+
+        cand_slots: List[np.ndarray] = []
+        cand_sims: List[np.ndarray] = []
+        best: List[float] = []   # min-heap of the n best similarities seen so far
+
+        def visit(slots: np.ndarray) -> None:
+            if not len(slots):
+                return
+            sims = universe.similarity(provided, slots)
+            floor = best[0] - TIE_MARGIN if len(best) == n else -1.0
+            keep = sims >= floor
+            cand_slots.append(slots[keep])
+            cand_sims.append(sims[keep])
+            for v in sims[keep].tolist():
+                if len(best) < n:
+                    heapq.heappush(best, v)
+                elif v > best[0]:
+                    heapq.heapreplace(best, v)
+
+        # slots changed since the trees were built are scanned directly
+        delta = np.concatenate([np.flatnonzero(subset.dirty),
+                                np.arange(subset.built_size, universe.size)]).astype(np.int64)
+        if len(delta):
+            delta = delta[universe.alive[delta] & ~universe.inaccessible(metrics)[delta]]
+            visit(delta)
+
+        heap: List[Tuple[float, int, int]] = []
+        for g, (dims, penalty, tree) in enumerate(subset.groups):
+            heap.append((-self._upper_bound(tree, 0, dims, penalty, query, denoms, width), g, 0))
+        heapq.heapify(heap)
+        has_dirty = subset.dirty_count > 0
+        while heap:
+            neg_ub, g, node = heapq.heappop(heap)
+            if len(best) == n and -neg_ub < best[0] - TIE_MARGIN:
+                break
+            dims, penalty, tree = subset.groups[g]
+            leaf = tree.leaves[node]
+            if leaf is not None:
+                visit(leaf[~subset.dirty[leaf]] if has_dirty else leaf)
+                continue
+            for child in tree.children[node]:
+                ub = self._upper_bound(tree, child, dims, penalty, query, denoms, width)
+                if len(best) < n or ub >= best[0] - TIE_MARGIN:
+                    heapq.heappush(heap, (-ub, g, child))
+
+        if len(best) < n or best[0] <= TIE_MARGIN:
+            # top-N reaches zero-similarity or inaccessible stocks: their order is
+            # table order, which only the linear scan sees
+            return universe.top_n(provided, n)
+
+        slots = np.concatenate(cand_slots)
+        sims = np.concatenate(cand_sims)
+        key = np.round(sims, 2)
+        order = np.lexsort((slots, -key))[:n]
+        return [(int(slots[i]), round(float(sims[i]), 2), False) for i in order]
+
+    @staticmethod
+    def _upper_bound(tree: _KDTree, node: int, dims, penalty, query, denoms, width) -> float:
+        lo = tree.lo[node]
+        hi = tree.hi[node]
+        dist = float(penalty)
+        for j, d in enumerate(dims):
+            q = query[d]
+            gap = lo[j] - q if q < lo[j] else (q - hi[j] if q > hi[j] else 0.0)
+            dist += min(1.0, gap / denoms[d])
+        return max(0.0, 1.0 - dist / width) * 100.0
@@ -0,0 +1,286 @@
+"""Precomputed stock scores in ``stock_scores``, refreshed by a batch job.
+
+Each row holds the quality, value and overall scores, the feedback (JSON)
+and the summary of one stock, stamped with ``inputHash``: a SHA-1 of the
+metrics they were computed from and of the scoring rules' fingerprint. The job walks
+``stocks`` in key order and re-scores only the stocks whose hash changed,
+then drops the rows of deleted stocks.
+
+:class:`StoredScoreModel` is the model the API serves with. It reads the
+stored row along with the stock and recomputes the hash; a row that is
+missing or stale (metrics changed since the last run, or other rules) is
+scored live, so answers never depend on when the job last ran.
+
+The feedback wording is not part of the hash; after changing it, run the
+job with ``--full``.
+
+    python stock_scores.py [--full] [--page 5000]
+"""
+import argparse
+import hashlib
+import json
+import math
+import struct
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from database import Error, PoolTimeout
+from evaluator import FEEDBACK_FIELDS, BatchEvaluation, ScoringRules, StockAnalyzerModel, model_from_env, \
+    rules_fingerprint
+
+PAGE = 5000       # stocks read, hashed and re-scored per transaction
+IN_CHUNK = 1000   # symbols per IN (...) lookup
+
+STORED_COLUMNS = ("inputHash", "quality", "value", "overall", "feedback", "summary")
+_JOINED = ", ".join(f"sc.{c} AS {c}" for c in STORED_COLUMNS)
+
+SCORED_STOCKS_SQL = f"""
+    SELECT s.*, {_JOINED}
+    FROM stocks s
+    LEFT JOIN stock_scores sc ON sc.stockSymbol=s.stockSymbol
+"""
+SCORED_STOCK_SQL = f"""
+    SELECT s.*, {_JOINED}
+    FROM stocks s
+    LEFT JOIN stock_scores sc ON sc.stockSymbol=s.stockSymbol
+    WHERE s.stockSymbol = %s
+"""
+REFRESH_PAGE_SQL = """
+    SELECT s.*, sc.inputHash AS inputHash
+    FROM stocks s
+    LEFT JOIN stock_scores sc ON sc.stockSymbol=s.stockSymbol
+    WHERE s.stockSymbol > %s
+    ORDER BY s.stockSymbol
+    LIMIT %s
+"""
+INSERT_SCORES_SQL = (
+    "INSERT INTO stock_scores (stockSymbol, inputHash, quality, value, overall, feedback, summary) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+DELETE_ORPHANS_SQL = "DELETE FROM stock_scores WHERE stockSymbol NOT IN (SELECT stockSymbol FROM stocks)"
+
+
+def _in_list(n: int) -> str:
+    return ", ".join(["%s"] * n)
+
+
+def scored_stocks_in_sql(n: int) -> str:
+    return f"""
+        SELECT s.*, {_JOINED}
+        FROM stocks s
+        LEFT JOIN stock_scores sc ON sc.stockSymbol=s.stockSymbol
+        WHERE s.stockSymbol IN ({_in_list(n)})
+    """
+
+
+def stored_scores_in_sql(n: int) -> str:
+    return f"SELECT stockSymbol, {', '.join(STORED_COLUMNS)} FROM stock_scores WHERE stockSymbol IN ({_in_list(n)})"
+
+
+def input_columns(rules: ScoringRules) -> List[str]:
+    """Stock columns the scores and feedback are computed from."""
+    columns = {column for _, column, _ in FEEDBACK_FIELDS}
+    columns.update(rule.column for rule in rules.value + rules.quality)
+    return sorted(columns)
+
+
+def input_hasher(rules: ScoringRules):
+    """``row -> inputHash`` for scores made with ``rules``.
+
+    The metrics are packed as doubles plus a NULL mask rather than
+    serialized, since the API recomputes the hash of every row it serves.
+    """
+    fingerprint = rules_fingerprint(rules).encode()
+    columns = input_columns(rules)
+    packer = struct.Struct(f"<{len(columns)}d")
+
+    def input_hash(row: Mapping[str, Any]) -> str:
+        get = row.get
+        values = [get(c) for c in columns]
+        digest = hashlib.sha1(fingerprint)
+        digest.update(packer.pack(*[math.nan if v is None else v for v in values]))
+        digest.update(bytes([v is None for v in values]))
+        return digest.hexdigest()
+
+    return input_hash
+
+
+def load_stored(symbols: Sequence[str]) -> List[Dict[str, Any]]:
+    from database import stock_cursor
+
+    rows: List[Dict[str, Any]] = []
+    with stock_cursor() as cursor:
+        for i in range(0, len(symbols), IN_CHUNK):
+            chunk = tuple(symbols[i:i + IN_CHUNK])
+            cursor.execute(stored_scores_in_sql(len(chunk)), chunk)
+            rows.extend(cursor.fetchall())
+    return rows
+
+
+class StoredEvaluation(BatchEvaluation):
+    """A batch whose fresh rows come from stock_scores and the rest from ``live``."""
+
+    def __init__(self, model: StockAnalyzerModel, rows: Sequence[Mapping[str, Any]], fresh: np.ndarray,
+                 live: Optional[BatchEvaluation]):
+        n = len(rows)
+        quality = np.zeros(n, dtype=np.int64)
+        value = np.zeros(n, dtype=np.int64)
+        overall = np.zeros(n, dtype=np.int64)
+        stored = np.flatnonzero(fresh)
+        for name, out in (("quality", quality), ("value", value), ("overall", overall)):
+            out[stored] = [rows[i][name] for i in stored.tolist()]
+            if live is not None:
+                out[~fresh] = getattr(live, name)
+        super().__init__(model, {"stockSymbol": [r.get("stockSymbol") for r in rows]}, n, quality, value, overall)
+        self.rows = rows
+        self.fresh = fresh
+        self.live = live
+        self._live_slot = np.cumsum(~fresh) - 1   # row -> position in the live batch
+
+    def feedback(self, i: int) -> Dict[str, str]:
+        if self.fresh[i]:
+            return orjson.loads(self.rows[i]["feedback"])
+        return self.live.feedback(int(self._live_slot[i]))
+
+    def summary(self, i: int, feedback: Optional[Dict[str, str]] = None) -> str:
+        if self.fresh[i]:
+            return self.rows[i]["summary"]
+        return self.live.summary(int(self._live_slot[i]), feedback)
+
+
+class StoredScoreModel(StockAnalyzerModel):
+    """StockAnalyzerModel that answers from stock_scores where the stored row is fresh.
+
+    ``evaluate`` and ``evaluate_rows`` take stock rows joined with their
+    stored columns (:data:`SCORED_STOCK_SQL`, :func:`scored_stocks_in_sql`;
+    the per-process universe snapshot loads them the same way). Rows without
+    them are looked up with ``loader`` when text is wanted, and scored live
+    if that lookup fails. Results are identical to live scoring.
+    """
+
+    def __init__(self, *args, loader=load_stored, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.input_hash = input_hasher(self.rules)
+        self.loader = loader
+        self._counts = {"stored": 0, "live": 0}
+        self._counts_lock = threading.Lock()
+
+    def _count(self, stored: int, live: int) -> None:
+        with self._counts_lock:
+            self._counts["stored"] += stored
+            self._counts["live"] += live
+
+    def stored_scores_info(self) -> Dict[str, Any]:
+        stored, live = self._counts["stored"], self._counts["live"]
+        total = stored + live
+        return {"stored": stored, "live": live, "stored_ratio": round(stored / total, 4) if total else 0.0}
+
+    def fresh(self, row: Mapping[str, Any]) -> bool:
+        stored = row.get("inputHash")
+        return stored is not None and stored == self.input_hash(row)
+
+    def evaluate(self, stock: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.fresh(stock):
+            self._count(0, 1)
+            return super().evaluate(stock)
+        self._count(1, 0)
+        return {
+            "stockSymbol": stock.get("stockSymbol", "Unknown"),
+            "quality": int(stock["quality"]),
+            "value": int(stock["value"]),
+            "overall": int(stock["overall"]),
+            "feedback": orjson.loads(stock["feedback"]),
+            "summary": stock["summary"],
+        }
+
+    def evaluate_rows(self, rows: Sequence[Dict[str, Any]], text: bool = True) -> BatchEvaluation:
+        if not text:
+            # live scores cost less than checking the stored rows' hashes
+            self._count(0, len(rows))
+            return super().evaluate_rows(rows)
+        missing = [r["stockSymbol"] for r in rows if "inputHash" not in r and r.get("stockSymbol") is not None]
+        if missing and self.loader is not None:
+            try:
+                stored = {s["stockSymbol"]: s for s in self.loader(missing)}
+            except (Error, PoolTimeout):
+                stored = {}
+            rows = [{**r, **stored[r["stockSymbol"]]} if r.get("stockSymbol") in stored else r for r in rows]
+        fresh = np.array([self.fresh(r) for r in rows], dtype=bool)
+        stale = [r for r, ok in zip(rows, fresh.tolist()) if not ok]
+        self._count(len(rows) - len(stale), len(stale))
+        live = super().evaluate_rows(stale) if stale else None
+        return StoredEvaluation(self, rows, fresh, live)
+
+
+# --- batch job ---
+
+def score_rows(model: StockAnalyzerModel, rows: Sequence[Mapping[str, Any]], input_hash) -> List[Tuple]:
+    """``stock_scores`` rows for ``rows``, scored live with ``model`` (never from stored rows)."""
+    batch = StockAnalyzerModel.evaluate_rows(model, rows)
+    out = []
+    for i, row in enumerate(rows):
+        record = batch.record(i)
+        out.append((record["stockSymbol"], input_hash(row), record["quality"], record["value"], record["overall"],
+                     json.dumps(record["feedback"]), record["summary"]))
+    return out
+
+
+def refresh_scores(conn, model: Optional[StockAnalyzerModel] = None, full: bool = False,
+                   page: int = PAGE) -> Dict[str, int]:
+    """Re-score the stocks whose inputHash changed (every stock with ``full``).
+
+    Commits once per page of ``page`` stocks, so an interrupted run keeps
+    its progress and the next run continues where the hashes still differ.
+    """
+    model = model or model_from_env()
+    input_hash = input_hasher(model.rules)
+    cursor = conn.cursor(dictionary=True)
+    counts = {"stocks": 0, "rescored": 0, "deleted": 0}
+    try:
+        after = ""
+        while True:
+            cursor.execute(REFRESH_PAGE_SQL, (after, page))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            after = rows[-1]["stockSymbol"]
+            counts["stocks"] += len(rows)
+            stale = [r for r in rows if full or r["inputHash"] != input_hash(r)]
+            if stale:
+                symbols = tuple(r["stockSymbol"] for r in stale)
+                cursor.execute(f"DELETE FROM stock_scores WHERE stockSymbol IN ({_in_list(len(symbols))})", symbols)
+                cursor.executemany(INSERT_SCORES_SQL, score_rows(model, stale, input_hash))
+                counts["rescored"] += len(stale)
+            conn.commit()
+        cursor.execute(DELETE_ORPHANS_SQL)
+        counts["deleted"] = max(cursor.rowcount, 0)
+        conn.commit()
+    finally:
+        cursor.close()
+    return counts
+
+
+def main() -> None:
+    import mysql.connector
+
+    from database import HOST, USER, PASSWORD, STOCK_DB
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="re-score every stock, e.g. after editing feedback text")
+    parser.add_argument("--page", type=int, default=PAGE)
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(host=HOST, user=USER, password=PASSWORD, database=STOCK_DB)
+    try:
+        counts = refresh_scores(conn, full=args.full, page=args.page)
+        print(f"Checked {counts['stocks']} stocks: re-scored {counts['rescored']}, "
+              f"dropped {counts['deleted']} scores of deleted stocks")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SIMILARITY_METRICS = ["debtToEquityRatio", "returnOnEquity", "returnOnAssets", "bookValuePerShare"]
+
+UNIVERSE_TTL = 300.0  # seconds before the snapshot is reloaded from MySQL
+
+
+def metric_range(col: np.ndarray, null: np.ndarray) -> Dict[str, float]:
+    """min/max of a metric column and the denominator that normalises its distances."""
+    if null.all():
+        return {"min": 0.0, "max": 0.0, "denom": 1.0}
+    mn = float(col[~null].min())
+    mx = float(col[~null].max())
+    denom = mx - mn if (mx - mn) > 1e-9 else max(abs(mx), 1.0)
+    return {"min": mn, "max": mx, "denom": denom}
+
+
+class StockUniverse:
+    """Immutable columnar snapshot of the ``stocks`` table.
+
+    Each similarity metric is held as a float64 array (NaN where the column is
+    NULL) together with its null mask and the min/max/denominator used to
+    normalise distances in /recommend. Rows are addressed by slot; slots of
+    deleted stocks stay in place as tombstones until the next full reload so
+    that derived structures (the similarity index) can be patched instead of
+    rebuilt.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], loaded_at: Optional[float] = None):
+        self.rows: List[Optional[Dict[str, Any]]] = rows
+        self.loaded_at = time.monotonic() if loaded_at is None else loaded_at
+        self.alive = np.ones(len(rows), dtype=bool)
+        self.columns: Dict[str, np.ndarray] = {
+            m: np.array([np.nan if r.get(m) is None else r[m] for r in rows], dtype=np.float64)
+            for m in SIMILARITY_METRICS
+        }
+        self._index = None
+        self._finish()
+
+    def _finish(self) -> None:
+        self.size = len(self.rows)
+        self.count = int(self.alive.sum())
+        self.symbols = np.array([r.get("stockSymbol") if r else None for r in self.rows], dtype=object)
+        self.slot_of = {r["stockSymbol"]: i for i, r in enumerate(self.rows) if r is not None}
+        self.nulls: Dict[str, np.ndarray] = {}
+        self.ranges: Dict[str, Dict[str, float]] = {}
+        self._inaccessible: Dict[frozenset, np.ndarray] = {}
+        for m in SIMILARITY_METRICS:
+            col = self.columns[m]
+            null = np.isnan(col)
+            self.nulls[m] = null
+            self.ranges[m] = metric_range(col, null)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def slot(self, symbol: str) -> Optional[int]:
+        return self.slot_of.get(symbol)
+
+    def evaluations(self, model, slots: Sequence[int], text: bool = True):
+        """``model`` scores (a BatchEvaluation) of the stocks in ``slots``."""
+        return model.evaluate_rows([self.rows[i] for i in slots], text=text)
+
+    @property
+    def index(self):
+        """Nearest-neighbour index over this snapshot, built on first use."""
+        if self._index is None:
+            from similarity_index import SimilarityIndex
+
+            self._index = SimilarityIndex(self)
+        return self._index
+
+    def with_changes(self, upserts: List[Dict[str, Any]], deleted: List[str] = ()) -> "StockUniverse":
+        """Return a new snapshot with ``upserts`` applied and ``deleted`` symbols removed.
+
+        Updated stocks keep their slot, new stocks are appended and deleted
+        stocks become tombstones. An already built index is carried over and
+        patched for the changed slots.
+        """
+        new = StockUniverse.__new__(StockUniverse)
+        new.rows = list(self.rows)
+        new.loaded_at = self.loaded_at
+        new._index = None
+        grow = len({r["stockSymbol"] for r in upserts} - self.slot_of.keys())
+        new.alive = np.concatenate([self.alive, np.ones(grow, dtype=bool)])
+        new.columns = {m: np.concatenate([c, np.full(grow, np.nan)]) for m, c in self.columns.items()}
+
+        slot_of = dict(self.slot_of)
+        changed = []
+        for row in upserts:
+            slot = slot_of.get(row["stockSymbol"])
+            if slot is None:
+                slot = len(new.rows)
+                new.rows.append(row)
+                slot_of[row["stockSymbol"]] = slot
+            new.rows[slot] = row
+            for m in SIMILARITY_METRICS:
+                new.columns[m][slot] = np.nan if row.get(m) is None else row[m]
+            changed.append(slot)
+        for symbol in deleted:
+            slot = slot_of.pop(symbol, None)
+            if slot is None:
+                continue
+            new.rows[slot] = None
+            new.alive[slot] = False
+            for m in SIMILARITY_METRICS:
+                new.columns[m][slot] = np.nan
+            changed.append(slot)
+
+        new._finish()
+        if self._index is not None:
+            new._index = self._index.derive(new, changed)
+        return new
+
+    def inaccessible(self, metrics) -> np.ndarray:
+        """Mask of stocks missing every one of ``metrics`` (cached per metric subset)."""
+        key = frozenset(metrics)
+        mask = self._inaccessible.get(key)
+        if mask is None:
+            mask = np.logical_and.reduce([self.nulls[m] for m in key])
+            self._inaccessible[key] = mask
+        return mask
+
+    def similarity(self, provided: Dict[str, float], slots: Optional[np.ndarray] = None) -> np.ndarray:
+        """Unrounded similarity to ``provided`` of every slot, or of ``slots`` only.
+
+        Same arithmetic as the original per-row loop: clipped, range-normalised
+        L1 distance per metric (1.0 where the stock lacks the metric), averaged
+        over the provided metrics.
+        """
+        total = np.zeros(self.size if slots is None else len(slots), dtype=np.float64)
+        buf = np.empty_like(total)
+        for k, user_val in provided.items():
+            col = self.columns[k] if slots is None else self.columns[k][slots]
+            np.subtract(col, user_val, out=buf)
+            np.abs(buf, out=buf)
+            np.divide(buf, self.ranges[k]["denom"] or 1.0, out=buf)
+            # fmin drops NaN, so NULL metrics become the maximum distance 1.0
+            np.fmin(buf, 1.0, out=buf)
+            total += buf
+        total /= max(1, len(provided))
+        np.subtract(1.0, total, out=total)
+        np.maximum(total, 0.0, out=total)
+        total *= 100.0
+        return total
+
+    def top_n(self, provided: Dict[str, float], n: int) -> List[Tuple[int, float, bool]]:
+        """Return ``[(row_index, similarity, inaccessible), ...]`` for the best ``n`` stocks.
+
+        Ordering matches ``sorted(key=(inaccessible, -round(similarity, 2)))`` over
+        rows in table order: accessible stocks first, then by rounded similarity,
+        ties kept in row order. Only a partial sort of the candidates is done.
+        """
+        size = self.size
+        if self.count == 0 or n <= 0:
+            return []
+        n = min(n, self.count)
+        similarity = self.similarity(provided)
+        if self.count < size:
+            # tombstones can never be selected
+            similarity[~self.alive] = -1.0
+        if n < size:
+            kth = np.argpartition(similarity, size - n)[size - n]
+            # keep everything that could round to the n-th score so ties resolve by row order
+            candidates = np.flatnonzero(similarity >= round(float(similarity[kth]), 2) - 0.01)
+        else:
+            candidates = np.arange(size)
+        inaccessible = self.inaccessible(provided)[candidates]
+        # inaccessible rows score 0, so -1 sorts them after every accessible row
+        key = np.round(similarity[candidates], 2)
+        key[inaccessible] = -1.0
+        key[similarity[candidates] < 0] = -2.0
+        order = np.lexsort((candidates, -key))[:n]
+        return [(int(candidates[i]), round(float(similarity[candidates[i]]), 2), bool(inaccessible[i]))
+                for i in order]
+
+
+class UniverseCache:
+    """Process-wide holder of the current :class:`StockUniverse`.
+
+    The snapshot is reloaded when it is older than ``ttl`` seconds or after
+    :meth:`invalidate` is called.
+    """
+
+    def __init__(self, loader, ttl: float = UNIVERSE_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._universe: Optional[StockUniverse] = None
+        self._lock = threading.Lock()
+
+    def _fresh(self, universe: Optional[StockUniverse]) -> bool:
+        return universe is not None and (time.monotonic() - universe.loaded_at) < self.ttl
+
+    def get(self) -> StockUniverse:
+        universe = self._universe
+        if self._fresh(universe):
+            return universe
+        with self._lock:
+            return self.get_locked()
+
+    def get_locked(self) -> StockUniverse:
+        universe = self._universe
+        if not self._fresh(universe):
+            universe = StockUniverse(self.loader())
+            self._universe = universe
+        return universe
+
+    def invalidate(self) -> None:
+        self._universe = None
+
+    def apply_changes(self, upserts: List[Dict[str, Any]], deleted: List[str] = ()) -> StockUniverse:
+        """Patch the current snapshot with changed rows instead of reloading the table."""
+        with self._lock:
+            universe = self._universe
+            if universe is None:
+                return self.get_locked()
+            universe = universe.with_changes(upserts, deleted)
+            self._universe = universe
+            return universe
+
+
+STOCKS_SQL = "SELECT * FROM stocks"
+STOCK_SQL = "SELECT * FROM stocks WHERE stockSymbol = %s"
+STOCK_SYMBOLS_SQL = "SELECT stockSymbol FROM stocks ORDER BY stockSymbol"
+
+
+def stocks_in_sql(n: int) -> str:
+    return f"SELECT * FROM stocks WHERE stockSymbol IN ({', '.join(['%s'] * n)})"
+
+
+def load_stock_rows(symbols: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    from database import stock_cursor
+
+    with stock_cursor() as cursor:
+        if symbols is None:
+            cursor.execute(STOCKS_SQL)
+        else:
+            cursor.execute(stocks_in_sql(len(symbols)), tuple(symbols))
+        return cursor.fetchall()
+
+
+def load_scored_stock_rows(symbols: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """:func:`load_stock_rows` joined with the stored scores of stock_scores.py.
+
+    Falls back to the bare rows (scored live) when stock_scores cannot be read.
+    """
+    from database import Error, stock_cursor
+    from stock_scores import SCORED_STOCKS_SQL, scored_stocks_in_sql
+
+    try:
+        with stock_cursor() as cursor:
+            if symbols is None:
+                cursor.execute(SCORED_STOCKS_SQL)
+            else:
+                cursor.execute(scored_stocks_in_sql(len(symbols)), tuple(symbols))
+            return cursor.fetchall()
+    except Error:
+        return load_stock_rows(symbols)
+
+
+def refresh_symbols(symbols: List[str]) -> StockUniverse:
+    """Re-read ``symbols`` from MySQL and patch them into the cached snapshot."""
+    rows = load_scored_stock_rows(symbols) if symbols else []
+    found = {r["stockSymbol"] for r in rows}
+    return universe_cache.apply_changes(rows, [s for s in symbols if s not in found])
+
+
+def make_universe_cache():
+    path = os.environ.get("SHARED_UNIVERSE")
+    if path:
+        # multi-worker mode: every worker maps one snapshot file (see shared_universe.py)
+        from shared_universe import SharedUniverseCache
+
+        return SharedUniverseCache(path, load_stock_rows)
+    return UniverseCache(load_scored_stock_rows)
+
+
+universe_cache = make_universe_cache()
@@ -0,0 +1,33 @@
+"""Analyzers on CompactPortfolio against the dict form of the same portfolios."""
+import json
+
+from compact_portfolio import from_json
+from exposure import analyze_portfolio
+from generators import iter_portfolios
+from suite import db_portfolio
+import pML2
+
+
+def portfolios(n=200):
+    out = list(iter_portfolios(n, seed=5, n_stocks=300))
+    out[0]["funds"][0]["sectors"]["it"] = 0.1   # same sector in another case
+    out[1]["funds"].append({"fundCode": "EMPTY", "amount": 5, "holdings": {}, "sectors": {}})
+    # parsed back from JSON, as the loaders see them
+    return [json.loads(json.dumps(p)) for p in out]
+
+
+def test_round_trip():
+    for portfolio in portfolios():
+        funds = [{k: f[k] for k in ("fundCode", "amount", "holdings", "sectors")} for f in portfolio["funds"]]
+        assert from_json(portfolio).to_dict()["funds"] == funds
+
+
+def test_analyze_portfolio_matches_dict_rows():
+    for portfolio in portfolios():
+        assert analyze_portfolio(from_json(portfolio)) == analyze_portfolio(*db_portfolio(portfolio))
+
+
+def test_pml2_analyzer_matches_dict_input():
+    for portfolio in portfolios():
+        compact = pML2.PortfolioAnalyzer(from_json(portfolio)).evaluate()
+        assert compact == pML2.PortfolioAnalyzer(pML2.analyzer_input(portfolio)).evaluate()
@@ -0,0 +1,47 @@
+"""Batch scoring (evaluate_rows / evaluate_many) against evaluate row by row."""
+import math
+
+import numpy as np
+
+from evaluator import StockAnalyzerModel
+from generators import iter_stocks
+
+EDGE_CASES = [
+    {"stockSymbol": "NONE"},
+    {"stockSymbol": "NULLS", "priceEarningsRatio": None, "returnOnEquity": None, "marketCap": None},
+    {"stockSymbol": "NANS", "priceEarningsRatio": math.nan, "returnOnEquity": math.nan, "marketCap": math.nan,
+     "earningsPerShare": math.nan, "debtToEquityRatio": math.nan},
+    {"stockSymbol": "ZEROS", "priceEarningsRatio": 0, "returnOnEquity": 0.0, "marketCap": 0, "earningsPerShare": 0},
+    {"stockSymbol": "NEGATIVE", "priceEarningsRatio": -5.0, "earningsPerShare": -1.5, "returnOnEquity": -0.2},
+]
+
+
+def stock_rows(n=300):
+    rows = [{"stockSymbol": s["stockSymbol"], **s["parameters"]} for s in iter_stocks(n, seed=7)]
+    return rows + EDGE_CASES
+
+
+def test_evaluate_rows_matches_evaluate():
+    model = StockAnalyzerModel()
+    rows = stock_rows()
+    batch = model.evaluate_rows(rows)
+    assert [batch.record(i) for i in range(len(rows))] == [model.evaluate(r) for r in rows]
+
+
+def test_evaluate_many_with_nan_arrays_matches_evaluate():
+    model = StockAnalyzerModel()
+    rows = stock_rows()
+    columns = {c: np.array([np.nan if r.get(c) is None else r[c] for r in rows], dtype=np.float64)
+               for c in {c for r in rows for c in r} - {"stockSymbol"}}
+    columns["stockSymbol"] = [r["stockSymbol"] for r in rows]
+    batch = model.evaluate_many(columns)
+    # a float array holds ints as floats, so compare with rows holding the same values
+    as_floats = [{c: v if c == "stockSymbol" or v is None else float(v) for c, v in r.items()} for r in rows]
+    assert list(batch.records()) == [model.evaluate(r) for r in as_floats]
+
+
+def test_nan_scores_like_none():
+    model = StockAnalyzerModel()
+    nan, none = model.evaluate(EDGE_CASES[2]), model.evaluate({"stockSymbol": "NANS"})
+    assert {k: nan[k] for k in ("quality", "value", "overall", "feedback")} == \
+        {k: none[k] for k in ("quality", "value", "overall", "feedback")}
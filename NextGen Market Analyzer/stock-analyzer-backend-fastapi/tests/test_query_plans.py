@@ -0,0 +1,13 @@
+"""Fails when an endpoint query needs a full table scan (see benchmarks/check_query_plans.py).
+
+    python -m pytest tests
+"""
+import check_query_plans
+
+
+def test_every_endpoint_query_uses_an_index():
+    assert check_query_plans.main([]) == 0
+
+
+def test_check_fails_without_the_migration_indexes():
+    assert check_query_plans.main(["--no-indexes"]) == 1
@@ -0,0 +1,38 @@
+"""The KD-tree /recommend ranking against the StockUniverse.top_n scan."""
+import random
+
+from generators import iter_stocks
+from similarity_index import SimilarityIndex
+from stock_universe import SIMILARITY_METRICS, StockUniverse
+
+QUERIES = [
+    {"debtToEquityRatio": 1.1, "returnOnEquity": 0.18},
+    {"returnOnAssets": 0.05},
+    {m: 0.0 for m in SIMILARITY_METRICS},
+    {"bookValuePerShare": 120.0, "debtToEquityRatio": 3.9, "returnOnAssets": -0.04},
+]
+
+
+def stock_rows(n=3000, seed=3):
+    return [{"stockSymbol": s["stockSymbol"], **s["parameters"]} for s in iter_stocks(n, seed=seed)]
+
+
+def test_top_n_matches_the_scan():
+    universe = StockUniverse(stock_rows())
+    index = SimilarityIndex(universe)
+    for provided in QUERIES:
+        for n in (1, 10, 250):
+            assert index.top_n(provided, n) == universe.top_n(provided, n)
+
+
+def test_top_n_matches_the_scan_after_changes():
+    rng = random.Random(5)
+    rows = stock_rows()
+    universe = StockUniverse(rows)
+    for provided in QUERIES:
+        universe.index.top_n(provided, 10)   # build the trees that with_changes patches
+    upserts = [{**row, "returnOnEquity": round(rng.uniform(-0.1, 0.45), 3)} for row in rng.sample(rows, 40)]
+    upserts += [{"stockSymbol": f"NEW{i}", "debtToEquityRatio": 1.1, "returnOnEquity": 0.18} for i in range(5)]
+    changed = universe.with_changes(upserts, deleted=[r["stockSymbol"] for r in rows[:30]])
+    for provided in QUERIES:
+        assert changed.index.top_n(provided, 20) == changed.top_n(provided, 20)
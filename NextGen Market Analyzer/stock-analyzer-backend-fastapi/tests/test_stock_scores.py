@@ -0,0 +1,27 @@
+"""Scores served from stock_scores against scoring the same stocks live."""
+from evaluator import StockAnalyzerModel
+from generators import iter_stocks
+from standin import StandInDB
+from stock_scores import SCORED_STOCKS_SQL, StoredScoreModel, refresh_scores
+
+
+def test_stored_scores_match_live_scores():
+    db = StandInDB()
+    db.load_stocks(iter_stocks(500, seed=11))
+    live, stored = StockAnalyzerModel(), StoredScoreModel(loader=None)
+    assert refresh_scores(db, live)["rescored"] == 500
+    # make some stored rows stale; those are scored live
+    db.conn.execute("UPDATE stocks SET returnOnEquity = 0.3 WHERE stockSymbol <= 'STK050'")
+    db.conn.execute("UPDATE stocks SET marketCap = NULL WHERE stockSymbol > 'STK480'")
+    db.conn.commit()
+
+    cursor = db.cursor(dictionary=True)
+    cursor.execute(SCORED_STOCKS_SQL + " ORDER BY s.stockSymbol")
+    rows = cursor.fetchall()
+    expected = [live.evaluate(r) for r in rows]
+    for text in (True, False):
+        records = list(stored.evaluate_rows(rows, text=text).records(text=text))
+        assert records == (expected if text else [{k: e[k] for k in records[0]} for e in expected])
+    assert [stored.evaluate(r) for r in rows] == expected
+    info = stored.stored_scores_info()
+    assert info["stored"] > 0 and info["live"] > 0
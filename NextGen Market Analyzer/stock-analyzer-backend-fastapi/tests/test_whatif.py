@@ -0,0 +1,47 @@
+"""Incremental what-if analysis against analyze_portfolio recomputed from scratch."""
+import pytest
+
+from generators import iter_portfolios
+from suite import db_portfolio
+from whatif import WhatIfError, WhatIfSession
+
+CHANGES = [
+    {"op": "set_amount", "fundCode": "FUND_0", "amount": 250000},
+    {"op": "set_holding", "fundCode": "FUND_1", "stockSymbol": "STK001", "percent": 12.5},
+    {"op": "set_holding", "fundCode": "FUND_0", "stockSymbol": "STK002", "percent": 7.0},
+    {"op": "set_sector", "fundCode": "FUND_1", "sectorName": "IT", "percent": 40.0},
+    {"op": "add_fund", "fundCode": "NEW", "amount": 500000,
+     "holdings": {"STK001": 30.0, "STK003": 70.0}, "sectors": {"IT": 60.0, "Energy": 40.0}},
+    {"op": "remove_fund", "fundCode": "FUND_2"},
+    {"op": "set_holding", "fundCode": "NEW", "stockSymbol": "STK003", "percent": None},
+]
+
+
+def assert_same_analysis(session):
+    incremental, full = session.analysis(), session.full_analysis()
+    # scores may differ in the last rounded digit at an exact .xx5 tie (see whatif.py)
+    for key in ("fund_overlap_score", "sector_score", "final_diversification_score"):
+        assert incremental[key] == pytest.approx(full[key], abs=0.011)
+    assert incremental["sector_distribution"] == pytest.approx(full["sector_distribution"], abs=0.011)
+
+
+def portfolios(n=20):
+    return list(iter_portfolios(n, seed=9, n_stocks=50, funds=(3, 6)))
+
+
+def test_session_matches_full_analysis_after_each_change():
+    for portfolio in portfolios():
+        session = WhatIfSession(*db_portfolio(portfolio))
+        assert_same_analysis(session)
+        for change in CHANGES:
+            session.apply_all([change])
+            assert_same_analysis(session)
+
+
+def test_failed_batch_leaves_the_session_unchanged():
+    session = WhatIfSession(*db_portfolio(portfolios(1)[0]))
+    before, funds = session.analysis(), session.funds()
+    with pytest.raises(WhatIfError):
+        session.apply_all(CHANGES + [{"op": "set_amount", "fundCode": "MISSING", "amount": 1}])
+    assert session.funds() == funds
+    assert session.analysis() == before
@@ -0,0 +1,327 @@
+"""What-if sessions: a client portfolio loaded once, then edited change by change.
+
+A :class:`WhatIfSession` keeps the state :func:`exposure.analyze_portfolio`
+derives from scratch, in a form each change updates in place:
+
+- overlap: the holders of every stock and the overlap of every fund pair
+  that shares one, plus their sum. Changing a holding touches only the funds
+  holding that stock; adding or removing a fund touches only its pairs.
+- sectors: per-sector sums of ``percent * amount`` before dividing by the
+  total amount, and the sum of their squares (HHI times total squared).
+  Changing an amount or a sector weight touches only that fund's sectors.
+
+Scores therefore follow a change in time proportional to what it touches,
+not to F^2 pairs or the whole portfolio. Loading computes the pair overlaps
+with the same vectorized :class:`overlap.FundOverlap` pass as the analysis.
+The sector sums are exact fractions: HHI divides by the squared total, which
+would magnify the float residue left when a large fund is removed. Scores
+agree with a full :func:`analyze_portfolio` run; at an exact ``.xx5`` tie the
+last rounded digit follows whichever float sum lands on which side.
+Sessions live in the worker's memory (:class:`SessionStore`), so a
+multi-worker deployment needs sticky routing for /whatif.
+"""
+import time
+import uuid
+from collections import OrderedDict
+from fractions import Fraction
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from exposure import analyze_portfolio
+from overlap import FundOverlap
+
+SESSION_TTL = 1800.0   # seconds a session survives without being used
+MAX_SESSIONS = 1000
+
+OPS = ("set_amount", "add_fund", "remove_fund", "set_holding", "set_sector")
+
+
+class WhatIfError(ValueError):
+    """A change that cannot be applied to the session (unknown fund, bad value...)."""
+
+
+class WhatIfSession:
+    def __init__(self, funds, holdings_by_fund, sectors_by_fund):
+        """Build from the rows :func:`portfolio_data.fetch_client_portfolio` returns."""
+        codes = [f["fundCode"] for f in funds]
+        if len(set(codes)) != len(codes):
+            raise WhatIfError("Fund codes must be unique within a portfolio to edit it")
+        self.id = uuid.uuid4().hex
+        self.amounts: Dict[str, float] = {}
+        self.holdings: Dict[str, Dict[str, float]] = {}   # fund -> stock -> weight (fraction)
+        self.sectors: Dict[str, Dict[str, float]] = {}    # fund -> sector -> weight (fraction)
+        self.holders: Dict[str, Dict[str, float]] = {}    # stock -> fund -> weight
+        self.pairs: Dict[str, Dict[str, float]] = {}     # fund -> other fund -> overlap, both directions
+        self.overlap_sum = 0.0                           # sum of overlap over unordered pairs
+        self.sector_sums: Dict[str, Fraction] = {}       # sector -> sum of weight * amount
+        self.sector_rows: Dict[str, int] = {}            # sector -> funds listing it
+        self.square_sum = Fraction(0)                    # sum of sector_sums squared
+        self.total = Fraction(0)
+        for fund in funds:
+            code, fid = fund["fundCode"], fund["fundId"]
+            self._add_fund(code, fund["amount"], {}, [(r["sectorName"], r["percent"] / 100.0)
+                                                      for r in sectors_by_fund[fid]])
+            weights = self.holdings[code] = {r["stockSymbol"]: r["percent"] / 100.0 for r in holdings_by_fund[fid]}
+            for symbol, weight in weights.items():
+                self.holders.setdefault(symbol, {})[code] = weight
+        # overlap of the loaded funds in one vectorized pass, as analyze_portfolio computes it
+        codes = list(self.holdings)
+        engine = FundOverlap([self.holdings[code] for code in codes])
+        matrix = engine.matrix()
+        for i, j in zip(*np.nonzero(np.triu(matrix, 1))):
+            self.pairs[codes[i]][codes[j]] = self.pairs[codes[j]][codes[i]] = float(matrix[i, j])
+        self.overlap_sum = float(engine.pairwise().sum())
+        self.touched = time.monotonic()
+
+    # --- incremental updates on raw weights (fractions) ---
+
+    def _set_weight(self, code: str, symbol: str, weight: Optional[float]) -> None:
+        fund_holdings = self.holdings[code]
+        old = fund_holdings.get(symbol, 0.0)
+        new = 0.0 if weight is None else weight
+        holders = self.holders.setdefault(symbol, {})
+        pairs = self.pairs[code]
+        for other, other_weight in holders.items():
+            if other == code:
+                continue
+            delta = min(new, other_weight) - min(old, other_weight)
+            if delta:
+                pairs[other] = pairs.get(other, 0.0) + delta
+                self.pairs[other][code] = pairs[other]
+                self.overlap_sum += delta
+        if weight is None:
+            fund_holdings.pop(symbol, None)
+            holders.pop(code, None)
+            if not holders:
+                del self.holders[symbol]
+        else:
+            fund_holdings[symbol] = weight
+            holders[code] = weight
+
+    def _add_sector(self, sector: str, weighted: Fraction, rows: int) -> None:
+        """Add ``weighted`` to a sector's sum; ``rows`` is the change in funds listing it."""
+        old = self.sector_sums.get(sector, Fraction(0))
+        new = old + weighted
+        count = self.sector_rows.get(sector, 0) + rows
+        if count:
+            self.square_sum += new * new - old * old
+            self.sector_sums[sector] = new
+            self.sector_rows[sector] = count
+        else:
+            self.square_sum -= old * old
+            self.sector_sums.pop(sector, None)
+            self.sector_rows.pop(sector, None)
+
+    def _set_sector_weight(self, code: str, sector: str, weight: Optional[float]) -> None:
+        fund_sectors = self.sectors[code]
+        old = fund_sectors.get(sector)
+        rows = (weight is not None) - (old is not None)
+        self._add_sector(sector, (Fraction(weight or 0) - Fraction(old or 0)) * Fraction(self.amounts[code]), rows)
+        if weight is None:
+            fund_sectors.pop(sector, None)
+        else:
+            fund_sectors[sector] = weight
+
+    def _set_amount(self, code: str, amount: float) -> None:
+        change = Fraction(amount) - Fraction(self.amounts[code])
+        for sector, weight in self.sectors[code].items():
+            self._add_sector(sector, Fraction(weight) * change, 0)
+        self.amounts[code] = amount
+        self.total += change
+
+    def _add_fund(self, code: str, amount: float, holdings: Mapping[str, float], sectors) -> None:
+        self.amounts[code] = amount
+        self.total += Fraction(amount)
+        self.holdings[code] = {}
+        self.sectors[code] = {}
+        self.pairs[code] = {}
+        for symbol, weight in holdings.items():
+            self._set_weight(code, symbol, weight)
+        fund_sectors = self.sectors[code]
+        # a fund may list a sector twice; analyze_portfolio adds both rows
+        for sector, weight in sectors:
+            rows = 0 if sector in fund_sectors else 1
+            fund_sectors[sector] = fund_sectors.get(sector, 0.0) + weight
+            self._add_sector(sector, Fraction(weight) * Fraction(amount), rows)
+
+    def _remove_fund(self, code: str) -> None:
+        for other, overlap in self.pairs.pop(code).items():
+            self.overlap_sum -= overlap
+            del self.pairs[other][code]
+        for symbol in self.holdings.pop(code):
+            holders = self.holders[symbol]
+            del holders[code]
+            if not holders:
+                del self.holders[symbol]
+        amount = Fraction(self.amounts.pop(code))
+        for sector, weight in self.sectors.pop(code).items():
+            self._add_sector(sector, -Fraction(weight) * amount, -1)
+        self.total -= amount
+
+    # --- changes as sent by clients (percents); each returns a function that undoes it ---
+
+    def _fund(self, code: Optional[str]) -> str:
+        if code not in self.amounts:
+            raise WhatIfError(f"Unknown fund {code!r}")
+        return code
+
+    @staticmethod
+    def _amount(value) -> float:
+        if value is None or value < 0:
+            raise WhatIfError("amount must be a number >= 0")
+        return value
+
+    @staticmethod
+    def _weight(value, name: str) -> float:
+        if value is None or value < 0:
+            raise WhatIfError(f"{name} must be a number >= 0")
+        return value / 100.0
+
+    def set_amount(self, code: str, amount: float) -> Callable[[], None]:
+        code = self._fund(code)
+        amount = self._amount(amount)
+        old = self.amounts[code]
+        self._set_amount(code, amount)
+        return lambda: self._set_amount(code, old)
+
+    def add_fund(self, code: str, amount: float, holdings: Optional[Mapping[str, float]] = None,
+                 sectors: Optional[Mapping[str, float]] = None) -> Callable[[], None]:
+        if not code:
+            raise WhatIfError("fundCode is required")
+        if code in self.amounts:
+            raise WhatIfError(f"Fund {code!r} already exists")
+        amount = self._amount(amount)
+        weights = {s: self._weight(p, f"holding {s}") for s, p in (holdings or {}).items()}
+        sector_weights = [(s, self._weight(p, f"sector {s}")) for s, p in (sectors or {}).items()]
+        self._add_fund(code, amount, weights, sector_weights)
+        return lambda: self._remove_fund(code)
+
+    def remove_fund(self, code: str) -> Callable[[], None]:
+        code = self._fund(code)
+        amount, holdings, sectors = self.amounts[code], self.holdings[code], self.sectors[code]
+        self._remove_fund(code)
+        return lambda: self._add_fund(code, amount, holdings, list(sectors.items()))
+
+    def set_holding(self, code: str, symbol: str, percent: Optional[float]) -> Callable[[], None]:
+        """Set a holding's percent; None removes it."""
+        code = self._fund(code)
+        if not symbol:
+            raise WhatIfError("stockSymbol is required")
+        weight = None if percent is None else self._weight(percent, "percent")
+        old = self.holdings[code].get(symbol)
+        self._set_weight(code, symbol, weight)
+        return lambda: self._set_weight(code, symbol, old)
+
+    def set_sector(self, code: str, sector: str, percent: Optional[float]) -> Callable[[], None]:
+        """Set a sector's percent in a fund; None removes it."""
+        code = self._fund(code)
+        if not sector:
+            raise WhatIfError("sectorName is required")
+        weight = None if percent is None else self._weight(percent, "percent")
+        old = self.sectors[code].get(sector)
+        self._set_sector_weight(code, sector, weight)
+        return lambda: self._set_sector_weight(code, sector, old)
+
+    def apply(self, change: Mapping[str, Any]) -> Callable[[], None]:
+        op = change.get("op")
+        code = change.get("fundCode")
+        if op == "set_amount":
+            return self.set_amount(code, change.get("amount"))
+        if op == "add_fund":
+            return self.add_fund(code, change.get("amount"), change.get("holdings"), change.get("sectors"))
+        if op == "remove_fund":
+            return self.remove_fund(code)
+        if op == "set_holding":
+            return self.set_holding(code, change.get("stockSymbol"), change.get("percent"))
+        if op == "set_sector":
+            return self.set_sector(code, change.get("sectorName"), change.get("percent"))
+        raise WhatIfError(f"Unknown op {op!r}; use one of {', '.join(OPS)}")
+
+    def apply_all(self, changes: List[Mapping[str, Any]]) -> None:
+        """Apply ``changes`` in order, all or nothing."""
+        undo: List[Callable[[], None]] = []
+        order = list(self.amounts)
+        for i, change in enumerate(changes):
+            try:
+                undo.append(self.apply(change))
+            except WhatIfError as exc:
+                for revert in reversed(undo):
+                    revert()
+                # a removed fund comes back at the end; put it back in place
+                self.amounts = {code: self.amounts[code] for code in order}
+                raise WhatIfError(f"change {i}: {exc}") from None
+
+    # --- results ---
+
+    def analysis(self) -> Dict[str, Any]:
+        """Same output as :func:`analyze_portfolio` for the current state."""
+        n = len(self.amounts)
+        avg_overlap = self.overlap_sum / (n * (n - 1) // 2) if n >= 2 else 0.0
+        overlap_score = max(0.0, (1.0 - avg_overlap) * 100.0)
+
+        total = self.total or Fraction(1)
+        hhi = float(self.square_sum / (total * total))
+        sector_score = max(0.0, (1.0 - hhi) * 100.0)
+        final_score = (overlap_score + sector_score) / 2.0
+        return {
+            "fund_overlap_score": round(overlap_score, 2),
+            "sector_score": round(sector_score, 2),
+            "final_diversification_score": round(final_score, 2),
+            "sector_distribution": {k: round(float(v / total) * 100.0, 2) for k, v in self.sector_sums.items()},
+        }
+
+    def snapshot(self) -> Tuple[List[Dict[str, Any]], Dict[int, List[Dict[str, Any]]], Dict[int, List[Dict[str, Any]]]]:
+        """The current state as new ``(funds, holdings_by_fund, sectors_by_fund)`` rows.
+
+        Shares nothing with the session, so it can be analyzed off the event
+        loop while later changes are applied.
+        """
+        funds, holdings, sectors = [], {}, {}
+        for i, (code, amount) in enumerate(self.amounts.items()):
+            funds.append({"fundId": i, "fundCode": code, "amount": amount})
+            holdings[i] = [{"stockSymbol": s, "percent": w * 100.0} for s, w in self.holdings[code].items()]
+            sectors[i] = [{"sectorName": s, "percent": w * 100.0} for s, w in self.sectors[code].items()]
+        return funds, holdings, sectors
+
+    def full_analysis(self) -> Dict[str, Any]:
+        """:func:`analyze_portfolio` recomputed from scratch, to check :meth:`analysis`."""
+        return analyze_portfolio(*self.snapshot())
+
+    def funds(self) -> List[Dict[str, Any]]:
+        return [{"fundCode": code, "amount": amount} for code, amount in self.amounts.items()]
+
+
+class SessionStore:
+    """LRU of live sessions with an idle timeout; used from the event loop only."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Tuple[str, WhatIfSession]]" = OrderedDict()
+
+    def add(self, client_id: str, session: WhatIfSession) -> None:
+        self._sessions[session.id] = (client_id, session)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, session_id: str) -> Optional[Tuple[str, WhatIfSession]]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[1].touched > self.ttl:
+            del self._sessions[session_id]
+            return None
+        entry[1].touched = now
+        self._sessions.move_to_end(session_id)
+        return entry
+
+    def remove(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+sessions = SessionStore()
@@ -1,33 +1,43 @@
+import importlib.util
 import json
+import os
+
+# the overlap engine lives with the FastAPI backend; load that one file by path rather
+# than putting the backend on sys.path, where its modules could shadow installed packages
+_OVERLAP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "NextGen Market Analyzer", "stock-analyzer-backend-fastapi", "overlap.py")
+_spec = importlib.util.spec_from_file_location("_backend_overlap", _OVERLAP_PATH)
+_overlap = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_overlap)
+FundOverlap = _overlap.FundOverlap
 
 class PortfolioAnalyzer:
-    def __init__(self, portfolio: dict):
+    # portfolio: {"funds": [{"name", "value", "holdings", "sectors"}]} or a CompactPortfolio
+    def __init__(self, portfolio):
         self.portfolio = portfolio
-        self.total_value = sum(f["value"] for f in portfolio["funds"])
+        self.compact = not isinstance(portfolio, dict)   # compact_portfolio.CompactPortfolio
+        if self.compact:
+            self.total_value = portfolio.total_value()
+        else:
+            self.total_value = sum(f["value"] for f in portfolio["funds"])
 
     def compute_overlap(self):
-        funds = self.portfolio["funds"]
-        overlaps = []
-        n = len(funds)
-
-        for i in range(n):
-            for j in range(i+1, n):
-                overlap = 0
-                for stock in funds[i]["holdings"]:
-                    if stock in funds[j]["holdings"]:
-                        overlap += min(funds[i]["holdings"][stock], funds[j]["holdings"][stock])
-                overlaps.append(overlap)
-
-        avg_overlap = sum(overlaps) / len(overlaps) if overlaps else 0
+        if self.compact:
+            avg_overlap = self.portfolio.overlap().average()
+        else:
+            avg_overlap = FundOverlap([f["holdings"] for f in self.portfolio["funds"]]).average()
         overlap_score = (1 - avg_overlap/100) * 100
         return round(overlap_score, 2), round(avg_overlap, 2)
 
     def compute_sector_diversification(self):
-        sector_weights = {}
-        for fund in self.portfolio["funds"]:
-            fund_share = fund["value"] / self.total_value
-            for sector, pct in fund["sectors"].items():
-                sector_weights[sector] = sector_weights.get(sector, 0) + (fund_share * pct)
+        if self.compact:
+            sector_weights = self.portfolio.sector_totals(self.total_value)
+        else:
+            sector_weights = {}
+            for fund in self.portfolio["funds"]:
+                fund_share = fund["value"] / self.total_value
+                for sector, pct in fund["sectors"].items():
+                    sector_weights[sector] = sector_weights.get(sector, 0) + (fund_share * pct)
 
         hhi = sum((w) ** 2 for w in sector_weights.values())
         sector_score = (1 - hhi) * 100
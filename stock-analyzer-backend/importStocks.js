@@ -40,6 +40,24 @@ async function importData() {
     );
   }
   console.log("Data imported successfully!");
+
+  // drop cached /evaluate and /stocks responses in a running FastAPI backend
+  const token = process.env.ADMIN_TOKEN;
+  if (!token) {
+    console.warn("ADMIN_TOKEN is not set; API cache (stocks) not invalidated");
+  } else {
+    try {
+      const res = await fetch("http://127.0.0.1:8000/admin/cache/invalidate?namespace=stocks", {
+        method: "POST",
+        headers: { "X-Admin-Token": token },
+      });
+      if (!res.ok) {
+        console.warn(`Could not invalidate API cache (stocks): HTTP ${res.status}`);
+      }
+    } catch (err) {
+      console.warn("Could not invalidate API cache:", err.message);
+    }
+  }
   process.exit();
 }
 